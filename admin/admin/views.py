@@ -137,6 +137,7 @@ class TF10View(
     )
     form_class = forms.TF10ViewForm
     extend_template = "admin/admin_layout.html"
+    prefetch_properties = ("object", "toldkategorier")
 
     @cached_property
     def toldkategorier(self):
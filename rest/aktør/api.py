@@ -3,10 +3,11 @@
 # SPDX-License-Identifier: MPL-2.0
 # mypy: disable-error-code="call-arg, attr-defined"
 
-from typing import Annotated, Optional
+from typing import Annotated, ClassVar, Optional, Tuple
 
 from aktør.models import Afsender, Modtager, Speditør
 from common.api import get_auth_methods
+from common.referencedata import referencedata
 from common.util import coerce_num_to_str
 from django.core.exceptions import ValidationError
 from django.db.models import Q
@@ -15,7 +16,7 @@ from django.shortcuts import get_object_or_404
 from ninja import Field, FilterSchema, ModelSchema, Query
 from ninja_extra import api_controller, permissions, route
 from ninja_extra.pagination import paginate
-from ninja_extra.schemas import NinjaPaginationResponseSchema
+from project.pagination import CursorPagination, CursorPaginationResponseSchema
 from project.util import RestPermission, json_dump
 from pydantic import BeforeValidator
 
@@ -87,6 +88,9 @@ class AfsenderOut(ModelSchema):
     postbox: Annotated[Optional[str], BeforeValidator(coerce_num_to_str)] = None
     telefon: Annotated[Optional[str], BeforeValidator(coerce_num_to_str)] = None
 
+    # Læses af resolve_stedkode; se project.eager
+    eager_relations: ClassVar[Tuple[str, ...]] = ("postnummer_ref",)
+
     class Config:
         model = Afsender
         model_fields = [
@@ -142,14 +146,14 @@ class AfsenderAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[AfsenderOut],
+        response=CursorPaginationResponseSchema[AfsenderOut],
         auth=get_auth_methods(),
         url_name="afsender_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def list_afsendere(self, filters: AfsenderFilterSchema = Query(...)):
         # https://django-ninja.rest-framework.com/guides/input/filtering/
-        return list(filters.filter(Afsender.objects.all()))
+        return filters.filter(Afsender.objects.all())
         """
         return list(Afsender.objects.filter(
             filters.get_filter_expression() & Q("mere filtrering fra vores side")
@@ -221,6 +225,9 @@ class ModtagerOut(ModelSchema):
     postbox: Annotated[Optional[str], BeforeValidator(coerce_num_to_str)] = None
     telefon: Annotated[Optional[str], BeforeValidator(coerce_num_to_str)] = None
 
+    # Læses af resolve_stedkode; se project.eager
+    eager_relations: ClassVar[Tuple[str, ...]] = ("postnummer_ref",)
+
     class Config:
         model = Modtager
         model_fields = [
@@ -277,14 +284,14 @@ class ModtagerAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[ModtagerOut],
+        response=CursorPaginationResponseSchema[ModtagerOut],
         auth=get_auth_methods(),
         url_name="modtager_list",
     )
-    @paginate()
+    @paginate(CursorPagination)
     def list_modtagere(self, filters: ModtagerFilterSchema = Query(...)):
         # https://django-ninja.rest-framework.com/guides/input/filtering/
-        return list(filters.filter(Modtager.objects.all()))
+        return filters.filter(Modtager.objects.all())
         """
         return list(Modtager.objects.filter(
             filters.get_filter_expression() & Q("mere filtrering fra vores side")
@@ -333,10 +340,11 @@ class SpeditørPermission(RestPermission):
 class SpeditørAPI:
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[SpeditørOut],
+        response=CursorPaginationResponseSchema[SpeditørOut],
         auth=get_auth_methods(),
         url_name="speditør_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @referencedata
+    @paginate(CursorPagination)
     def list(self, filters: SpeditørFilterSchema = Query(...)):
-        return list(filters.filter(Speditør.objects.all()))
+        return filters.filter(Speditør.objects.all())
@@ -381,5 +381,10 @@ class SpeditørAPITest(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(
             resp.json(),
-            {"count": 1, "items": [{"cvr": 10001337, "navn": "speditoer1337"}]},
+            {
+                "count": 1,
+                "count_estimated": False,
+                "next": None,
+                "items": [{"cvr": 10001337, "navn": "speditoer1337"}],
+            },
         )
@@ -3,44 +3,58 @@
 # SPDX-License-Identifier: MPL-2.0
 # mypy: disable-error-code="call-arg, attr-defined"
 
-import base64
 import logging
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
-from typing import Annotated, List, Optional, Tuple, Union
-from uuid import uuid4
+from typing import Annotated, ClassVar, Dict, List, Optional, Tuple, Union
 
 import django.utils.timezone as tz
 from aktør.api import AfsenderOut, ModtagerOut, SpeditørOut
 from anmeldelse.models import (
     Afgiftsanmeldelse,
+    AfgiftsanmeldelseAdgang,
     Notat,
     PrismeResponse,
     PrivatAfgiftsanmeldelse,
+    StatistikDag,
     Toldkategori,
     Varelinje,
 )
 from common.api import UserOut, get_auth_methods
 from common.models import IndberetterProfile
+from common.referencedata import referencedata
 from common.util import coerce_num_to_str
 from django.contrib.auth.models import Group
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.db.models import Q, QuerySet, Sum
+from django.db import transaction
+from django.db.models import Prefetch, Q, QuerySet, Sum
 from django.db.models.expressions import F, Value
 from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from forsendelse.api import FragtforsendelseOut, PostforsendelseOut
-from ninja import Field, FilterSchema, ModelSchema, Query
+from ninja import Field, FilterSchema, ModelSchema, Query, Schema
+from ninja.schema import DjangoGetter
 from ninja_extra import api_controller, permissions, route
 from ninja_extra.exceptions import PermissionDenied
 from ninja_extra.pagination import paginate
-from ninja_extra.schemas import NinjaPaginationResponseSchema
 from payment.models import Payment
-from project.util import RestPermission, json_dump
+from project.eager import eager_load
+from project.fastpath import fast_values, fastpath
+from project.files import file_response, request_fil
+from project.pagination import CursorPagination, CursorPaginationResponseSchema
+from project.sparse import load_fields, sparse
+from project.util import (
+    RestPermission,
+    if_match,
+    json_dump,
+    last_modified,
+    precondition_failed,
+)
 from pydantic import BeforeValidator, model_validator
 from sats.models import Vareafgiftssats
+from sats.satstabel import satstabeller
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
 log = logging.getLogger(__name__)
 
@@ -138,10 +152,65 @@ class PartialAfgiftsanmeldelseIn(ModelSchema):
         model_fields_optional = "__all__"
 
 
+class VarelinjeOut(ModelSchema):
+    class Config:
+        model = Varelinje
+        model_fields = [
+            "id",
+            "afgiftsanmeldelse",
+            "privatafgiftsanmeldelse",
+            "vareafgiftssats",
+            "mængde",
+            "antal",
+            "fakturabeløb",
+            "afgiftsbeløb",
+            "kladde",
+        ]
+
+
+class NotatOut(ModelSchema):
+    navn: Optional[str] = None
+    eager_relations: ClassVar[Tuple[str, ...]] = ("user",)
+
+    class Config:
+        model = Notat
+        model_fields = [
+            "id",
+            "afgiftsanmeldelse",
+            "privatafgiftsanmeldelse",
+            "oprettet",
+            "tekst",
+            "index",
+        ]
+
+    @staticmethod
+    def resolve_navn(item):
+        if item.user:
+            return " ".join(filter(None, [item.user.first_name, item.user.last_name]))
+
+
+class PrismeResponseOut(ModelSchema):
+    class Config:
+        model = PrismeResponse
+        model_fields = [
+            "id",
+            "afgiftsanmeldelse",
+            "rec_id",
+            "tax_notification_number",
+            "delivery_date",
+        ]
+
+
 class AfgiftsanmeldelseOut(ModelSchema):
     oprettet_af: Optional[UserOut]
     oprettet_på_vegne_af: Optional[UserOut]
     fuldmagtshaver: Optional[SpeditørOut]
+    # Kolonner som resolverne læser (se project/sparse.py); faktureringsdatoen
+    # er annoteret på querysettet
+    sparse_columns: ClassVar[Dict[str, Tuple[str, ...]]] = {
+        "beregnet_faktureringsdato": (),
+        "sidste_ændringsdato": ("sidste_ændringsdato",),
+    }
 
     class Config:
         model = Afgiftsanmeldelse
@@ -165,11 +234,16 @@ class AfgiftsanmeldelseOut(ModelSchema):
             "toldkategori",
             "fuldmagtshaver",
             "tf3",
+            "version",
         ]
 
     beregnet_faktureringsdato: str
     sidste_ændringsdato: Optional[str] = None
 
+    @staticmethod
+    def resolve_sidste_ændringsdato(obj: Afgiftsanmeldelse):
+        return obj.sidste_ændringsdato and obj.sidste_ændringsdato.isoformat()
+
     @staticmethod
     def resolve_beregnet_faktureringsdato(obj: Afgiftsanmeldelse):
         if hasattr(obj, "beregnet_faktureringsdato"):
@@ -187,9 +261,24 @@ class AfgiftsanmeldelseFullOut(AfgiftsanmeldelseOut):
     fuldmagtshaver: Optional[SpeditørOut]
 
 
+# Underobjekter medtages kun når de er bedt om med `expand`,
+# og udelades ellers helt af svaret (exclude_unset)
+class AfgiftsanmeldelseExpandOut(AfgiftsanmeldelseOut):
+    varelinjer: Optional[List[VarelinjeOut]] = None
+    notater: Optional[List[NotatOut]] = None
+    prismeresponses: Optional[List[PrismeResponseOut]] = None
+
+
+class AfgiftsanmeldelseFullExpandOut(AfgiftsanmeldelseFullOut):
+    varelinjer: Optional[List[VarelinjeOut]] = None
+    notater: Optional[List[NotatOut]] = None
+    prismeresponses: Optional[List[PrismeResponseOut]] = None
+
+
 class AfgiftsanmeldelseHistoryOut(AfgiftsanmeldelseOut):
     history_username: Optional[str]
     history_date: datetime
+    eager_relations: ClassVar[Tuple[str, ...]] = ("history_user",)
 
     @staticmethod
     def resolve_history_username(historical_afgiftsanmeldelse):
@@ -202,6 +291,7 @@ class AfgiftsanmeldelseHistoryOut(AfgiftsanmeldelseOut):
 class AfgiftsanmeldelseHistoryFullOut(AfgiftsanmeldelseFullOut):
     history_username: Optional[str]
     history_date: datetime
+    eager_relations: ClassVar[Tuple[str, ...]] = ("history_user",)
 
     @staticmethod
     def resolve_history_username(historical_afgiftsanmeldelse):
@@ -290,9 +380,11 @@ class AfgiftsanmeldelseAPI:
     ):
         try:
             data = payload.dict()
-            leverandørfaktura = data.pop("leverandørfaktura", None)
-            leverandørfaktura_navn = data.pop("leverandørfaktura_navn", None) or (
-                str(uuid4()) + ".pdf"
+            leverandørfaktura = request_fil(
+                self.context.request,
+                "leverandørfaktura",
+                data.pop("leverandørfaktura", None),
+                data.pop("leverandørfaktura_navn", None),
             )
             kladde = data.pop("kladde", False)
             if kladde:
@@ -315,13 +407,11 @@ class AfgiftsanmeldelseAPI:
                 **data, oprettet_af=self.context.request.user
             )
             if leverandørfaktura is not None:
-                item.leverandørfaktura = ContentFile(
-                    base64.b64decode(leverandørfaktura), name=leverandørfaktura_navn
-                )
+                item.leverandørfaktura = leverandørfaktura
                 log.info(
                     "Rest API opretter TF10 med leverandørfaktura '%s' (%d bytes)",
-                    leverandørfaktura_navn,
-                    item.leverandørfaktura.size,
+                    leverandørfaktura.name,
+                    leverandørfaktura.size,
                 )
                 item.save()
             else:
@@ -335,16 +425,20 @@ class AfgiftsanmeldelseAPI:
     # List afgiftsanmeldelser. Relaterede objekter refereres med deres id
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[AfgiftsanmeldelseOut],
+        response=CursorPaginationResponseSchema[AfgiftsanmeldelseExpandOut],
         auth=get_auth_methods(),
         url_name="afgiftsanmeldelse_list",
+        exclude_unset=True,
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @sparse(AfgiftsanmeldelseExpandOut)
+    @paginate(CursorPagination)
     def list(
         self,
         filters: AfgiftsanmeldelseFilterSchema = Query(...),
         sort: Optional[str] = None,
         order: Optional[str] = None,
+        expand: Optional[str] = None,
+        fields: Optional[str] = None,
     ):
         qs = self.filter_user(Afgiftsanmeldelse.objects.all())
         # https://django-ninja.rest-framework.com/guides/input/filtering/
@@ -354,21 +448,26 @@ class AfgiftsanmeldelseAPI:
         order_by = self.map_sort(sort, order)
         if order_by:
             qs = qs.order_by(order_by, "id")
-        return qs
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(qs)
+        return self.expand(load_fields(qs, AfgiftsanmeldelseExpandOut, fields), expand)
 
     # List afgiftsanmeldelser. Relaterede objekter nestes i hvert item
     @route.get(
         "full",
-        response=NinjaPaginationResponseSchema[AfgiftsanmeldelseFullOut],
+        response=CursorPaginationResponseSchema[AfgiftsanmeldelseFullExpandOut],
         auth=get_auth_methods(),
         url_name="afgiftsanmeldelse_list_full",
+        exclude_unset=True,
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @sparse(AfgiftsanmeldelseFullExpandOut)
+    @paginate(CursorPagination)
     def list_full(
         self,
         filters: AfgiftsanmeldelseFilterSchema = Query(...),
         sort: Optional[str] = None,
         order: Optional[str] = None,
+        expand: Optional[str] = None,
+        fields: Optional[str] = None,
     ):
         qs = self.filter_user(Afgiftsanmeldelse.objects.all())
         # https://django-ninja.rest-framework.com/guides/input/filtering/
@@ -378,41 +477,66 @@ class AfgiftsanmeldelseAPI:
         order_by = self.map_sort(sort, order)
         if order_by:
             qs = qs.order_by(order_by, "id")
-        return qs
+        # Beregn og hent relaterede objekter i samlede forespørgsler frem for pr. item
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(qs)
+        return self.expand(
+            load_fields(qs, AfgiftsanmeldelseFullExpandOut, fields), expand
+        )
 
     @route.get(
         "/{id}",
-        response=AfgiftsanmeldelseOut,
+        response=AfgiftsanmeldelseExpandOut,
         auth=get_auth_methods(),
         url_name="afgiftsanmeldelse_get",
+        exclude_unset=True,
     )
-    def get(self, id: int):
-        item = get_object_or_404(Afgiftsanmeldelse, id=id)
+    def get(self, id: int, expand: Optional[str] = None):
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(Afgiftsanmeldelse.objects.all())
+        qs = self.expand(eager_load(qs, AfgiftsanmeldelseOut), expand)
+        item = get_object_or_404(qs, id=id)
         self.check_user(item)
+        last_modified(self.context.response, item.sidste_ændringsdato)
         return item
 
     @route.get(
         "/{id}/full",
-        response=AfgiftsanmeldelseFullOut,
+        response=AfgiftsanmeldelseFullExpandOut,
         auth=get_auth_methods(),
         url_name="afgiftsanmeldelse_get_full",
+        exclude_unset=True,
     )
-    def get_full(self, id: int):
-        item = get_object_or_404(Afgiftsanmeldelse, id=id)
+    def get_full(self, id: int, expand: Optional[str] = None):
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(Afgiftsanmeldelse.objects.all())
+        qs = self.expand(eager_load(qs, AfgiftsanmeldelseFullOut), expand)
+        item = get_object_or_404(qs, id=id)
         self.check_user(item)
+        last_modified(self.context.response, item.sidste_ændringsdato)
         return item
 
+    @route.get(
+        "/{id}/leverandørfaktura",
+        auth=get_auth_methods(),
+        url_name="afgiftsanmeldelse_leverandørfaktura",
+    )
+    def get_leverandørfaktura(self, id: int):
+        item = get_object_or_404(Afgiftsanmeldelse, id=id)
+        self.check_user(item)
+        return file_response(self.context.request, item.leverandørfaktura)
+
     @route.get(
         "/{id}/history",
-        response=NinjaPaginationResponseSchema[AfgiftsanmeldelseHistoryOut],
+        response=CursorPaginationResponseSchema[AfgiftsanmeldelseHistoryOut],
         auth=get_auth_methods(),
         url_name="afgiftsanmeldelse_get_history",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def get_history(self, id: int):
         item = get_object_or_404(Afgiftsanmeldelse, id=id)
         self.check_user(item)
-        return list(item.history.order_by("history_date"))
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(
+            item.history.order_by("history_date")
+        )
+        return eager_load(qs, AfgiftsanmeldelseHistoryOut)
 
     @route.get(
         "/{id}/history/{index}",
@@ -423,7 +547,40 @@ class AfgiftsanmeldelseAPI:
     def get_afgiftsanmeldelse_history_item(self, id: int, index: int):
         item = get_object_or_404(Afgiftsanmeldelse, id=id)
         self.check_user(item)
-        return item.history.order_by("history_date")[index]
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(
+            item.history.order_by("history_date")
+        )
+        return eager_load(qs, AfgiftsanmeldelseHistoryFullOut)[index]
+
+    # Underobjekter der kan medtages inline, fx `?expand=varelinjer,notater`.
+    # Navn: (model, relation på Afgiftsanmeldelse)
+    expand_relations = {
+        "varelinjer": (Varelinje, "varelinje_set"),
+        "notater": (Notat, "notat_set"),
+        "prismeresponses": (PrismeResponse, "prismeresponse_set"),
+    }
+
+    def expand(self, qs: QuerySet, expand: Optional[str]) -> QuerySet:
+        if not expand:
+            return qs
+        user = self.context.request.user
+        prefetches = []
+        for name in sorted({x.strip() for x in expand.split(",")} - {""}):
+            if name not in self.expand_relations:
+                raise ValidationError(
+                    {"expand": [f"Ukendt underobjekt '{name}'"]}, code="invalid"
+                )
+            model, relation = self.expand_relations[name]
+            if not user.has_perm(f"anmeldelse.view_{model._meta.model_name}"):
+                raise PermissionDenied
+            children = model.objects.all()
+            if model is Notat:
+                children = eager_load(children, NotatOut)
+            elif model is PrismeResponse:
+                children = children.order_by("delivery_date")
+            # Hentes for alle anmeldelser på siden i én forespørgsel
+            prefetches.append(Prefetch(relation, queryset=children, to_attr=name))
+        return qs.prefetch_related(*prefetches)
 
     @staticmethod
     def map_sort(sort, order):
@@ -439,13 +596,17 @@ class AfgiftsanmeldelseAPI:
         return None
 
     @route.patch("/{id}", auth=get_auth_methods(), url_name="afgiftsanmeldelse_update")
+    @transaction.atomic
     def update(
         self,
         id: int,
         payload: PartialAfgiftsanmeldelseIn,
     ):
-        item = get_object_or_404(Afgiftsanmeldelse, id=id)
+        # Rækken låses til vi har gemt, så If-Match ikke kan blive forældet undervejs
+        item = get_object_or_404(Afgiftsanmeldelse.objects.select_for_update(), id=id)
         self.check_user(item)
+        if not if_match(self.context.request, item.version):
+            return precondition_failed()
 
         if payload.status in ("godkendt", "afvist", "afsluttet"):
             if not self.check_perm("anmeldelse.approve_reject_anmeldelse"):
@@ -474,20 +635,20 @@ class AfgiftsanmeldelseAPI:
                 setattr(item, attr, value)
 
         # Handle invoices - after payload-handling
-        leverandørfaktura = data.pop("leverandørfaktura", None)
-        leverandørfaktura_navn = data.pop("leverandørfaktura_navn", None) or (
-            str(uuid4()) + ".pdf"
+        leverandørfaktura = request_fil(
+            self.context.request,
+            "leverandørfaktura",
+            data.pop("leverandørfaktura", None),
+            data.pop("leverandørfaktura_navn", None),
         )
 
         if leverandørfaktura is not None:
-            item.leverandørfaktura = ContentFile(
-                base64.b64decode(leverandørfaktura), name=leverandørfaktura_navn
-            )
+            item.leverandørfaktura = leverandørfaktura
             log.info(
                 "Rest API opdaterer TF10 %d med leverandørfaktura '%s' (%d bytes)",
                 id,
-                leverandørfaktura_navn,
-                item.leverandørfaktura.size,
+                leverandørfaktura.name,
+                leverandørfaktura.size,
             )
         else:
             log.info("Rest API opdaterer TF10 %d uden at sætte leverandørfaktura", id)
@@ -548,10 +709,13 @@ class AfgiftsanmeldelseAPI:
             return ["ny", "kladde"]
 
     def filter_user(self, qs: QuerySet) -> QuerySet:
-        user = self.context.request.user
-        if self.check_perm("anmeldelse.view_all_anmeldelse"):
+        return self.filter_for_user(qs, self.context.request.user)
+
+    @staticmethod
+    def filter_for_user(qs: QuerySet, user) -> QuerySet:
+        if user.has_perm("anmeldelse.view_all_anmeldelse"):
             return qs
-        if self.check_perm("anmeldelse.view_approved_anmeldelse"):
+        if user.has_perm("anmeldelse.view_approved_anmeldelse"):
             # Hvis brugeren må se alle godkendte, filtrer på dem
             return qs.filter(status__in=("godkendt", "afsluttet"))
         # Hvis brugeren hverken må se alle eller godkendte, filtrér på opretteren
@@ -560,14 +724,9 @@ class AfgiftsanmeldelseAPI:
         except IndberetterProfile.DoesNotExist:
             return qs.none()
 
-        filters = Q(oprettet_af__pk=user.pk) | Q(oprettet_på_vegne_af__pk=user.pk)
-        if cvr:
-            filters |= (
-                Q(oprettet_af__indberetter_data__cvr=cvr)
-                | Q(oprettet_på_vegne_af__indberetter_data__cvr=cvr)
-                | Q(fuldmagtshaver__cvr=cvr)
-            )
-        return qs.filter(filters).exclude(status="slettet")
+        return qs.filter(id__in=AfgiftsanmeldelseAdgang.synlige(user, cvr)).exclude(
+            status="slettet"
+        )
 
     def check_user(self, item: Afgiftsanmeldelse):
         if not self.filter_user(Afgiftsanmeldelse.objects.filter(id=item.id)).exists():
@@ -657,6 +816,11 @@ class PrivatAfgiftsanmeldelseOut(ModelSchema):
     oprettet_af: Optional[UserOut]
     payment_status: Optional[str]
     sidste_ændringsdato: Optional[str] = None
+    # Kolonner som resolverne læser (se project/sparse.py)
+    sparse_columns: ClassVar[Dict[str, Tuple[str, ...]]] = {
+        "payment_status": (),
+        "sidste_ændringsdato": ("sidste_ændringsdato",),
+    }
 
     class Config:
         model = PrivatAfgiftsanmeldelse
@@ -677,8 +841,13 @@ class PrivatAfgiftsanmeldelseOut(ModelSchema):
             "oprettet_af",
             "status",
             "anonym",
+            "version",
         ]
 
+    @staticmethod
+    def resolve_sidste_ændringsdato(obj: PrivatAfgiftsanmeldelse):
+        return obj.sidste_ændringsdato and obj.sidste_ændringsdato.isoformat()
+
     @staticmethod
     def resolve_payment_status(obj: PrivatAfgiftsanmeldelse):
         qs = Payment.objects.filter(declaration=obj)
@@ -740,15 +909,16 @@ class PrivatAfgiftsanmeldelseAPI:
         try:
             data = payload.dict()
             leverandørfaktura = data.pop("leverandørfaktura")
-            leverandørfaktura_navn = data.pop("leverandørfaktura_navn", None) or (
-                str(uuid4()) + ".pdf"
-            )
+            leverandørfaktura_navn = data.pop("leverandørfaktura_navn", None)
             item = PrivatAfgiftsanmeldelse.objects.create(
                 **data, oprettet_af=self.context.request.user
             )
 
-            item.leverandørfaktura = ContentFile(
-                base64.b64decode(leverandørfaktura), name=leverandørfaktura_navn
+            item.leverandørfaktura = request_fil(
+                self.context.request,
+                "leverandørfaktura",
+                leverandørfaktura,
+                leverandørfaktura_navn,
             )
             item.save()
             return {"id": item.id}
@@ -766,20 +936,33 @@ class PrivatAfgiftsanmeldelseAPI:
     def get(self, id: int):
         item = get_object_or_404(PrivatAfgiftsanmeldelse, id=id)
         self.check_user(item)
+        last_modified(self.context.response, item.sidste_ændringsdato)
         return item
 
+    @route.get(
+        "/{id}/leverandørfaktura",
+        auth=get_auth_methods(),
+        url_name="privat_afgiftsanmeldelse_leverandørfaktura",
+    )
+    def get_leverandørfaktura(self, id: int):
+        item = get_object_or_404(PrivatAfgiftsanmeldelse, id=id)
+        self.check_user(item)
+        return file_response(self.context.request, item.leverandørfaktura)
+
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[PrivatAfgiftsanmeldelseOut],
+        response=CursorPaginationResponseSchema[PrivatAfgiftsanmeldelseOut],
         auth=get_auth_methods(),
         url_name="privat_afgiftsanmeldelse_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @sparse(PrivatAfgiftsanmeldelseOut)
+    @paginate(CursorPagination)
     def list(
         self,
         filters: PrivatAfgiftsanmeldelseFilterSchema = Query(...),
         sort: Optional[str] = None,
         order: Optional[str] = None,
+        fields: Optional[str] = None,
     ):
         qs = self.filter_user(PrivatAfgiftsanmeldelse.objects.all())
         # https://django-ninja.rest-framework.com/guides/input/filtering/
@@ -787,10 +970,13 @@ class PrivatAfgiftsanmeldelseAPI:
         order_by = self.map_sort(sort, order)
         if order_by:
             qs = qs.order_by(order_by, "id")
-        return list(qs)
+        return load_fields(qs, PrivatAfgiftsanmeldelseOut, fields)
 
     def filter_user(self, qs: QuerySet) -> QuerySet:
-        user = self.context.request.user
+        return self.filter_for_user(qs, self.context.request.user)
+
+    @staticmethod
+    def filter_for_user(qs: QuerySet, user) -> QuerySet:
         if user.has_perm("anmeldelse.view_all_privatafgiftsanmeldelse"):
             return qs
         return qs.filter(Q(oprettet_af=user) | Q(oprettet_på_vegne_af=user))
@@ -827,22 +1013,29 @@ class PrivatAfgiftsanmeldelseAPI:
     @route.patch(
         "/{id}", auth=get_auth_methods(), url_name="privatafgiftsanmeldelse_update"
     )
+    @transaction.atomic
     def update(
         self,
         id: int,
         payload: PartialPrivatAfgiftsanmeldelseIn,
     ):
-        item = get_object_or_404(PrivatAfgiftsanmeldelse, id=id)
+        item = get_object_or_404(
+            PrivatAfgiftsanmeldelse.objects.select_for_update(), id=id
+        )
         self.check_user(item)
+        if not if_match(self.context.request, item.version):
+            return precondition_failed()
         data = payload.dict(exclude_unset=True)
-        leverandørfaktura = data.pop("leverandørfaktura", None)
+        leverandørfaktura = request_fil(
+            self.context.request,
+            "leverandørfaktura",
+            data.pop("leverandørfaktura", None),
+        )
         for attr, value in data.items():
             if value is not None:
                 setattr(item, attr, value)
         if leverandørfaktura is not None:
-            item.leverandørfaktura = ContentFile(
-                base64.b64decode(leverandørfaktura), name=str(uuid4()) + ".pdf"
-            )
+            item.leverandørfaktura = leverandørfaktura
         item.save()
         return {"success": True}
 
@@ -905,11 +1098,11 @@ class VarelinjeIn(ModelSchema):
                             f"{vareafgiftssats_afgiftsgruppenummer}"
                         }
                     )
-                enhed = Vareafgiftssats.objects.get(id=id).enhed
+                enhed = satstabeller().sats(id).enhed
             elif vareafgiftssats_id not in (None, 0):
                 id = vareafgiftssats_id
                 try:
-                    enhed = Vareafgiftssats.objects.get(id=id).enhed
+                    enhed = satstabeller().sats(id).enhed
                 except Vareafgiftssats.DoesNotExist:
                     raise ValidationError(
                         {"vareafgiftssats_id": f"object with id {id} does not exist"}
@@ -954,25 +1147,64 @@ class PartialVarelinjeIn(ModelSchema):
         model_fields_optional = "__all__"
 
 
-class VarelinjeOut(ModelSchema):
-    class Config:
-        model = Varelinje
-        model_fields = [
-            "id",
-            "afgiftsanmeldelse",
-            "privatafgiftsanmeldelse",
-            "vareafgiftssats",
-            "mængde",
-            "antal",
-            "fakturabeløb",
-            "afgiftsbeløb",
-            "kladde",
-        ]
+class VarelinjeBulkUpdateIn(PartialVarelinjeIn):
+    id: int
+
+
+class VarelinjeBulkIn(Schema):
+    afgiftsanmeldelse_id: Optional[int] = None
+    privatafgiftsanmeldelse_id: Optional[int] = None
+    create: List[VarelinjeIn] = []
+    update: List[VarelinjeBulkUpdateIn] = []
+    delete: List[int] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def set_anmeldelse(cls, data):
+        # Nye linjer hører til anmeldelsen, så deres satser
+        # kan slås op ud fra anmeldelsens dato under valideringen
+        if isinstance(data, DjangoGetter):
+            data = data._obj
+        if isinstance(data, dict):
+            data = {
+                **data,
+                "create": [
+                    {
+                        **linje,
+                        "afgiftsanmeldelse_id": data.get("afgiftsanmeldelse_id"),
+                        "privatafgiftsanmeldelse_id": data.get(
+                            "privatafgiftsanmeldelse_id"
+                        ),
+                    }
+                    for linje in data.get("create") or []
+                ],
+            }
+        return data
+
+    @model_validator(mode="after")
+    def has_one_anmeldelse(self):
+        if (self.afgiftsanmeldelse_id is None) == (
+            self.privatafgiftsanmeldelse_id is None
+        ):
+            raise ValidationError(
+                {
+                    "__all__": "Must specify either afgiftsanmeldelse_id or "
+                    "privatafgiftsanmeldelse_id"
+                }
+            )
+        return self
 
 
 class VarelinjeFilterSchema(FilterSchema):
     afgiftsanmeldelse: Optional[int] = None
     privatafgiftsanmeldelse: Optional[int] = None
+    # Varelinjer til flere anmeldelser på én gang
+    afgiftsanmeldelse__in: Annotated[
+        Optional[List[int]], Field(None, q="afgiftsanmeldelse_id__in")
+    ]
+    privatafgiftsanmeldelse__in: Annotated[
+        Optional[List[int]], Field(None, q="privatafgiftsanmeldelse_id__in")
+    ]
     vareafgiftssats: Optional[int] = None
     mængde: Optional[Decimal] = None
     antal: Optional[int] = None
@@ -1047,17 +1279,10 @@ class VarelinjeAPI:
 
             if dato:
                 dato = datetime.combine(dato, time.min, tz.get_default_timezone())
-                return Vareafgiftssats.objects.get(
-                    Q(
-                        afgiftsgruppenummer=kode,
-                        afgiftstabel__gyldig_fra__lte=dato,
-                        afgiftstabel__kladde=False,
-                    )
-                    & (
-                        Q(afgiftstabel__gyldig_til__gte=dato)
-                        | Q(afgiftstabel__gyldig_til__isnull=True)
-                    )
-                ).id
+                sats = satstabeller().sats_for_kode(kode, dato)
+                if sats is None:
+                    raise Vareafgiftssats.DoesNotExist
+                return sats.id
         except (
             Afgiftsanmeldelse.DoesNotExist,
             PrivatAfgiftsanmeldelse.DoesNotExist,
@@ -1065,6 +1290,179 @@ class VarelinjeAPI:
         ):
             raise Http404
 
+    # Opret, ret og slet en hel anmeldelses varelinjer i én transaktion.
+    # Afgiftssum og pantgebyrer beregnes én gang til sidst, i stedet for ved
+    # hver enkelt linje som ved create/update/delete
+    @route.post("/bulk", auth=get_auth_methods(), url_name="varelinje_bulk")
+    @transaction.atomic
+    def bulk(self, payload: VarelinjeBulkIn):
+        user = self.context.request.user
+        for operation, liste in (
+            ("change", payload.update),
+            ("delete", payload.delete),
+        ):
+            if liste and not user.has_perm(f"anmeldelse.{operation}_varelinje"):
+                raise PermissionDenied
+
+        # Brugeren skal have adgang til selve anmeldelsen, også når der kun
+        # oprettes linjer
+        afgiftsanmeldelse: Optional[Afgiftsanmeldelse] = None
+        privatafgiftsanmeldelse: Optional[PrivatAfgiftsanmeldelse] = None
+        if payload.afgiftsanmeldelse_id is not None:
+            afgiftsanmeldelse = get_object_or_404(
+                Afgiftsanmeldelse.objects.select_for_update(),
+                id=payload.afgiftsanmeldelse_id,
+            )
+            synlig = AfgiftsanmeldelseAPI.filter_for_user(
+                Afgiftsanmeldelse.objects.filter(id=afgiftsanmeldelse.id), user
+            )
+        else:
+            privatafgiftsanmeldelse = get_object_or_404(
+                PrivatAfgiftsanmeldelse.objects.select_for_update(),
+                id=payload.privatafgiftsanmeldelse_id,
+            )
+            synlig = PrivatAfgiftsanmeldelseAPI.filter_for_user(
+                PrivatAfgiftsanmeldelse.objects.filter(id=privatafgiftsanmeldelse.id),
+                user,
+            )
+        if not synlig.exists():
+            raise PermissionDenied
+        anmeldelse = {
+            "afgiftsanmeldelse": afgiftsanmeldelse,
+            "privatafgiftsanmeldelse": privatafgiftsanmeldelse,
+        }
+
+        # Eksisterende linjer skal høre til anmeldelsen og være synlige for brugeren
+        ids = {linje.id for linje in payload.update} | set(payload.delete)
+        if ids:
+            eksisterende = (
+                Varelinje.objects.filter(**anmeldelse)
+                .select_related("vareafgiftssats")
+                .in_bulk(ids)
+            )
+            if len(eksisterende) != len(ids):
+                raise Http404
+            if self.filter_user(Varelinje.objects.filter(id__in=ids)).count() != len(
+                ids
+            ):
+                raise PermissionDenied
+
+        # Satser slås op samlet, og afgiftsgruppenumre kun én gang hver
+        koder = {
+            kode: self.get_varesats_id_by_kode(
+                payload.afgiftsanmeldelse_id, payload.privatafgiftsanmeldelse_id, kode
+            )
+            for kode in {
+                linje.vareafgiftssats_afgiftsgruppenummer
+                for linje in payload.create
+                if linje.vareafgiftssats_afgiftsgruppenummer
+            }
+        }
+        satser = Vareafgiftssats.objects.in_bulk(
+            (
+                {
+                    (
+                        linje.vareafgiftssats_afgiftsgruppenummer
+                        and koder[linje.vareafgiftssats_afgiftsgruppenummer]
+                    )
+                    or linje.vareafgiftssats_id
+                    for linje in payload.create
+                }
+                | {linje.vareafgiftssats_id for linje in payload.update}
+            )
+            - {None, 0}
+        )
+
+        def sæt_sats(item: Varelinje, sats_id: Optional[int]):
+            if sats_id:
+                if sats_id not in satser:
+                    raise ValidationError(
+                        {
+                            "vareafgiftssats_id": f"object with id {sats_id} "
+                            "does not exist"
+                        }
+                    )
+                item.vareafgiftssats = satser[sats_id]
+
+        def valider(item: Varelinje):
+            # Relationerne er allerede slået op, og constraints håndhæves af databasen
+            item.full_clean(
+                exclude=[
+                    "afgiftsanmeldelse",
+                    "privatafgiftsanmeldelse",
+                    "vareafgiftssats",
+                ],
+                validate_constraints=False,
+            )
+            item.beregn_afgift()
+
+        if payload.delete:
+            Varelinje.objects.filter(id__in=payload.delete).delete()
+
+        opdater = []
+        for linje in payload.update:
+            item = eksisterende[linje.id]
+            if item.vareafgiftssats and item.vareafgiftssats.afgiftsgruppenummer == 102:
+                # Pantgebyrer vedligeholdes ud fra pantlinjerne
+                continue
+            data = linje.dict(
+                exclude_unset=True, exclude={"id", "afgiftsanmeldelse_id"}
+            )
+            for attr, value in data.items():
+                if value is not None:
+                    setattr(item, attr, value)
+            sæt_sats(item, data.get("vareafgiftssats_id"))
+            valider(item)
+            opdater.append(item)
+
+        opret = []
+        created: List[Optional[Varelinje]] = []
+        for ny in payload.create:
+            data = ny.dict()
+            kode = data.pop("vareafgiftssats_afgiftsgruppenummer")
+            if kode:
+                data["vareafgiftssats_id"] = koder[kode]
+            item = Varelinje(**data)
+            sæt_sats(item, data.get("vareafgiftssats_id"))
+            if item.vareafgiftssats and item.vareafgiftssats.afgiftsgruppenummer == 102:
+                # Ignorer indkommende pantgebyr
+                created.append(None)
+                continue
+            valider(item)
+            opret.append(item)
+            created.append(item)
+
+        if opdater:
+            bulk_update_with_history(
+                opdater,
+                Varelinje,
+                [
+                    "vareafgiftssats",
+                    "mængde",
+                    "antal",
+                    "fakturabeløb",
+                    "afgiftsbeløb",
+                    "kladde",
+                ],
+                default_user=user,
+            )
+        if opret:
+            bulk_create_with_history(opret, Varelinje, default_user=user)
+
+        Varelinje.pant_afstem_gebyr(
+            afgiftsanmeldelse=afgiftsanmeldelse,
+            privatafgiftsanmeldelse=privatafgiftsanmeldelse,
+            history_user=user,
+        )
+        if afgiftsanmeldelse is not None and afgiftsanmeldelse.beregn_afgift_total():
+            afgiftsanmeldelse.save(update_fields=("afgift_total",))
+        # Bulk-operationerne sender ikke signaler
+        StatistikDag.opdater_anmeldelse(
+            payload.afgiftsanmeldelse_id, payload.privatafgiftsanmeldelse_id
+        )
+
+        return {"created": [item and item.id for item in created]}
+
     @route.get(
         "/{id}",
         response=VarelinjeOut,
@@ -1078,11 +1476,12 @@ class VarelinjeAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[VarelinjeOut],
+        response=CursorPaginationResponseSchema[VarelinjeOut],
         auth=get_auth_methods(),
         url_name="varelinje_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @fastpath(VarelinjeOut)
+    @paginate(CursorPagination)
     def list(
         self,
         filters: VarelinjeFilterSchema = Query(...),
@@ -1101,11 +1500,11 @@ class VarelinjeAPI:
             except Afgiftsanmeldelse.DoesNotExist:
                 qs = Varelinje.objects.none()
         else:
-            qs = Varelinje.objects.all()
+            qs = fast_values(Varelinje.objects.all(), VarelinjeOut)
         qs = qs.filter(
             filters.get_filter_expression()
         )  # Inkluderer evt. filtrering på anmeldelse-id
-        return list(qs)
+        return qs
 
     @route.patch("/{id}", auth=get_auth_methods(), url_name="varelinje_update")
     def update(self, id: int, payload: PartialVarelinjeIn):
@@ -1136,28 +1535,28 @@ class VarelinjeAPI:
         user = self.context.request.user
         if user.has_perm("anmeldelse.view_all_anmeldelse"):
             return qs
-        q = qs.none()
-        for a, c in (
-            ("afgiftsanmeldelse", "cvr"),
-            ("privatafgiftsanmeldelse", "cpr"),
-        ):
-            try:
-                nr = getattr(user.indberetter_data, c)
-            except IndberetterProfile.DoesNotExist:
-                pass
-            else:
-                q |= qs.filter(
-                    Q(**{f"{a}__oprettet_af__pk": user.pk})
-                    | Q(**{f"{a}__oprettet_på_vegne_af__pk": user.pk})
+        try:
+            profil = user.indberetter_data
+        except IndberetterProfile.DoesNotExist:
+            return qs.none()
+        filters = (
+            Q(
+                afgiftsanmeldelse_id__in=AfgiftsanmeldelseAdgang.synlige(
+                    user, profil.cvr
                 )
-                if nr is not None:
-                    q |= qs.filter(
-                        Q(**{f"{a}__oprettet_af__indberetter_data__{c}": nr})
-                        | Q(**{f"{a}__oprettet_på_vegne_af__indberetter_data__{c}": nr})
-                    )
-                    if c == "cvr":
-                        q |= qs.filter(afgiftsanmeldelse__fuldmagtshaver__cvr=nr)
-        return q
+            )
+            | Q(privatafgiftsanmeldelse__oprettet_af__pk=user.pk)
+            | Q(privatafgiftsanmeldelse__oprettet_på_vegne_af__pk=user.pk)
+        )
+        if profil.cpr is not None:
+            filters |= Q(
+                privatafgiftsanmeldelse__oprettet_af__indberetter_data__cpr=profil.cpr
+            ) | Q(
+                privatafgiftsanmeldelse__oprettet_på_vegne_af__indberetter_data__cpr=(
+                    profil.cpr
+                )
+            )
+        return qs.filter(filters)
 
     def check_user(self, item: Varelinje):
         if not self.filter_user(Varelinje.objects.filter(id=item.id)).exists():
@@ -1174,29 +1573,15 @@ class NotatIn(ModelSchema):
         model_fields = ["tekst"]
 
 
-class NotatOut(ModelSchema):
-    navn: Optional[str] = None
-
-    class Config:
-        model = Notat
-        model_fields = [
-            "id",
-            "afgiftsanmeldelse",
-            "privatafgiftsanmeldelse",
-            "oprettet",
-            "tekst",
-            "index",
-        ]
-
-    @staticmethod
-    def resolve_navn(item):
-        if item.user:
-            return " ".join(filter(None, [item.user.first_name, item.user.last_name]))
-
-
 class NotatFilterSchema(FilterSchema):
     afgiftsanmeldelse: Optional[int] = None
     privatafgiftsanmeldelse: Optional[int] = None
+    afgiftsanmeldelse__in: Annotated[
+        Optional[List[int]], Field(None, q="afgiftsanmeldelse_id__in")
+    ]
+    privatafgiftsanmeldelse__in: Annotated[
+        Optional[List[int]], Field(None, q="privatafgiftsanmeldelse_id__in")
+    ]
 
 
 class NotatPermission(RestPermission):
@@ -1241,11 +1626,11 @@ class NotatAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[NotatOut],
+        response=CursorPaginationResponseSchema[NotatOut],
         auth=get_auth_methods(),
         url_name="notat_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def list_notater(
         self,
         filters: NotatFilterSchema = Query(...),
@@ -1286,7 +1671,7 @@ class NotatAPI:
             qs = Notat.objects.all()
         # Inkluderer evt. filtrering på anmeldelse-id
         qs = qs.filter(filters.get_filter_expression())
-        return list(qs)
+        return qs
 
     @route.delete("/{id}", auth=get_auth_methods(), url_name="notat_delete")
     def delete_notat(self, id: int):
@@ -1299,28 +1684,28 @@ class NotatAPI:
         user = self.context.request.user
         if user.has_perm("anmeldelse.view_all_anmeldelse"):
             return qs
-        q = qs.none()
-        for a, c in (
-            ("afgiftsanmeldelse", "cvr"),
-            ("privatafgiftsanmeldelse", "cpr"),
-        ):
-            try:
-                nr = getattr(user.indberetter_data, c)
-            except IndberetterProfile.DoesNotExist:
-                pass
-            else:
-                q |= qs.filter(
-                    Q(**{f"{a}__oprettet_af__pk": user.pk})
-                    | Q(**{f"{a}__oprettet_på_vegne_af__pk": user.pk})
+        try:
+            profil = user.indberetter_data
+        except IndberetterProfile.DoesNotExist:
+            return qs.none()
+        filters = (
+            Q(
+                afgiftsanmeldelse_id__in=AfgiftsanmeldelseAdgang.synlige(
+                    user, profil.cvr
                 )
-                if nr is not None:
-                    q |= qs.filter(
-                        Q(**{f"{a}__oprettet_af__indberetter_data__{c}": nr})
-                        | Q(**{f"{a}__oprettet_på_vegne_af__indberetter_data__{c}": nr})
-                    )
-                    if c == "cvr":
-                        q |= qs.filter(afgiftsanmeldelse__fuldmagtshaver__cvr=nr)
-        return q
+            )
+            | Q(privatafgiftsanmeldelse__oprettet_af__pk=user.pk)
+            | Q(privatafgiftsanmeldelse__oprettet_på_vegne_af__pk=user.pk)
+        )
+        if profil.cpr is not None:
+            filters |= Q(
+                privatafgiftsanmeldelse__oprettet_af__indberetter_data__cpr=profil.cpr
+            ) | Q(
+                privatafgiftsanmeldelse__oprettet_på_vegne_af__indberetter_data__cpr=(
+                    profil.cpr
+                )
+            )
+        return qs.filter(filters)
 
     def check_user(self, item: Notat):
         if not self.filter_user(Notat.objects.filter(id=item.id)).exists():
@@ -1335,20 +1720,11 @@ class PrismeResponseIn(ModelSchema):
         model_fields = ["rec_id", "tax_notification_number", "delivery_date"]
 
 
-class PrismeResponseOut(ModelSchema):
-    class Config:
-        model = PrismeResponse
-        model_fields = [
-            "id",
-            "afgiftsanmeldelse",
-            "rec_id",
-            "tax_notification_number",
-            "delivery_date",
-        ]
-
-
 class PrismeResponseFilterSchema(FilterSchema):
     afgiftsanmeldelse: Optional[int] = None
+    afgiftsanmeldelse__in: Annotated[
+        Optional[List[int]], Field(None, q="afgiftsanmeldelse_id__in")
+    ]
 
 
 class PrismeResponsePermission(RestPermission):
@@ -1381,11 +1757,11 @@ class PrismeResponseAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[PrismeResponseOut],
+        response=CursorPaginationResponseSchema[PrismeResponseOut],
         auth=get_auth_methods(),
         url_name="prismeresponse_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def list_prismeresponse(
         self,
         filters: PrismeResponseFilterSchema = Query(...),
@@ -1395,37 +1771,18 @@ class PrismeResponseAPI:
         qs = PrismeResponse.objects.filter(filters.get_filter_expression()).order_by(
             "delivery_date"
         )
-        return list(qs)
+        return qs
 
 
 class StatistikFilterSchema(FilterSchema):
+    # Filtrerer på StatistikDag
     anmeldelsestype: Optional[str] = None
-    startdato: Annotated[
-        Optional[date],
-        Field(
-            None,
-            q=[
-                "privatafgiftsanmeldelse__indleveringsdato__gte",
-                "afgiftsanmeldelse__dato__gte",
-            ],
-        ),
-    ]
-    slutdato: Annotated[
-        Optional[date],
-        Field(
-            None,
-            q=[
-                "privatafgiftsanmeldelse__indleveringsdato__lte",
-                "afgiftsanmeldelse__dato__lte",
-            ],
-        ),
-    ]
+    startdato: Annotated[Optional[date], Field(None, q="dato__gte")]
+    slutdato: Annotated[Optional[date], Field(None, q="dato__lte")]
 
     def filter_anmeldelsestype(self, value: str):
-        if value == "tf5":
-            return Q(privatafgiftsanmeldelse__isnull=False)
-        if value == "tf10":
-            return Q(afgiftsanmeldelse__isnull=False)
+        if value in (StatistikDag.TF5, StatistikDag.TF10):
+            return Q(anmeldelsestype=value)
 
 
 @api_controller(
@@ -1440,30 +1797,25 @@ class StatistikAPI:
         url_name="statistik_get",
     )
     def get(self, filters: StatistikFilterSchema = Query(...)):
-        varelinjer = (
-            Varelinje.objects.select_related("vareafgiftssats")
-            .filter(filters.get_filter_expression())
-            .filter(
-                Q(afgiftsanmeldelse__status="afsluttet")
-                | Q(privatafgiftsanmeldelse__status="afsluttet")
-            )
-        )
-
+        # Summerer de daglige totaler i StatistikDag i stedet for varelinjerne.
+        # Summerne kan ikke hedde det samme som StatistikDags felter
         stats = list(
-            varelinjer.values("vareafgiftssats__afgiftsgruppenummer")
+            StatistikDag.objects.filter(filters.get_filter_expression())
+            .values("vareafgiftssats__afgiftsgruppenummer")
             .annotate(
-                sum_afgiftsbeløb=Sum("afgiftsbeløb", default=0),
-                sum_mængde=Sum("mængde", default=0),
-                sum_antal=Sum("antal", default=0),
+                total_afgiftsbeløb=Sum("sum_afgiftsbeløb", default=0),
+                total_mængde=Sum("sum_mængde", default=0),
+                total_antal=Sum("sum_antal", default=0),
                 afgiftsgruppenummer=F("vareafgiftssats__afgiftsgruppenummer"),
                 vareart_da=F("vareafgiftssats__vareart_da"),
                 vareart_kl=F("vareafgiftssats__vareart_kl"),
                 enhed=F("vareafgiftssats__enhed"),
             )
-            .filter(afgiftsgruppenummer__isnull=False)
         )
         for stat in stats:
             del stat["vareafgiftssats__afgiftsgruppenummer"]
+            for felt in ("afgiftsbeløb", "mængde", "antal"):
+                stat[f"sum_{felt}"] = stat.pop(f"total_{felt}")
 
         stats_unused = (
             Vareafgiftssats.objects.filter(
@@ -1509,5 +1861,6 @@ class ToldkategoriAPI:
         url_name="toldkategori_get",
         response=List[ToldkategoriOut],
     )
+    @referencedata
     def list(self):
         return Toldkategori.objects.all()
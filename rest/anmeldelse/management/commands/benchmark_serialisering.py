@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import random
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+from anmeldelse.api import VarelinjeOut
+from anmeldelse.models import PrivatAfgiftsanmeldelse, Varelinje
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from project.fastpath import fast_items, fast_values
+from project.pagination import CursorPaginationResponseSchema
+from project.util import json_dump
+from sats.models import Afgiftstabel, Vareafgiftssats
+
+
+class Command(BaseCommand):
+    help = (
+        "Måler serialisering af en liste af varelinjer, med ninja-skemaet og "
+        "direkte fra values()"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linjer", type=int, default=10000)
+        parser.add_argument("--gentagelser", type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Testdata rulles tilbage når målingen er færdig
+        with transaction.atomic():
+            self.benchmark(options["linjer"], options["gentagelser"])
+            transaction.set_rollback(True)
+
+    def opret_varelinjer(self, linjer: int) -> PrivatAfgiftsanmeldelse:
+        user = User.objects.create(username=f"benchmark-{uuid4()}")
+        tabel = Afgiftstabel.objects.create(
+            gyldig_fra=datetime(2000, 1, 1, tzinfo=timezone.utc), kladde=False
+        )
+        satser = [
+            Vareafgiftssats.objects.create(
+                afgiftstabel=tabel,
+                vareart_da=f"Benchmark {nummer}",
+                vareart_kl=f"Benchmark {nummer}",
+                afgiftsgruppenummer=900000 + nummer,
+                enhed=Vareafgiftssats.Enhed.KILOGRAM,
+                afgiftssats=Decimal(nummer) / 10,
+            )
+            for nummer in range(1, 21)
+        ]
+        anmeldelse = PrivatAfgiftsanmeldelse.objects.create(
+            cpr=1234567890,
+            navn="Benchmark",
+            adresse="Benchmarkvej 1",
+            postnummer=3900,
+            by="Nuuk",
+            telefon="123456",
+            bookingnummer="1",
+            indleveringsdato=datetime.now(timezone.utc).date(),
+            leverandørfaktura_nummer="1",
+            oprettet_af=user,
+            status="ny",
+        )
+        rnd = random.Random(1234)
+        Varelinje.objects.bulk_create(
+            Varelinje(
+                privatafgiftsanmeldelse=anmeldelse,
+                vareafgiftssats=rnd.choice(satser),
+                mængde=Decimal(rnd.randint(1, 100000)) / 1000,
+                antal=rnd.randint(1, 100),
+                fakturabeløb=Decimal(rnd.randint(1, 10000000)) / 100,
+                afgiftsbeløb=Decimal(rnd.randint(1, 10000000)) / 100,
+            )
+            for i in range(linjer)
+        )
+        return anmeldelse
+
+    def benchmark(self, linjer: int, gentagelser: int):
+        anmeldelse = self.opret_varelinjer(linjer)
+        qs = Varelinje.objects.filter(privatafgiftsanmeldelse=anmeldelse).order_by("pk")
+        schema = CursorPaginationResponseSchema[VarelinjeOut]
+
+        def skema(items):
+            # Som ninja: et skema pr. række, valideret og dumpet før orjson
+            return json_dump(
+                schema.model_validate(
+                    {"count": len(items), "next": None, "items": items}
+                ).model_dump()
+            )
+
+        def values(rows):
+            return json_dump(
+                {
+                    "count": len(rows),
+                    "next": None,
+                    "items": fast_items(rows, Varelinje, VarelinjeOut),
+                }
+            )
+
+        self.stdout.write(
+            f"{'':10}{'hentning':>12}{'serialisering':>16}{'rækker/s':>14}"
+            f"{'i alt':>12}{'rækker/s':>14}"
+        )
+        resultater = {}
+        for navn, hent, serialiser in (
+            ("skema", lambda: list(qs.all()), skema),
+            ("values()", lambda: list(fast_values(qs, VarelinjeOut)), values),
+        ):
+            hentning = serialisering = float("inf")
+            for i in range(gentagelser):
+                start = time.perf_counter()
+                rækker = hent()
+                midt = time.perf_counter()
+                resultater[navn] = serialiser(rækker)
+                slut = time.perf_counter()
+                hentning = min(hentning, midt - start)
+                serialisering = min(serialisering, slut - midt)
+            self.stdout.write(
+                f"{navn:10}{hentning * 1000:9.1f} ms{serialisering * 1000:13.1f} ms"
+                f"{linjer / serialisering:14.0f}"
+                f"{(hentning + serialisering) * 1000:9.1f} ms"
+                f"{linjer / (hentning + serialisering):14.0f}"
+            )
+        if len(set(resultater.values())) != 1:
+            raise AssertionError("Serialiseringerne giver forskellig JSON")
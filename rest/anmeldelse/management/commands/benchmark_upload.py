@@ -0,0 +1,117 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import base64
+import os
+import time
+import tracemalloc
+from uuid import uuid4
+
+from aktør.models import Afsender, Modtager
+from anmeldelse.models import Afgiftsanmeldelse
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, encode_multipart
+from django.urls import reverse
+from forsendelse.models import Postforsendelse
+from ninja_jwt.tokens import AccessToken
+from project.util import json_dump
+
+
+class Command(BaseCommand):
+    help = (
+        "Måler tid og hukommelse (tracemalloc peak) for upload af en "
+        "leverandørfaktura, som base64 i JSON og som multipart/form-data"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mb", type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Testdata rulles tilbage når målingen er færdig
+        with transaction.atomic():
+            self.benchmark(options["mb"])
+            transaction.set_rollback(True)
+
+    def benchmark(self, mb: int):
+        user = User.objects.create(username=f"benchmark-{uuid4()}", is_superuser=True)
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        url = reverse("api-1.0.0:afgiftsanmeldelse_create")
+        indhold = os.urandom(mb * 1024 * 1024)
+        afsender = Afsender.objects.create(navn="Benchmark", kladde=True)
+        modtager = Modtager.objects.create(navn="Benchmark", kladde=True)
+
+        def data():
+            # Hver afgiftsanmeldelse skal have sin egen forsendelse
+            postforsendelse = Postforsendelse.objects.create(
+                postforsendelsesnummer=uuid4().hex[:20],
+                oprettet_af=user,
+                forsendelsestype=Postforsendelse.Forsendelsestype.SKIB,
+                afsenderbykode="8200",
+                afgangsdato="2023-11-03",
+                kladde=True,
+            )
+            return {
+                "afsender_id": afsender.id,
+                "modtager_id": modtager.id,
+                "postforsendelse_id": postforsendelse.id,
+                "kladde": True,
+                "leverandørfaktura_navn": "faktura.pdf",
+            }
+
+        # Request-bodies bygges før målingen, så kun serverens forbrug tælles med
+        bodies = {
+            "base64/JSON": (
+                json_dump(
+                    {**data(), "leverandørfaktura": base64.b64encode(indhold).decode()}
+                ),
+                "application/json",
+            ),
+            "multipart": (
+                encode_multipart(
+                    BOUNDARY,
+                    {
+                        "payload": json_dump(data()).decode("utf-8"),
+                        "leverandørfaktura": _NamedBytes(indhold, "faktura.pdf"),
+                    },
+                ),
+                f"multipart/form-data; boundary={BOUNDARY}",
+            ),
+        }
+        del indhold
+
+        # base64-payloadet er større end DATA_UPLOAD_MAX_MEMORY_SIZE
+        with override_settings(
+            DATA_UPLOAD_MAX_MEMORY_SIZE=None, ALLOWED_HOSTS=["testserver"]
+        ):
+            for navn, (body, content_type) in bodies.items():
+                tracemalloc.start()
+                start = time.perf_counter()
+                response = client.post(url, body, content_type=content_type)
+                duration = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                if response.status_code != 200:
+                    raise AssertionError(response.content)
+                afgiftsanmeldelse = Afgiftsanmeldelse.objects.get(
+                    id=response.json()["id"]
+                )
+                afgiftsanmeldelse.leverandørfaktura.delete(save=False)
+                self.stdout.write(
+                    f"{navn:12} {len(body) / 1024 / 1024:8.1f} MB sendt"
+                    f"{duration * 1000:10.1f} ms"
+                    f"{peak / 1024 / 1024:10.1f} MB peak"
+                )
+
+
+class _NamedBytes:
+    # Fil-lignende objekt til encode_multipart
+    def __init__(self, content: bytes, name: str):
+        self.content = content
+        self.name = name
+
+    def read(self):
+        return self.content
@@ -0,0 +1,872 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import random
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from itertools import accumulate
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from aktør.models import Afsender, Modtager, Speditør
+from anmeldelse.models import (
+    Afgiftsanmeldelse,
+    AfgiftsanmeldelseAdgang,
+    Notat,
+    PrismeResponse,
+    PrivatAfgiftsanmeldelse,
+    StatistikDag,
+    Varelinje,
+)
+from common.models import IndberetterProfile, Postnummer
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.fields import AutoFieldMixin
+from forsendelse.models import Forsendelse, Fragtforsendelse, Postforsendelse
+from payment.models import Payment
+from project.counting import _bump
+from sats.models import Afgiftstabel, Vareafgiftssats
+from sats.satstabel import satstabeller
+
+# Syntetiske data i produktionsskala til belastningstest.
+#
+# Hvor create_dummy_* opretter en håndfuld rækker én ad gangen, genererer denne
+# kommando hundredtusinder af sammenhængende anmeldelser med varelinjer,
+# aktører, forsendelser, notater, PrismeResponses, betalinger og historik.
+# Rækkerne skrives med PostgreSQL's COPY i blokke, og id'er reserveres fra
+# tabellernes sekvenser, så fremmednøgler kan sættes uden at læse rækkerne
+# tilbage. Afgiftstabeller, satser og speditører er få og oprettes med ORM'en,
+# så deres signaler (kompilerede satstabeller, referencedata) kører som
+# normalt.
+#
+# Alt udledes af --seed med en fast startdato, så to kørsler med samme
+# parametre giver de samme data (bortset fra id'erne, som afhænger af hvad
+# databasen i forvejen indeholder). Ejerskabet er skævt: speditørerne vælges
+# efter en Zipf-fordeling (--skævhed), så få speditører står for de fleste
+# anmeldelser, ligesom afsendere og modtagere.
+#
+# COPY springer signaler over, så afledte data opbygges bagefter: adgangstabellen
+# skrives sammen med anmeldelserne, statistiktabellen genopbygges, cachede
+# optællinger invalideres og tabellerne analyseres.
+
+BLOK = 10000
+
+POSTNUMRE = [
+    (3900, "Nuuk"),
+    (3911, "Sisimiut"),
+    (3913, "Tasiilaq"),
+    (3920, "Qaqortoq"),
+    (3930, "Narsaq"),
+    (3950, "Aasiaat"),
+    (3952, "Ilulissat"),
+    (3985, "Upernavik"),
+]
+FORNAVNE = ["Aputsiaq", "Malik", "Nivi", "Pipaluk", "Hans", "Karen", "Jens", "Ane"]
+EFTERNAVNE = ["Kleist", "Olsen", "Lynge", "Motzfeldt", "Berthelsen", "Petersen"]
+ENHEDER = [
+    Vareafgiftssats.Enhed.KILOGRAM,
+    Vareafgiftssats.Enhed.KILOGRAM,
+    Vareafgiftssats.Enhed.LITER,
+    Vareafgiftssats.Enhed.ANTAL,
+    Vareafgiftssats.Enhed.PROCENT,
+]
+
+TF10_FELTER = (
+    "id",
+    "version",
+    "sidste_ændringsdato",
+    "oprettet_af_id",
+    "oprettet_på_vegne_af_id",
+    "afsender_id",
+    "modtager_id",
+    "fragtforsendelse_id",
+    "postforsendelse_id",
+    "leverandørfaktura_nummer",
+    "leverandørfaktura",
+    "indførselstilladelse_alkohol",
+    "indførselstilladelse_tobak",
+    "afgift_total",
+    "betalt",
+    "dato",
+    "status",
+    "fuldmagtshaver_id",
+    "betales_af",
+    "tf3",
+)
+TF5_FELTER = (
+    "id",
+    "version",
+    "sidste_ændringsdato",
+    "oprettet",
+    "oprettet_af_id",
+    "cpr",
+    "anonym",
+    "navn",
+    "adresse",
+    "postnummer",
+    "by",
+    "telefon",
+    "bookingnummer",
+    "leverandørfaktura_nummer",
+    "indleveringsdato",
+    "leverandørfaktura",
+    "status",
+)
+VARELINJE_FELTER = (
+    "id",
+    "afgiftsanmeldelse_id",
+    "privatafgiftsanmeldelse_id",
+    "vareafgiftssats_id",
+    "mængde",
+    "antal",
+    "fakturabeløb",
+    "afgiftsbeløb",
+    "kladde",
+)
+HISTORIK_FELTER = ("history_date", "history_type", "history_user_id")
+AKTØR_FELTER = (
+    "id",
+    "navn",
+    "adresse",
+    "postnummer",
+    "postnummer_ref_id",
+    "by",
+    "telefon",
+    "cvr",
+    "kladde",
+)
+
+
+def _zipf(antal: int, s: float) -> List[float]:
+    # Kumulerede vægte, hvor element nr. k vejer 1/k^s
+    return list(accumulate(1 / (k**s) for k in range(1, antal + 1)))
+
+
+def _fordeling(tekst: str) -> Tuple[List[str], List[float]]:
+    # "ny=2,godkendt=6" -> (["ny", "godkendt"], kumulerede vægte [2, 8])
+    try:
+        par = [del_.split("=") for del_ in tekst.split(",") if del_]
+        værdier = [navn.strip() for navn, _ in par]
+        vægte = [float(vægt) for _, vægt in par]
+    except ValueError:
+        raise CommandError(f"Ugyldig fordeling '{tekst}', brug fx 'ny=2,godkendt=6'")
+    if not værdier or min(vægte) < 0 or sum(vægte) <= 0:
+        raise CommandError(f"Ugyldig fordeling '{tekst}'")
+    return værdier, list(accumulate(vægte))
+
+
+class _Ids:
+    """
+    Id'er reserveret fra en tabels sekvens i blokke, så rækkerne kan
+    skrives med COPY og refereres før de findes
+    """
+
+    def __init__(self, cursor, model):
+        self.cursor = cursor
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id')",
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        self.sekvens = cursor.fetchone()[0]
+        self.ids = iter(())
+
+    def __call__(self) -> int:
+        id = next(self.ids, None)
+        if id is None:
+            self.cursor.execute(
+                "SELECT setval(%s, nextval(%s) + %s - 1)",
+                [self.sekvens, self.sekvens, BLOK],
+            )
+            sidste = self.cursor.fetchone()[0]
+            self.ids = iter(range(sidste - BLOK + 1, sidste + 1))
+            id = next(self.ids)
+        return id
+
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _tekst(værdi) -> str:
+    # En værdi i COPY's tekstformat
+    if værdi is None:
+        return "\\N"
+    if værdi is True:
+        return "t"
+    if værdi is False:
+        return "f"
+    if isinstance(værdi, str):
+        return værdi.translate(_ESCAPES)
+    if isinstance(værdi, (date, datetime)):
+        return værdi.isoformat()
+    return str(værdi)
+
+
+def _kopier(cursor, model, felter: Sequence[str], rækker: List[tuple]) -> int:
+    """
+    Skriver rækkerne til modellens tabel med COPY; `felter` er attnames.
+    Øvrige felter med en standardværdi får den, da databasen ikke kender den
+    """
+    if not rækker:
+        return 0
+    quote = connection.ops.quote_name
+    standard = [
+        field
+        for field in model._meta.concrete_fields
+        if field.attname not in felter
+        and field.has_default()
+        and not isinstance(field, AutoFieldMixin)
+    ]
+    kolonner = ", ".join(
+        quote(field.column)
+        for field in [model._meta.get_field(felt) for felt in felter] + standard
+    )
+    standardværdier = "".join("\t" + _tekst(field.get_default()) for field in standard)
+    # Rækkerne formateres her og skrives samlet; psycopg's write_row
+    # konverterer værdi for værdi og er mange gange langsommere
+    data = "".join(
+        "\t".join(map(_tekst, række)) + standardværdier + "\n" for række in rækker
+    )
+    with cursor.cursor.copy(
+        f"COPY {quote(model._meta.db_table)} ({kolonner}) FROM STDIN"
+    ) as copy:
+        copy.write(data.encode("utf-8"))
+    return len(rækker)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genererer store mængder sammenhængende, deterministiske testdata til "
+        "belastningstest. Opretter også afgiftstabeller, som afløser "
+        "eksisterende tabeller i perioden"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--anmeldelser", type=int, default=100000)
+        parser.add_argument("--privatanmeldelser", type=int, default=20000)
+        parser.add_argument("--speditører", type=int, default=25)
+        parser.add_argument("--virksomheder", type=int, default=2000)
+        parser.add_argument("--borgere", type=int, default=5000)
+        parser.add_argument("--aktører", type=int, default=5000)
+        parser.add_argument("--tabeller", type=int, default=6)
+        parser.add_argument("--satser", type=int, default=40)
+        parser.add_argument("--fra", type=date.fromisoformat, default="2019-01-01")
+        parser.add_argument("--år", type=int, default=6)
+        parser.add_argument(
+            "--varelinjer",
+            type=float,
+            default=3.0,
+            help="Gennemsnitligt antal varelinjer pr. anmeldelse",
+        )
+        parser.add_argument(
+            "--historik",
+            type=float,
+            default=1.0,
+            help="Gennemsnitligt antal ændringer pr. anmeldelse efter oprettelsen",
+        )
+        parser.add_argument(
+            "--skævhed",
+            type=float,
+            default=1.1,
+            help="Zipf-eksponent for fordelingen af anmeldelser på speditører "
+            "og aktører (0 = jævn)",
+        )
+        parser.add_argument(
+            "--andel-speditør",
+            type=float,
+            default=0.7,
+            help="Andel af TF10-anmeldelser indberettet af en speditør",
+        )
+        parser.add_argument(
+            "--status-tf10",
+            type=_fordeling,
+            default="kladde=3,ny=12,afvist=5,godkendt=30,afsluttet=50",
+        )
+        parser.add_argument(
+            "--status-tf5",
+            type=_fordeling,
+            default="ny=15,annulleret=3,afvist=5,godkendt=37,afsluttet=40",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        seed = options["seed"]
+        if User.objects.filter(username__startswith=f"belastning-{seed}-").exists():
+            raise CommandError(f"Der findes allerede testdata med --seed {seed}")
+        self.rnd = random.Random(seed)
+        self.prefix = f"belastning-{seed}"
+        start = datetime.combine(options["fra"], datetime.min.time(), timezone.utc)
+        self.start = start
+        self.periode = (
+            start.replace(year=start.year + options["år"]) - start
+        ).total_seconds()
+        self.antal: Dict[str, int] = {}
+        self.tid: Dict[str, float] = {}
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.cursor = cursor
+            self.måling("satser", self.opret_satser)
+            self.måling("speditører", self.opret_speditører)
+            self.måling("brugere", self.opret_brugere)
+            self.måling("aktører", self.opret_aktører)
+            self.måling("tf10", self.opret_tf10)
+            self.måling("tf5", self.opret_tf5)
+            self.måling("efterbehandling", self.efterbehandling)
+
+        bredde = max(len(navn) for navn in self.antal)
+        for navn, antal in self.antal.items():
+            self.stdout.write(f"{navn:{bredde}}{antal:>12}")
+        for navn, sekunder in self.tid.items():
+            self.stdout.write(f"{navn:{bredde}}{sekunder:>10.1f} s")
+
+    def måling(self, navn: str, funktion):
+        start = time.perf_counter()
+        funktion()
+        self.tid[navn] = time.perf_counter() - start
+
+    def kopier(self, model, felter: Sequence[str], rækker: List[tuple]):
+        antal = _kopier(self.cursor, model, felter, rækker)
+        navn = model._meta.label
+        self.antal[navn] = self.antal.get(navn, 0) + antal
+
+    def tidspunkt(self, brøk: float) -> datetime:
+        # Et tidspunkt `brøk` (0-1) inde i perioden
+        return self.start + timedelta(seconds=int(brøk * self.periode))
+
+    def vælg(self, elementer: Sequence, vægte: List[float]):
+        return self.rnd.choices(elementer, cum_weights=vægte)[0]
+
+    def opret_satser(self):
+        # Afgiftstabeller jævnt fordelt over perioden, med stigende satser
+        self.tabeller: List[Tuple[datetime, list]] = []
+        antal = self.options["tabeller"]
+        for nummer in range(antal):
+            tabel = Afgiftstabel.objects.create(
+                gyldig_fra=self.tidspunkt(nummer / antal), kladde=False
+            )
+            for kode in range(1, self.options["satser"] + 1):
+                enhed = self.rnd.choice(ENHEDER)
+                Vareafgiftssats.objects.create(
+                    afgiftstabel=tabel,
+                    vareart_da=f"Belastning {kode}",
+                    vareart_kl=f"Belastning {kode}",
+                    afgiftsgruppenummer=10000 + kode,
+                    enhed=enhed,
+                    afgiftssats=(
+                        (
+                            Decimal(self.rnd.randint(1, 30))
+                            if enhed == Vareafgiftssats.Enhed.PROCENT
+                            else Decimal(self.rnd.randint(50, 20000)) / 100
+                        )
+                        * (1 + Decimal(nummer) / 20)
+                    ).quantize(Decimal("0.01")),
+                )
+            self.tabeller.append((tabel.gyldig_fra, tabel.id))
+        self.tabel_starter = [gyldig_fra for gyldig_fra, _ in self.tabeller]
+        kompileret = satstabeller()
+        self.satser = [
+            sorted(
+                kompileret.tabeller[id].satser_pr_kode.values(),
+                key=lambda sats: sats.afgiftsgruppenummer,
+            )
+            for _, id in self.tabeller
+        ]
+        self.antal[Vareafgiftssats._meta.label] = antal * self.options["satser"]
+
+    def satser_for(self, dato: datetime) -> list:
+        return self.satser[max(bisect_right(self.tabel_starter, dato) - 1, 0)]
+
+    def opret_speditører(self):
+        seed = self.options["seed"]
+        self.speditører = []
+        for nummer in range(self.options["speditører"]):
+            speditør = Speditør.objects.create(
+                cvr=40000000 + (seed % 1000) * 10000 + nummer,
+                navn=f"Speditør {seed}-{nummer}",
+            )
+            self.speditører.append(speditør.cvr)
+        self.speditør_vægte = _zipf(len(self.speditører), self.options["skævhed"])
+
+    def opret_brugere(self):
+        seed = self.options["seed"]
+        user_id = _Ids(self.cursor, User)
+        profil_id = _Ids(self.cursor, IndberetterProfile)
+        brugere = []
+        profiler = []
+        grupper = []
+        erhverv = Group.objects.filter(name="ErhvervIndberettere").first()
+        privat = Group.objects.filter(name="PrivatIndberettere").first()
+
+        def opret(gruppe: Optional[Group], cpr=None, cvr=None) -> int:
+            id = user_id()
+            brugere.append(
+                (
+                    id,
+                    "!",  # Ubrugelig adgangskode; der logges ind med api-nøglen
+                    f"{self.prefix}-{len(brugere)}",
+                    self.rnd.choice(FORNAVNE),
+                    self.rnd.choice(EFTERNAVNE),
+                    "",
+                    False,
+                    False,
+                    True,
+                    self.start,
+                )
+            )
+            profiler.append(
+                (
+                    profil_id(),
+                    id,
+                    cpr,
+                    cvr,
+                    str(UUID(int=self.rnd.getrandbits(128))),
+                )
+            )
+            if gruppe is not None:
+                grupper.append((id, gruppe.id))
+            return id
+
+        # Speditørernes brugere; de store speditører har flest
+        self.speditør_brugere: Dict[int, List[int]] = {}
+        vægte = [1 / (k ** self.options["skævhed"]) for k in range(1, 1000)]
+        for nummer, cvr in enumerate(self.speditører):
+            antal = max(1, int(10 * vægte[min(nummer, len(vægte) - 1)]))
+            self.speditør_brugere[cvr] = [opret(erhverv, cvr=cvr) for _ in range(antal)]
+        # Virksomheder der selv indberetter eller giver fuldmagt
+        base = 50000000 + (seed % 1000) * 10000
+        self.virksomheder = [
+            opret(erhverv, cvr=base + nummer)
+            for nummer in range(self.options["virksomheder"])
+        ]
+        self.cvr = {
+            user: cvr for cvr, users in self.speditør_brugere.items() for user in users
+        }
+        self.cvr.update(
+            {user: base + nummer for nummer, user in enumerate(self.virksomheder)}
+        )
+        # Borgere med private anmeldelser
+        base = 1000000000 + (seed % 1000) * 1000000
+        self.borgere = [
+            (opret(privat, cpr=base + nummer), base + nummer)
+            for nummer in range(self.options["borgere"])
+        ]
+        self.kopier(
+            User,
+            (
+                "id",
+                "password",
+                "username",
+                "first_name",
+                "last_name",
+                "email",
+                "is_superuser",
+                "is_staff",
+                "is_active",
+                "date_joined",
+            ),
+            brugere,
+        )
+        self.kopier(
+            IndberetterProfile, ("id", "user_id", "cpr", "cvr", "api_key"), profiler
+        )
+        self.kopier(User.groups.through, ("user_id", "group_id"), grupper)
+
+    def opret_aktører(self):
+        postnumre = dict(
+            Postnummer.objects.order_by("-pk").values_list("postnummer", "pk")
+        )
+        self.aktører = {}
+        for model in (Afsender, Modtager):
+            ids = _Ids(self.cursor, model)
+            rækker = []
+            for nummer in range(self.options["aktører"]):
+                postnummer, by = self.rnd.choice(POSTNUMRE)
+                rækker.append(
+                    (
+                        ids(),
+                        f"{model.__name__} {nummer}",
+                        f"{self.rnd.choice(EFTERNAVNE)}vej {self.rnd.randint(1, 200)}",
+                        postnummer,
+                        postnumre.get(postnummer),
+                        by,
+                        str(self.rnd.randint(100000, 999999)),
+                        self.rnd.randint(10000000, 99999999),
+                        False,
+                    )
+                )
+            self.kopier(model, AKTØR_FELTER, rækker)
+            self.aktører[model] = [række[0] for række in rækker]
+        self.aktør_vægte = _zipf(self.options["aktører"], self.options["skævhed"])
+
+    def leverandørfaktura(self) -> str:
+        # Alle anmeldelser deler én fil, så filerne ikke fylder
+        navn = f"leverandørfakturaer/{self.prefix}/leverandørfaktura.pdf"
+        if not default_storage.exists(navn):
+            default_storage.save(navn, ContentFile(b"%PDF-1.4\n", name="faktura.pdf"))
+        return navn
+
+    def varelinjer(self, dato: datetime, **anmeldelse) -> Tuple[list, Decimal]:
+        middel = self.options["varelinjer"]
+        antal = 1
+        if middel > 1:
+            antal += min(int(self.rnd.expovariate(1 / (middel - 1))), 99)
+        satser = self.satser_for(dato)
+        linjer = []
+        total = Decimal(0)
+        for _ in range(antal):
+            sats = self.rnd.choice(satser)
+            linje = SimpleNamespace(
+                mængde=None,
+                antal=None,
+                fakturabeløb=Decimal(self.rnd.randint(100, 5000000)) / 100,
+            )
+            if sats.enhed in (
+                Vareafgiftssats.Enhed.KILOGRAM,
+                Vareafgiftssats.Enhed.LITER,
+            ):
+                linje.mængde = Decimal(self.rnd.randint(1, 2000000)) / 1000
+            elif sats.enhed == Vareafgiftssats.Enhed.ANTAL:
+                linje.antal = self.rnd.randint(1, 500)
+            afgiftsbeløb = sats.beregn_afgift(linje)
+            total += afgiftsbeløb
+            linjer.append(
+                (
+                    self.varelinje_id(),
+                    anmeldelse.get("afgiftsanmeldelse"),
+                    anmeldelse.get("privatafgiftsanmeldelse"),
+                    sats.id,
+                    linje.mængde,
+                    linje.antal,
+                    linje.fakturabeløb,
+                    afgiftsbeløb,
+                    False,
+                )
+            )
+        return linjer, total
+
+    def ændringer(self, dato: datetime, slutstatus: str, første: str) -> list:
+        # Tidspunkter og status for anmeldelsens versioner: oprettelsen,
+        # et antal ændringer og til sidst skiftet til slutstatus
+        middel = self.options["historik"]
+        ekstra = int(self.rnd.expovariate(1 / middel)) if middel > 0 else 0
+        versioner = [(dato, første)]
+        for _ in range(min(ekstra, 20)):
+            dato += timedelta(minutes=self.rnd.randint(1, 7 * 24 * 60))
+            versioner.append((dato, første))
+        if slutstatus != første:
+            dato += timedelta(minutes=self.rnd.randint(1, 14 * 24 * 60))
+            versioner.append((dato, slutstatus))
+        return versioner
+
+    def opret_tf10(self):
+        self.varelinje_id = _Ids(self.cursor, Varelinje)
+        anmeldelse_id = _Ids(self.cursor, Afgiftsanmeldelse)
+        forsendelse_id = {
+            model: _Ids(self.cursor, model)
+            for model in (Fragtforsendelse, Postforsendelse)
+        }
+        faktura = self.leverandørfaktura()
+        statusser, status_vægte = self.options["status_tf10"]
+        antal = self.options["anmeldelser"]
+        for blok in range(0, antal, BLOK):
+            rækker: Dict[str, list] = {
+                navn: []
+                for navn in (
+                    "anmeldelser",
+                    "historik",
+                    "varelinjer",
+                    "varelinjehistorik",
+                    "fragt",
+                    "post",
+                    "notater",
+                    "prisme",
+                    "adgang",
+                )
+            }
+            for nummer in range(blok, min(blok + BLOK, antal)):
+                id = anmeldelse_id()
+                dato = self.tidspunkt((nummer + self.rnd.random()) / antal)
+                if self.rnd.random() < self.options["andel_speditør"]:
+                    fuldmagtshaver = self.vælg(self.speditører, self.speditør_vægte)
+                    oprettet_af = self.rnd.choice(self.speditør_brugere[fuldmagtshaver])
+                    på_vegne_af = self.rnd.choice(self.virksomheder)
+                else:
+                    fuldmagtshaver = på_vegne_af = None
+                    oprettet_af = self.rnd.choice(self.virksomheder)
+
+                afgangsdato = (dato - timedelta(days=self.rnd.randint(0, 30))).date()
+                if self.rnd.random() < 0.6:
+                    model = Fragtforsendelse
+                    forsendelse = (
+                        forsendelse_id[model](),
+                        Forsendelse.Forsendelsestype.SKIB,
+                        oprettet_af,
+                        afgangsdato,
+                        False,
+                        f"BELAS{nummer % 10000000:07}",
+                        f"ABC {self.rnd.randint(0, 999):03}",
+                    )
+                    rækker["fragt"].append(forsendelse)
+                    fragt, post = forsendelse[0], None
+                else:
+                    model = Postforsendelse
+                    forsendelse = (
+                        forsendelse_id[model](),
+                        Forsendelse.Forsendelsestype.FLY,
+                        oprettet_af,
+                        afgangsdato,
+                        False,
+                        str(self.rnd.randint(10000000, 99999999)),
+                        "8200",
+                    )
+                    rækker["post"].append(forsendelse)
+                    fragt, post = None, forsendelse[0]
+
+                linjer, total = self.varelinjer(dato, afgiftsanmeldelse=id)
+                status = self.vælg(statusser, status_vægte)
+                versioner = self.ændringer(
+                    dato, status, "kladde" if status == "kladde" else "ny"
+                )
+
+                # Versionerne i historikken deler aktører og fakturanummer
+                sidste = (
+                    id,
+                    len(versioner),
+                    versioner[-1][0],
+                    oprettet_af,
+                    på_vegne_af,
+                    self.vælg(self.aktører[Afsender], self.aktør_vægte),
+                    self.vælg(self.aktører[Modtager], self.aktør_vægte),
+                    fragt,
+                    post,
+                    str(self.rnd.randint(1000, 99999999)),
+                    faktura,
+                    None,
+                    None,
+                    total,
+                    status in ("godkendt", "afsluttet"),
+                    dato,
+                    status,
+                    fuldmagtshaver,
+                    "afsender",
+                    False,
+                )
+                rækker["anmeldelser"].append(sidste)
+                for version, (ændret, version_status) in enumerate(versioner, 1):
+                    rækker["historik"].append(
+                        sidste[:1]
+                        + (version, ændret)
+                        + sidste[3:16]
+                        + (version_status,)
+                        + sidste[17:]
+                        + (ændret, "+" if version == 1 else "~", oprettet_af)
+                    )
+                rækker["varelinjer"] += linjer
+                rækker["varelinjehistorik"] += [
+                    linje + (dato, "+", oprettet_af) for linje in linjer
+                ]
+                if self.rnd.random() < 0.2:
+                    for _ in range(self.rnd.randint(1, 3)):
+                        index = self.rnd.randrange(len(versioner))
+                        rækker["notater"].append(
+                            (
+                                oprettet_af,
+                                f"Notat til version {index + 1}",
+                                versioner[index][0],
+                                id,
+                                index,
+                            )
+                        )
+                if status == "afsluttet":
+                    rækker["prisme"].append(
+                        (
+                            id,
+                            self.rnd.randint(1000000000, 9999999999),
+                            self.rnd.randint(10000000, 99999999),
+                            versioner[-1][0],
+                        )
+                    )
+                for user in {oprettet_af, på_vegne_af} - {None}:
+                    rækker["adgang"].append((id, None, user))
+                for cvr in {
+                    self.cvr[oprettet_af],
+                    self.cvr.get(på_vegne_af),
+                    fuldmagtshaver,
+                } - {None}:
+                    rækker["adgang"].append((id, cvr, None))
+
+            forsendelse_felter = (
+                "id",
+                "forsendelsestype",
+                "oprettet_af_id",
+                "afgangsdato",
+                "kladde",
+            )
+            self.kopier(
+                Fragtforsendelse,
+                forsendelse_felter + ("fragtbrevsnummer", "forbindelsesnr"),
+                rækker["fragt"],
+            )
+            self.kopier(
+                Postforsendelse,
+                forsendelse_felter + ("postforsendelsesnummer", "afsenderbykode"),
+                rækker["post"],
+            )
+            self.kopier(Afgiftsanmeldelse, TF10_FELTER, rækker["anmeldelser"])
+            self.kopier(
+                Afgiftsanmeldelse.history.model,
+                TF10_FELTER + HISTORIK_FELTER,
+                rækker["historik"],
+            )
+            self.kopier(Varelinje, VARELINJE_FELTER, rækker["varelinjer"])
+            self.kopier(
+                Varelinje.history.model,
+                VARELINJE_FELTER + HISTORIK_FELTER,
+                rækker["varelinjehistorik"],
+            )
+            self.kopier(
+                Notat,
+                ("user_id", "tekst", "oprettet", "afgiftsanmeldelse_id", "index"),
+                rækker["notater"],
+            )
+            self.kopier(
+                PrismeResponse,
+                (
+                    "afgiftsanmeldelse_id",
+                    "rec_id",
+                    "tax_notification_number",
+                    "delivery_date",
+                ),
+                rækker["prisme"],
+            )
+            self.kopier(
+                AfgiftsanmeldelseAdgang,
+                ("afgiftsanmeldelse_id", "cvr", "user_id"),
+                rækker["adgang"],
+            )
+
+    def opret_tf5(self):
+        anmeldelse_id = _Ids(self.cursor, PrivatAfgiftsanmeldelse)
+        statusser, status_vægte = self.options["status_tf5"]
+        antal = self.options["privatanmeldelser"]
+        provider = Payment._meta.get_field("provider").get_default()
+        for blok in range(0, antal, BLOK):
+            anmeldelser = []
+            historik = []
+            varelinjer = []
+            varelinjehistorik = []
+            betalinger = []
+            for nummer in range(blok, min(blok + BLOK, antal)):
+                id = anmeldelse_id()
+                dato = self.tidspunkt((nummer + self.rnd.random()) / antal)
+                oprettet_af, cpr = self.rnd.choice(self.borgere)
+                postnummer, by = self.rnd.choice(POSTNUMRE)
+                linjer, total = self.varelinjer(dato, privatafgiftsanmeldelse=id)
+                status = self.vælg(statusser, status_vægte)
+                versioner = self.ændringer(dato, status, "ny")
+                sidste = (
+                    id,
+                    len(versioner),
+                    versioner[-1][0],
+                    dato,
+                    oprettet_af,
+                    cpr,
+                    False,
+                    f"{self.rnd.choice(FORNAVNE)} {self.rnd.choice(EFTERNAVNE)}",
+                    f"{self.rnd.choice(EFTERNAVNE)}vej {self.rnd.randint(1, 200)}",
+                    postnummer,
+                    by,
+                    str(self.rnd.randint(100000, 999999)),
+                    str(self.rnd.randint(100000, 999999)),
+                    str(self.rnd.randint(100000, 999999)),
+                    (dato + timedelta(days=self.rnd.randint(1, 30))).date(),
+                    None,
+                    status,
+                )
+                anmeldelser.append(sidste)
+                for version, (ændret, version_status) in enumerate(versioner, 1):
+                    historik.append(
+                        sidste[:1]
+                        + (version, ændret)
+                        + sidste[3:16]
+                        + (version_status,)
+                        + (ændret, "+" if version == 1 else "~", oprettet_af)
+                    )
+                varelinjer += linjer
+                varelinjehistorik += [
+                    linje + (dato, "+", oprettet_af) for linje in linjer
+                ]
+                if status in ("godkendt", "afsluttet"):
+                    betalinger.append(
+                        (
+                            int(total * 100),
+                            "DKK",
+                            str(id),
+                            provider,
+                            id,
+                            "paid",
+                            versioner[-1][0],
+                            versioner[-1][0],
+                        )
+                    )
+            self.kopier(PrivatAfgiftsanmeldelse, TF5_FELTER, anmeldelser)
+            self.kopier(
+                PrivatAfgiftsanmeldelse.history.model,
+                TF5_FELTER + HISTORIK_FELTER,
+                historik,
+            )
+            self.kopier(Varelinje, VARELINJE_FELTER, varelinjer)
+            self.kopier(
+                Varelinje.history.model,
+                VARELINJE_FELTER + HISTORIK_FELTER,
+                varelinjehistorik,
+            )
+            self.kopier(
+                Payment,
+                (
+                    "amount",
+                    "currency",
+                    "reference",
+                    "provider",
+                    "declaration_id",
+                    "status",
+                    "created",
+                    "updated",
+                ),
+                betalinger,
+            )
+
+    def efterbehandling(self):
+        self.antal[StatistikDag._meta.label] = StatistikDag.genopbyg()
+        modeller = [
+            User,
+            IndberetterProfile,
+            Afsender,
+            Modtager,
+            Fragtforsendelse,
+            Postforsendelse,
+            Afgiftsanmeldelse,
+            Afgiftsanmeldelse.history.model,
+            PrivatAfgiftsanmeldelse,
+            PrivatAfgiftsanmeldelse.history.model,
+            Varelinje,
+            Varelinje.history.model,
+            Notat,
+            PrismeResponse,
+            AfgiftsanmeldelseAdgang,
+            Payment,
+        ]
+        for model in modeller:
+            # Cachede optællinger (project/counting.py) ser ikke COPY
+            _bump(model._meta.db_table)
+            # Planlæggerens estimater skal kende de nye rækker
+            self.cursor.execute(
+                f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}"
+            )
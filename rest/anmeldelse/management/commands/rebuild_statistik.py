@@ -0,0 +1,37 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from anmeldelse.models import StatistikDag
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Genopbygger statistiktabellen (StatistikDag) fra varelinjerne, "
+        "eller kontrollerer den med --check"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Sammenlign tabellen med varelinjerne uden at ændre den",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            forskelle = StatistikDag.forskelle()
+            for (dato, anmeldelsestype, sats_id), tabel, beregnet in forskelle:
+                self.stdout.write(
+                    f"{dato} {anmeldelsestype} vareafgiftssats={sats_id}: "
+                    f"tabel={tabel} beregnet={beregnet}"
+                )
+            if forskelle:
+                raise CommandError(
+                    f"{len(forskelle)} forskelle; kør rebuild_statistik uden --check"
+                )
+            self.stdout.write("Statistiktabellen stemmer")
+        else:
+            antal = StatistikDag.genopbyg()
+            self.stdout.write(f"Statistiktabellen genopbygget med {antal} rækker")
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:47
+
+import anmeldelse.mixins
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def udfyld_version(apps, schema_editor):
+    # Eksisterende rækker får versionen og tidsstemplet fra deres historik
+    for model_name in ("Afgiftsanmeldelse", "PrivatAfgiftsanmeldelse"):
+        model = apps.get_model("anmeldelse", model_name)
+        history = apps.get_model("anmeldelse", "Historical" + model_name)
+        historik = history.objects.filter(id=OuterRef("id"))
+        model.objects.update(
+            version=Coalesce(
+                Subquery(
+                    historik.order_by()
+                    .values("id")
+                    .annotate(antal=Count("history_id"))
+                    .values("antal")
+                ),
+                Value(0),
+            ),
+            sidste_ændringsdato=Subquery(
+                historik.order_by("-history_date").values("history_date")[:1]
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("anmeldelse", "0019_remove_afgiftsanmeldelse_indførselstilladelse_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="afgiftsanmeldelse",
+            name="sidste_ændringsdato",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="afgiftsanmeldelse",
+            name="version",
+            field=anmeldelse.mixins.VersionField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="historicalafgiftsanmeldelse",
+            name="sidste_ændringsdato",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalafgiftsanmeldelse",
+            name="version",
+            field=anmeldelse.mixins.VersionField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="historicalprivatafgiftsanmeldelse",
+            name="sidste_ændringsdato",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalprivatafgiftsanmeldelse",
+            name="version",
+            field=anmeldelse.mixins.VersionField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="privatafgiftsanmeldelse",
+            name="sidste_ændringsdato",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="privatafgiftsanmeldelse",
+            name="version",
+            field=anmeldelse.mixins.VersionField(default=0, editable=False),
+        ),
+        migrations.RunPython(udfyld_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def udfyld_adgang(apps, schema_editor):
+    # Samme regler som AfgiftsanmeldelseAdgang.opdater
+    Afgiftsanmeldelse = apps.get_model("anmeldelse", "Afgiftsanmeldelse")
+    AfgiftsanmeldelseAdgang = apps.get_model("anmeldelse", "AfgiftsanmeldelseAdgang")
+    rækker = []
+    for (
+        id,
+        oprettet_af,
+        oprettet_på_vegne_af,
+        oprettet_af_cvr,
+        oprettet_på_vegne_af_cvr,
+        fuldmagtshaver_cvr,
+    ) in (
+        Afgiftsanmeldelse.objects.order_by()
+        .values_list(
+            "id",
+            "oprettet_af_id",
+            "oprettet_på_vegne_af_id",
+            "oprettet_af__indberetter_data__cvr",
+            "oprettet_på_vegne_af__indberetter_data__cvr",
+            "fuldmagtshaver_id",
+        )
+        .iterator(chunk_size=2000)
+    ):
+        for user_id in {oprettet_af, oprettet_på_vegne_af} - {None}:
+            rækker.append(
+                AfgiftsanmeldelseAdgang(afgiftsanmeldelse_id=id, user_id=user_id)
+            )
+        for cvr in {oprettet_af_cvr, oprettet_på_vegne_af_cvr, fuldmagtshaver_cvr} - {
+            None
+        }:
+            rækker.append(AfgiftsanmeldelseAdgang(afgiftsanmeldelse_id=id, cvr=cvr))
+        if len(rækker) >= 2000:
+            AfgiftsanmeldelseAdgang.objects.bulk_create(rækker)
+            rækker = []
+    AfgiftsanmeldelseAdgang.objects.bulk_create(rækker)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("anmeldelse", "0020_version_sidste_aendringsdato"),
+        ("common", "0009_alter_indberetterprofile_unique_together"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AfgiftsanmeldelseAdgang",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cvr", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "afgiftsanmeldelse",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="adgange",
+                        to="anmeldelse.afgiftsanmeldelse",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["cvr", "afgiftsanmeldelse"],
+                        name="anmeldelse__cvr_5aa749_idx",
+                    ),
+                    models.Index(
+                        fields=["user", "afgiftsanmeldelse"],
+                        name="anmeldelse__user_id_b76e5a_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(("cvr__isnull", False), ("user__isnull", True)),
+                            models.Q(("cvr__isnull", True), ("user__isnull", False)),
+                            _connector="OR",
+                        ),
+                        name="adgang_har_enten_cvr_eller_user",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(udfyld_adgang, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def udfyld_statistik(apps, schema_editor):
+    # Samme aggregering som StatistikDag.aggreger
+    Varelinje = apps.get_model("anmeldelse", "Varelinje")
+    StatistikDag = apps.get_model("anmeldelse", "StatistikDag")
+    rækker = (
+        Varelinje.objects.filter(
+            Q(afgiftsanmeldelse__status="afsluttet")
+            | Q(privatafgiftsanmeldelse__status="afsluttet"),
+            vareafgiftssats__isnull=False,
+        )
+        .annotate(
+            statistik_dato=Coalesce(
+                TruncDate(
+                    "afgiftsanmeldelse__dato", tzinfo=timezone.get_default_timezone()
+                ),
+                "privatafgiftsanmeldelse__indleveringsdato",
+            ),
+            statistik_type=Case(
+                When(afgiftsanmeldelse__isnull=False, then=Value("tf10")),
+                default=Value("tf5"),
+            ),
+        )
+        .order_by()
+        .values("statistik_dato", "statistik_type", "vareafgiftssats_id")
+        .annotate(
+            sum_afgiftsbeløb=Sum("afgiftsbeløb", default=0),
+            sum_mængde=Sum("mængde", default=0),
+            sum_antal=Sum("antal", default=0),
+        )
+    )
+    StatistikDag.objects.bulk_create(
+        (
+            StatistikDag(
+                dato=row["statistik_dato"],
+                anmeldelsestype=row["statistik_type"],
+                vareafgiftssats_id=row["vareafgiftssats_id"],
+                sum_afgiftsbeløb=row["sum_afgiftsbeløb"],
+                sum_mængde=row["sum_mængde"],
+                sum_antal=row["sum_antal"],
+            )
+            for row in rækker.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("anmeldelse", "0021_afgiftsanmeldelseadgang"),
+        ("sats", "0005_remove_vareafgiftssats_kræver_indførselstilladelse_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatistikDag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dato", models.DateField(db_index=True)),
+                (
+                    "anmeldelsestype",
+                    models.CharField(
+                        choices=[("tf5", "TF5"), ("tf10", "TF10")], max_length=4
+                    ),
+                ),
+                (
+                    "sum_afgiftsbeløb",
+                    models.DecimalField(decimal_places=2, max_digits=20),
+                ),
+                ("sum_mængde", models.DecimalField(decimal_places=3, max_digits=20)),
+                ("sum_antal", models.BigIntegerField()),
+                (
+                    "vareafgiftssats",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="sats.vareafgiftssats",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dato", "anmeldelsestype", "vareafgiftssats"),
+                        name="statistikdag_unik",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(udfyld_statistik, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,49 @@
 # SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 
-class HistoryTimestampMixin:
-    @property
-    def sidste_ændringsdato(self) -> str | None:
-        """Return ISO timestamp of latest historical record, or None if none exist."""
-        latest = self.history.order_by("-history_date").first()  # type: ignore
-        return latest.history_date.isoformat() if latest else None
+class VersionField(models.PositiveIntegerField):
+    """
+    Versionstæller der tælles op i selve UPDATE-sætningen, så to samtidige
+    gemninger ikke kan tælle op til samme version, uden at rækken skal låses
+    og læses først.
+    """
+
+    def pre_save(self, model_instance, add):
+        if add:
+            return super().pre_save(model_instance, add)
+        return F(self.attname) + 1
+
+
+class VersionMixin(models.Model):
+    """
+    Versionstæller og tidspunkt for seneste ændring, gemt på selve rækken.
+    Begge opdateres ved hver save(), så samtidige ændringer kan opdages
+    (If-Match) uden opslag i historiktabellen.
+    """
+
+    class Meta:
+        abstract = True
+
+    version = VersionField(default=0, editable=False)
+    sidste_ændringsdato = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "version",
+                "sidste_ændringsdato",
+            }
+        # Databasen tæller op fra sin egen værdi (se VersionField); instansen
+        # (og dermed historikken) får den version den selv forventer. Er rækken
+        # ændret siden instansen blev hentet, er den for lav, ligesom instansens
+        # øvrige felter er forældede. Opdateringer via API'et låser derfor rækken.
+        self.version = 1 if self._state.adding else self.version + 1
+        self.sidste_ændringsdato = timezone.now()
+        super().save(*args, **kwargs)
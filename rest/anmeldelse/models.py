@@ -1,25 +1,42 @@
 # SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Set, Tuple
 
 from aktør.models import Afsender, Modtager, Speditør
-from common.models import Postnummer
-from common.util import dato_måned_slut
+from common.models import IndberetterProfile, Postnummer
+from common.util import MånedSlut, dato_måned_slut
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import CheckConstraint, Q
-from django.db.models.signals import post_delete, post_save
+from django.db import models, transaction
+from django.db.models import (
+    Case,
+    CheckConstraint,
+    DateField,
+    ExpressionWrapper,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from forsendelse.models import Fragtforsendelse, Postforsendelse
 from sats.models import Vareafgiftssats
+from sats.satstabel import satstabeller
 from simple_history.models import HistoricalRecords, HistoricForeignKey
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
-from .mixins import HistoryTimestampMixin
+from .mixins import VersionMixin
 
 
 def afgiftsanmeldelse_upload_to(instance, filename):
@@ -30,7 +47,7 @@ def privatafgiftsanmeldelse_upload_to(instance, filename):
     return f"privatfakturaer/{instance.pk}/{filename}"
 
 
-class Afgiftsanmeldelse(HistoryTimestampMixin, models.Model):
+class Afgiftsanmeldelse(VersionMixin, models.Model):
     class Meta:
         ordering = ["id"]
         constraints = [
@@ -209,9 +226,17 @@ class Afgiftsanmeldelse(HistoryTimestampMixin, models.Model):
         return forsendelse.afgangsdato
 
     @property
-    def beregnet_faktureringsdato(self):
+    def beregnet_faktureringsdato(self) -> date:
+        # Sat hvis objektet kommer fra et queryset annoteret med
+        # annoter_faktureringsdato
+        if getattr(self, "_beregnet_faktureringsdato", None) is not None:
+            return self._beregnet_faktureringsdato
         return self.beregn_faktureringsdato(self)
 
+    @beregnet_faktureringsdato.setter
+    def beregnet_faktureringsdato(self, value: date):
+        self._beregnet_faktureringsdato = value
+
     @staticmethod
     def beregn_faktureringsdato(afgiftsanmeldelse) -> date:
         # Splittet fordi historisk model ikke har ovenstående property
@@ -234,8 +259,39 @@ class Afgiftsanmeldelse(HistoryTimestampMixin, models.Model):
 
         return måned_slut + timedelta(days=ekstra_dage)
 
+    @staticmethod
+    def annoter_faktureringsdato(qs: QuerySet) -> QuerySet:
+        """
+        Annoterer querysettet med beregnet_faktureringsdato, udregnet i
+        databasen efter samme regler som beregn_faktureringsdato.
+        Virker også på querysets af historiske anmeldelser.
+        """
+        ekstra_dage = Case(
+            When(toldkategori="70", then=Value(20)),
+            When(toldkategori="76", then=Value(14)),
+            default=Coalesce(
+                Subquery(
+                    Postnummer.objects.filter(
+                        postnummer=OuterRef("modtager__postnummer")
+                    )
+                    .order_by("pk")
+                    .values("dage")[:1]
+                ),
+                Value(0),
+            ),
+            output_field=models.IntegerField(),
+        )
+        måned_slut = MånedSlut(
+            Coalesce("fragtforsendelse__afgangsdato", "postforsendelse__afgangsdato")
+        )
+        return qs.annotate(
+            beregnet_faktureringsdato=ExpressionWrapper(
+                måned_slut + ekstra_dage, output_field=DateField()
+            )
+        )
+
 
-class PrivatAfgiftsanmeldelse(HistoryTimestampMixin, models.Model):
+class PrivatAfgiftsanmeldelse(VersionMixin, models.Model):
     history = HistoricalRecords()
     oprettet = models.DateTimeField(auto_now_add=True)
     oprettet_af = models.ForeignKey(
@@ -421,8 +477,11 @@ class Varelinje(models.Model):
                 self.afgiftsanmeldelse.save(update_fields=("afgift_total",))
 
     def beregn_afgift(self) -> None:
-        if self.vareafgiftssats:
-            self.afgiftsbeløb = self.vareafgiftssats.beregn_afgift(self)
+        if self.vareafgiftssats_id:
+            # Beregnes med de kompilerede afgiftstabeller, uden databaseopslag
+            self.afgiftsbeløb = (
+                satstabeller().sats(self.vareafgiftssats_id).beregn_afgift(self)
+            )
 
     @property
     def siblings_qs(self):
@@ -451,14 +510,13 @@ class Varelinje(models.Model):
                     gebyr_linje.antal = self.antal
                     gebyr_linje.save()
             else:
-                pant_gebyr_sats = Vareafgiftssats.objects.get(
-                    afgiftstabel=self.vareafgiftssats.afgiftstabel,
-                    afgiftsgruppenummer=102,
+                pant_gebyr_sats = satstabeller().sats_i_tabel(
+                    self.vareafgiftssats.afgiftstabel_id, 102
                 )
                 pant_gebyr, _ = Varelinje.objects.get_or_create(
                     afgiftsanmeldelse=self.afgiftsanmeldelse,
                     privatafgiftsanmeldelse=self.privatafgiftsanmeldelse,
-                    vareafgiftssats=pant_gebyr_sats,
+                    vareafgiftssats_id=pant_gebyr_sats.id,
                     antal=self.antal,
                     mængde=self.mængde,
                 )
@@ -476,6 +534,76 @@ class Varelinje(models.Model):
             if gebyr_linje:
                 gebyr_linje.delete()
 
+    @staticmethod
+    def pant_afstem_gebyr(
+        afgiftsanmeldelse: Optional[Afgiftsanmeldelse] = None,
+        privatafgiftsanmeldelse: Optional[PrivatAfgiftsanmeldelse] = None,
+        history_user: Optional[User] = None,
+    ) -> None:
+        """
+        Afstemmer pantgebyr-linjerne (102) for en hel anmeldelse på én gang, så
+        der er netop én gebyrlinje med samme antal pr. pantlinje (101).
+        Bruges efter bulk-ændringer, i stedet for pant_update_corresponding_gebyr
+        pr. varelinje
+        """
+        linjer = Varelinje.objects.filter(
+            afgiftsanmeldelse=afgiftsanmeldelse,
+            privatafgiftsanmeldelse=privatafgiftsanmeldelse,
+            vareafgiftssats__afgiftsgruppenummer__in=(101, 102),
+        ).select_related("vareafgiftssats")
+        # Pantlinjerne med deres sats
+        pant: List[Tuple[Varelinje, Vareafgiftssats]] = []
+        ledige = []
+        for linje in linjer:
+            sats = linje.vareafgiftssats
+            if sats is not None and sats.afgiftsgruppenummer == 101:
+                pant.append((linje, sats))
+            else:
+                ledige.append(linje)
+
+        mangler = []
+        for linje, sats in pant:
+            gebyr = next((g for g in ledige if g.antal == linje.antal), None)
+            if gebyr is None:
+                mangler.append((linje, sats))
+            else:
+                ledige.remove(gebyr)
+
+        opdater = []
+        opret = []
+        gebyrsatser: dict = {}
+        for linje, sats in mangler:
+            if ledige:
+                # Genbrug en gebyrlinje hvis pantlinje har fået nyt antal
+                gebyr = ledige.pop(0)
+                gebyr.antal = linje.antal
+                opdater.append(gebyr)
+            else:
+                tabel_id = sats.afgiftstabel_id
+                if tabel_id not in gebyrsatser:
+                    gebyrsatser[tabel_id] = satstabeller().sats_i_tabel(tabel_id, 102)
+                gebyr = Varelinje(
+                    afgiftsanmeldelse=afgiftsanmeldelse,
+                    privatafgiftsanmeldelse=privatafgiftsanmeldelse,
+                    vareafgiftssats_id=gebyrsatser[tabel_id].id,
+                    antal=linje.antal,
+                    mængde=linje.mængde,
+                )
+                opret.append(gebyr)
+            gebyr.beregn_afgift()
+
+        if opdater:
+            bulk_update_with_history(
+                opdater,
+                Varelinje,
+                ["antal", "afgiftsbeløb"],
+                default_user=history_user,
+            )
+        if opret:
+            bulk_create_with_history(opret, Varelinje, default_user=history_user)
+        if ledige:
+            Varelinje.objects.filter(pk__in=[gebyr.pk for gebyr in ledige]).delete()
+
 
 class Notat(models.Model):
     class Meta:
@@ -559,6 +687,442 @@ def on_delete_prismeresponse(sender, instance, **kwargs):
         instance.afgiftsanmeldelse.save()
 
 
+class AfgiftsanmeldelseAdgang(models.Model):
+    """
+    Materialiseret adgangstabel: hvilke brugere og CVR-numre der kan se
+    hvilke afgiftsanmeldelser. Afledt af oprettet_af, oprettet_på_vegne_af
+    (og deres CVR-numre) og fuldmagtshaver, og vedligeholdt af signaler,
+    så synlighed kan afgøres med ét indekseret opslag i stedet for joins
+    på tværs af brugere, profiler og speditører.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cvr", "afgiftsanmeldelse"]),
+            models.Index(fields=["user", "afgiftsanmeldelse"]),
+        ]
+        constraints = [
+            CheckConstraint(
+                check=Q(cvr__isnull=False, user__isnull=True)
+                | Q(cvr__isnull=True, user__isnull=False),
+                name="adgang_har_enten_cvr_eller_user",
+            ),
+        ]
+
+    afgiftsanmeldelse = models.ForeignKey(
+        Afgiftsanmeldelse,
+        on_delete=models.CASCADE,
+        related_name="adgange",
+    )
+    cvr = models.PositiveIntegerField(null=True, blank=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    def __str__(self):
+        return (
+            f"AfgiftsanmeldelseAdgang(afgiftsanmeldelse={self.afgiftsanmeldelse_id}, "
+            f"cvr={self.cvr}, user={self.user_id})"
+        )
+
+    @staticmethod
+    def synlige(user: User, cvr: Optional[int] = None) -> QuerySet:
+        """
+        Id'er på de afgiftsanmeldelser brugeren (og evt. CVR-nummeret)
+        har adgang til, til brug i `id__in=`
+        """
+        filters = Q(user=user)
+        if cvr:
+            filters |= Q(cvr=cvr)
+        return AfgiftsanmeldelseAdgang.objects.filter(filters).values(
+            "afgiftsanmeldelse_id"
+        )
+
+    @staticmethod
+    def opdater(anmeldelser: QuerySet, batch_size: int = 2000) -> None:
+        """
+        Genberegner adgangsrækkerne for de givne afgiftsanmeldelser
+        """
+        ids = []
+        rækker = []
+        for (
+            id,
+            oprettet_af,
+            oprettet_på_vegne_af,
+            oprettet_af_cvr,
+            oprettet_på_vegne_af_cvr,
+            fuldmagtshaver_cvr,
+        ) in anmeldelser.order_by().values_list(
+            "id",
+            "oprettet_af_id",
+            "oprettet_på_vegne_af_id",
+            "oprettet_af__indberetter_data__cvr",
+            "oprettet_på_vegne_af__indberetter_data__cvr",
+            "fuldmagtshaver_id",
+        ):
+            ids.append(id)
+            for user_id in {oprettet_af, oprettet_på_vegne_af} - {None}:
+                rækker.append(
+                    AfgiftsanmeldelseAdgang(afgiftsanmeldelse_id=id, user_id=user_id)
+                )
+            for cvr in {
+                oprettet_af_cvr,
+                oprettet_på_vegne_af_cvr,
+                fuldmagtshaver_cvr,
+            } - {None}:
+                rækker.append(AfgiftsanmeldelseAdgang(afgiftsanmeldelse_id=id, cvr=cvr))
+        if ids:
+            AfgiftsanmeldelseAdgang.objects.filter(
+                afgiftsanmeldelse_id__in=ids
+            ).delete()
+            AfgiftsanmeldelseAdgang.objects.bulk_create(rækker, batch_size=batch_size)
+
+    @staticmethod
+    def for_user(user_id: int) -> QuerySet:
+        return Afgiftsanmeldelse.objects.filter(
+            Q(oprettet_af_id=user_id) | Q(oprettet_på_vegne_af_id=user_id)
+        )
+
+
+# Felterne adgangen til en afgiftsanmeldelse afhænger af
+_adgang_felter = ("oprettet_af", "oprettet_på_vegne_af", "fuldmagtshaver")
+
+
+def _adgang_berørt(update_fields) -> bool:
+    return update_fields is None or bool(set(_adgang_felter) & set(update_fields))
+
+
+@receiver(
+    pre_save,
+    sender=Afgiftsanmeldelse,
+    dispatch_uid="afgiftsanmeldelse_gem_adgang",
+)
+def afgiftsanmeldelse_gem_adgang(sender, instance, raw, using, update_fields, **kwargs):
+    # Husk felterne før gemning, så vi kan se om adgangen skal genberegnes
+    instance._adgang_før = (
+        Afgiftsanmeldelse.objects.filter(pk=instance.pk)
+        .values_list(*(f"{felt}_id" for felt in _adgang_felter))
+        .first()
+        if instance.pk and _adgang_berørt(update_fields)
+        else None
+    )
+
+
+@receiver(
+    post_save,
+    sender=Afgiftsanmeldelse,
+    dispatch_uid="afgiftsanmeldelse_opdater_adgang",
+)
+def afgiftsanmeldelse_opdater_adgang(
+    sender, instance, created, raw, using, update_fields, **kwargs
+):
+    if not _adgang_berørt(update_fields):
+        return
+    if not created and getattr(instance, "_adgang_før", None) == tuple(
+        getattr(instance, f"{felt}_id") for felt in _adgang_felter
+    ):
+        return
+    AfgiftsanmeldelseAdgang.opdater(Afgiftsanmeldelse.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_save, sender=IndberetterProfile, dispatch_uid="profil_gem_cvr")
+def profil_gem_cvr(sender, instance, raw, using, update_fields, **kwargs):
+    # Husk CVR-nummeret før gemning, så vi kan se om det er ændret
+    instance._adgang_cvr = (
+        IndberetterProfile.objects.filter(pk=instance.pk)
+        .values_list("cvr", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=IndberetterProfile, dispatch_uid="profil_opdater_adgang")
+def profil_opdater_adgang(
+    sender, instance, created, raw, using, update_fields, **kwargs
+):
+    if created or getattr(instance, "_adgang_cvr", None) != instance.cvr:
+        AfgiftsanmeldelseAdgang.opdater(
+            AfgiftsanmeldelseAdgang.for_user(instance.user_id)
+        )
+
+
+@receiver(pre_delete, sender=IndberetterProfile, dispatch_uid="profil_slet_adgang")
+def profil_slet_adgang(sender, instance, **kwargs):
+    # Anmeldelserne findes før sletningen, da en slettet bruger
+    # nulstiller oprettet_af inden post_delete
+    instance._adgang_anmeldelser = list(
+        AfgiftsanmeldelseAdgang.for_user(instance.user_id).values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=IndberetterProfile, dispatch_uid="profil_slettet_adgang")
+def profil_slettet_adgang(sender, instance, **kwargs):
+    AfgiftsanmeldelseAdgang.opdater(
+        Afgiftsanmeldelse.objects.filter(
+            id__in=getattr(instance, "_adgang_anmeldelser", [])
+        )
+    )
+
+
+class StatistikDag(models.Model):
+    """
+    Daglige totaler af varelinjerne på afsluttede anmeldelser, pr.
+    anmeldelsestype og vareafgiftssats. Statistik for et datointerval læses
+    herfra i stedet for at summere alle varelinjer. Vedligeholdes af
+    signaler når en anmeldelse skifter til eller fra "afsluttet", eller når
+    dens varelinjer ændres; en dag genberegnes altid helt, så rækkerne ikke
+    kan drive. Kan genopbygges med `manage.py rebuild_statistik`.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=("dato", "anmeldelsestype", "vareafgiftssats"),
+                name="statistikdag_unik",
+            ),
+        ]
+
+    TF5 = "tf5"
+    TF10 = "tf10"
+
+    dato = models.DateField(db_index=True)
+    anmeldelsestype = models.CharField(
+        max_length=4, choices=((TF5, "TF5"), (TF10, "TF10"))
+    )
+    vareafgiftssats = models.ForeignKey(
+        Vareafgiftssats,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    sum_afgiftsbeløb = models.DecimalField(max_digits=20, decimal_places=2)
+    sum_mængde = models.DecimalField(max_digits=20, decimal_places=3)
+    sum_antal = models.BigIntegerField()
+
+    def __str__(self):
+        return (
+            f"StatistikDag(dato={self.dato}, anmeldelsestype={self.anmeldelsestype}, "
+            f"vareafgiftssats={self.vareafgiftssats_id})"
+        )
+
+    @staticmethod
+    def aggreger(varelinjer: QuerySet) -> QuerySet:
+        """
+        Summerer varelinjerne på afsluttede anmeldelser pr. dag,
+        anmeldelsestype og vareafgiftssats, direkte fra varelinjerne
+        """
+        return (
+            varelinjer.filter(
+                Q(afgiftsanmeldelse__status="afsluttet")
+                | Q(privatafgiftsanmeldelse__status="afsluttet"),
+                vareafgiftssats__isnull=False,
+            )
+            .annotate(
+                statistik_dato=Coalesce(
+                    TruncDate(
+                        "afgiftsanmeldelse__dato",
+                        tzinfo=timezone.get_default_timezone(),
+                    ),
+                    "privatafgiftsanmeldelse__indleveringsdato",
+                ),
+                statistik_type=Case(
+                    When(
+                        afgiftsanmeldelse__isnull=False,
+                        then=Value(StatistikDag.TF10),
+                    ),
+                    default=Value(StatistikDag.TF5),
+                ),
+            )
+            .order_by()
+            .values("statistik_dato", "statistik_type", "vareafgiftssats_id")
+            .annotate(
+                sum_afgiftsbeløb=Sum("afgiftsbeløb", default=0),
+                sum_mængde=Sum("mængde", default=0),
+                sum_antal=Sum("antal", default=0),
+            )
+        )
+
+    @staticmethod
+    def _rækker(varelinjer: QuerySet):
+        for row in StatistikDag.aggreger(varelinjer).iterator(chunk_size=2000):
+            yield StatistikDag(
+                dato=row["statistik_dato"],
+                anmeldelsestype=row["statistik_type"],
+                vareafgiftssats_id=row["vareafgiftssats_id"],
+                sum_afgiftsbeløb=row["sum_afgiftsbeløb"],
+                sum_mængde=row["sum_mængde"],
+                sum_antal=row["sum_antal"],
+            )
+
+    @staticmethod
+    def _varelinjer(anmeldelsestype: str, datoer: Set[date]) -> QuerySet:
+        if anmeldelsestype == StatistikDag.TF5:
+            return Varelinje.objects.filter(
+                privatafgiftsanmeldelse__indleveringsdato__in=datoer
+            )
+        # Afgiftsanmeldelse.dato er et tidspunkt; find hele døgn i
+        # standardtidszonen, så opslaget kan bruge indekset
+        filters = Q(pk__in=[])
+        for dato in datoer:
+            start = datetime.combine(dato, time.min, timezone.get_default_timezone())
+            filters |= Q(
+                afgiftsanmeldelse__dato__gte=start,
+                afgiftsanmeldelse__dato__lt=start + timedelta(days=1),
+            )
+        return Varelinje.objects.filter(filters)
+
+    @staticmethod
+    def opdater(anmeldelsestype: str, datoer: Iterable[Optional[date]]) -> None:
+        """
+        Genberegner de givne dage for anmeldelsestypen
+        """
+        dage = {dato for dato in datoer if dato is not None}
+        if not dage:
+            return
+        with transaction.atomic():
+            StatistikDag.objects.filter(
+                anmeldelsestype=anmeldelsestype, dato__in=dage
+            ).delete()
+            StatistikDag.objects.bulk_create(
+                StatistikDag._rækker(StatistikDag._varelinjer(anmeldelsestype, dage)),
+                batch_size=2000,
+            )
+
+    @staticmethod
+    def opdater_anmeldelse(
+        afgiftsanmeldelse_id: Optional[int] = None,
+        privatafgiftsanmeldelse_id: Optional[int] = None,
+    ) -> None:
+        """
+        Genberegner dagen for en anmeldelse, hvis den er afsluttet.
+        Bruges når anmeldelsens varelinjer er ændret
+        """
+        if afgiftsanmeldelse_id is not None:
+            anmeldelse = (
+                Afgiftsanmeldelse.objects.filter(
+                    pk=afgiftsanmeldelse_id, status="afsluttet"
+                )
+                .values_list("dato", flat=True)
+                .first()
+            )
+            if anmeldelse is not None:
+                StatistikDag.opdater(
+                    StatistikDag.TF10, [timezone.localdate(anmeldelse)]
+                )
+        if privatafgiftsanmeldelse_id is not None:
+            indleveringsdato = (
+                PrivatAfgiftsanmeldelse.objects.filter(
+                    pk=privatafgiftsanmeldelse_id, status="afsluttet"
+                )
+                .values_list("indleveringsdato", flat=True)
+                .first()
+            )
+            if indleveringsdato is not None:
+                StatistikDag.opdater(StatistikDag.TF5, [indleveringsdato])
+
+    @staticmethod
+    def genopbyg() -> int:
+        """
+        Genopbygger hele tabellen fra varelinjerne
+        """
+        with transaction.atomic():
+            StatistikDag.objects.all().delete()
+            return len(
+                StatistikDag.objects.bulk_create(
+                    StatistikDag._rækker(Varelinje.objects.all()), batch_size=2000
+                )
+            )
+
+    @staticmethod
+    def forskelle() -> List[Tuple[Tuple[date, str, int], Any, Any]]:
+        """
+        Sammenligner tabellen med en aggregering direkte fra varelinjerne.
+        Returnerer (nøgle, tabellens værdier, beregnede værdier) for hver
+        nøgle der er forskellig
+        """
+        tabel = {
+            (row.dato, row.anmeldelsestype, row.vareafgiftssats_id): (
+                row.sum_afgiftsbeløb,
+                row.sum_mængde,
+                row.sum_antal,
+            )
+            for row in StatistikDag.objects.all().iterator(chunk_size=2000)
+        }
+        beregnet = {
+            (row.dato, row.anmeldelsestype, row.vareafgiftssats_id): (
+                row.sum_afgiftsbeløb,
+                row.sum_mængde,
+                row.sum_antal,
+            )
+            for row in StatistikDag._rækker(Varelinje.objects.all())
+        }
+        return [
+            (nøgle, tabel.get(nøgle), beregnet.get(nøgle))
+            for nøgle in sorted(tabel.keys() | beregnet.keys())
+            if tabel.get(nøgle) != beregnet.get(nøgle)
+        ]
+
+
+@receiver(pre_save, sender=Afgiftsanmeldelse, dispatch_uid="statistik_før_tf10")
+@receiver(pre_save, sender=PrivatAfgiftsanmeldelse, dispatch_uid="statistik_før_tf5")
+def statistik_gem_før(sender, instance, raw, using, update_fields, **kwargs):
+    # Husk status og dato før gemning, så vi kan se om dagen skal genberegnes
+    instance._statistik_før = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("status", _statistik_datofelt(sender))
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+def _statistik_datofelt(sender) -> str:
+    return "dato" if sender is Afgiftsanmeldelse else "indleveringsdato"
+
+
+def _statistik_dag(sender, værdi) -> Tuple[str, Optional[date]]:
+    if sender is Afgiftsanmeldelse:
+        return StatistikDag.TF10, værdi and timezone.localdate(værdi)
+    return StatistikDag.TF5, værdi
+
+
+@receiver(post_save, sender=Afgiftsanmeldelse, dispatch_uid="statistik_efter_tf10")
+@receiver(post_save, sender=PrivatAfgiftsanmeldelse, dispatch_uid="statistik_efter_tf5")
+def statistik_opdater_anmeldelse(sender, instance, created, **kwargs):
+    før_status, før_dato = getattr(instance, "_statistik_før", None) or (None, None)
+    dato = getattr(instance, _statistik_datofelt(sender))
+    if (før_status == "afsluttet") == (instance.status == "afsluttet") and (
+        instance.status != "afsluttet" or før_dato == dato
+    ):
+        return
+    anmeldelsestype, ny_dag = _statistik_dag(sender, dato)
+    _, gammel_dag = _statistik_dag(sender, før_dato)
+    StatistikDag.opdater(anmeldelsestype, [ny_dag, gammel_dag])
+
+
+@receiver(post_delete, sender=Afgiftsanmeldelse, dispatch_uid="statistik_slet_tf10")
+@receiver(
+    post_delete, sender=PrivatAfgiftsanmeldelse, dispatch_uid="statistik_slet_tf5"
+)
+def statistik_slet_anmeldelse(sender, instance, **kwargs):
+    if instance.status == "afsluttet":
+        StatistikDag.opdater(
+            *_statistik_dag(sender, getattr(instance, _statistik_datofelt(sender)))
+        )
+
+
+@receiver(post_save, sender=Varelinje, dispatch_uid="statistik_varelinje_gemt")
+@receiver(post_delete, sender=Varelinje, dispatch_uid="statistik_varelinje_slettet")
+def statistik_opdater_varelinje(sender, instance, **kwargs):
+    StatistikDag.opdater_anmeldelse(
+        instance.afgiftsanmeldelse_id, instance.privatafgiftsanmeldelse_id
+    )
+
+
 class Toldkategori(models.Model):
     class Meta:
         ordering = ["kategori"]
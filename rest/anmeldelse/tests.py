@@ -7,11 +7,12 @@ import random
 from copy import deepcopy
 from datetime import UTC, date, datetime, timedelta
 from decimal import Decimal
+from io import StringIO
 from typing import List, Optional
 from unittest.mock import ANY, MagicMock, call, patch
 from uuid import uuid4
 
-from aktør.models import Afsender, Modtager
+from aktør.models import Afsender, Modtager, Speditør
 from anmeldelse.api import (
     AfgiftsanmeldelseAPI,
     AfgiftsanmeldelseFilterSchema,
@@ -22,30 +23,41 @@ from anmeldelse.api import (
     StatistikFilterSchema,
     Toldkategori,
     VarelinjeAPI,
+    VarelinjeOut,
 )
 from anmeldelse.models import (
     Afgiftsanmeldelse,
+    AfgiftsanmeldelseAdgang,
     PrismeResponse,
     PrivatAfgiftsanmeldelse,
+    StatistikDag,
     Varelinje,
     on_add_prismeresponse,
     on_delete_prismeresponse,
     privatafgiftsanmeldelse_upload_to,
 )
-from common.models import IndberetterProfile
+from common import referencedata
+from common.models import IndberetterProfile, Postnummer
 from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
-from django.db.models import Q
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count, Q
 from django.db.models.signals import post_delete, post_save
 from django.http import Http404
 from django.test import TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.http import urlencode
-from forsendelse.models import Postforsendelse
+from forsendelse.models import Fragtforsendelse, Postforsendelse
 from ninja_extra.exceptions import PermissionDenied
 from payment.models import Payment
+from project.pagination import CursorPaginationResponseSchema
 from project.test_mixins import RestMixin, RestTestMixin
 from project.util import json_dump
 from sats.models import Afgiftstabel, Vareafgiftssats
@@ -166,7 +178,7 @@ class AnmeldelsesTestDataMixin:
 
 class AfgiftsanmeldelseTest(RestTestMixin, TestCase):
     object_class = Afgiftsanmeldelse
-    exclude_fields = ["oprettet_af"]
+    exclude_fields = ["oprettet_af", "version", "sidste_ændringsdato"]
     object_restriction = True
 
     @property
@@ -212,6 +224,7 @@ class AfgiftsanmeldelseTest(RestTestMixin, TestCase):
             },
             "oprettet_på_vegne_af": None,
             "sidste_ændringsdato": ANY,
+            "version": ANY,
             # "afgift_total": '0',
         }
 
@@ -607,6 +620,94 @@ class AfgiftsanmeldelseAPITest(AnmeldelsesTestDataMixin, TestCase):
         afgiftsanmeldelse = Afgiftsanmeldelse.objects.get(id=new_row_id)
         self.assertEqual(afgiftsanmeldelse.status, "kladde")
 
+    def test_create_multipart(self):
+        # Filen sendes som multipart-del i stedet for base64 i JSON
+        indhold = b"%PDF" * 1000000
+        postforsendelse = Postforsendelse.objects.create(
+            postforsendelsesnummer="445566",
+            oprettet_af=self.user,
+            forsendelsestype=Postforsendelse.Forsendelsestype.SKIB,
+            afsenderbykode="8200",
+            afgangsdato="2023-11-03",
+            kladde=False,
+        )
+        resp = self.client.post(
+            reverse("api-1.0.0:afgiftsanmeldelse_create"),
+            data={
+                "payload": json_dump(
+                    {
+                        "afsender_id": self.afsender.id,
+                        "modtager_id": self.modtager.id,
+                        "postforsendelse_id": postforsendelse.id,
+                        "kladde": True,
+                    }
+                ).decode("utf-8"),
+                "leverandørfaktura": ContentFile(indhold, name="faktura.pdf"),
+            },
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        afgiftsanmeldelse = Afgiftsanmeldelse.objects.get(id=resp.json()["id"])
+        self.addCleanup(afgiftsanmeldelse.leverandørfaktura.delete, save=False)
+        self.assertEqual(afgiftsanmeldelse.status, "kladde")
+        self.assertTrue(
+            afgiftsanmeldelse.leverandørfaktura.name.endswith("faktura.pdf")
+        )
+        with afgiftsanmeldelse.leverandørfaktura.open("rb") as fil:
+            self.assertEqual(fil.read(), indhold)
+
+    def test_update_multipart(self):
+        # Django fortolker kun selv multipart for POST
+        indhold = b"%PDF" * 1000
+        resp = self.client.patch(
+            reverse(
+                "api-1.0.0:afgiftsanmeldelse_update", args=[self.afgiftsanmeldelse.id]
+            ),
+            data=encode_multipart(
+                BOUNDARY,
+                {
+                    "payload": json_dump({"leverandørfaktura_nummer": "54321"}).decode(
+                        "utf-8"
+                    ),
+                    "leverandørfaktura": ContentFile(indhold, name="ny.pdf"),
+                },
+            ),
+            content_type=MULTIPART_CONTENT,
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.afgiftsanmeldelse.refresh_from_db()
+        self.addCleanup(self.afgiftsanmeldelse.leverandørfaktura.delete, save=False)
+        self.assertEqual(self.afgiftsanmeldelse.leverandørfaktura_nummer, "54321")
+        self.assertTrue(
+            self.afgiftsanmeldelse.leverandørfaktura.name.endswith("ny.pdf")
+        )
+        with self.afgiftsanmeldelse.leverandørfaktura.open("rb") as fil:
+            self.assertEqual(fil.read(), indhold)
+
+    def test_get_conditional(self):
+        url = reverse(
+            "api-1.0.0:afgiftsanmeldelse_get_full", args=[self.afgiftsanmeldelse.id]
+        )
+        auth = f"Bearer {self.user_token}"
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers["ETag"]
+        self.assertIn("no-cache", resp.headers["Cache-Control"])
+        self.assertIn("Last-Modified", resp.headers)
+
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp.headers["ETag"], etag)
+
+        # Ændringer i relaterede rækker giver også en ny ETag
+        self.modtager.navn = "Nyt navn"
+        self.modtager.save()
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+
     def test_create_betales_af_blank(self):
         postforsendelse_local, _ = Postforsendelse.objects.get_or_create(
             postforsendelsesnummer="223344",
@@ -825,6 +926,8 @@ class AfgiftsanmeldelseAPITest(AnmeldelsesTestDataMixin, TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": self.afgiftsanmeldelse.id,
@@ -869,6 +972,7 @@ class AfgiftsanmeldelseAPITest(AnmeldelsesTestDataMixin, TestCase):
                         "history_username": None,
                         "history_date": ANY,
                         "sidste_ændringsdato": ANY,
+                        "version": ANY,
                     }
                 ],
             },
@@ -961,6 +1065,7 @@ class AfgiftsanmeldelseAPITest(AnmeldelsesTestDataMixin, TestCase):
                 "history_username": None,
                 "history_date": ANY,
                 "sidste_ændringsdato": ANY,
+                "version": ANY,
             },
         )
 
@@ -1187,6 +1292,76 @@ class AfgiftsanmeldelseAPITest(AnmeldelsesTestDataMixin, TestCase):
         self.afgiftsanmeldelse.refresh_from_db()
         self.assertEqual(self.afgiftsanmeldelse.status, "afvist")
 
+    def patch_if_match(self, if_match: str):
+        return self.client.patch(
+            reverse(
+                "api-1.0.0:afgiftsanmeldelse_update", args=[self.afgiftsanmeldelse.id]
+            ),
+            data=json_dump({"leverandørfaktura_nummer": "54321"}),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            HTTP_IF_MATCH=if_match,
+            content_type="application/json",
+        )
+
+    def test_version_bumped_on_save(self):
+        version = self.afgiftsanmeldelse.version
+        sidste_ændringsdato = self.afgiftsanmeldelse.sidste_ændringsdato
+        self.afgiftsanmeldelse.save()
+        self.assertEqual(self.afgiftsanmeldelse.version, version + 1)
+        self.assertGreater(
+            self.afgiftsanmeldelse.sidste_ændringsdato, sidste_ændringsdato
+        )
+        # Også når kun enkelte felter gemmes
+        self.afgiftsanmeldelse.save(update_fields=("afgift_total",))
+        self.afgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(self.afgiftsanmeldelse.version, version + 2)
+
+    def test_version_counted_in_database(self):
+        version = self.afgiftsanmeldelse.version
+        forældet = Afgiftsanmeldelse.objects.get(id=self.afgiftsanmeldelse.id)
+        self.afgiftsanmeldelse.save()
+        # Tælles op fra rækkens værdi, ikke fra den forældede instans'
+        with CaptureQueriesContext(connection) as context:
+            forældet.save(update_fields=("afgift_total",))
+        self.assertFalse(
+            [q for q in context.captured_queries if "FOR UPDATE" in q["sql"]]
+        )
+        self.afgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(self.afgiftsanmeldelse.version, version + 2)
+
+    def test_update_if_match(self):
+        version = self.afgiftsanmeldelse.version
+        resp = self.patch_if_match(f'"{version}"')
+        self.assertEqual(resp.status_code, 200)
+        self.afgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(self.afgiftsanmeldelse.version, version + 1)
+        self.assertEqual(self.afgiftsanmeldelse.leverandørfaktura_nummer, "54321")
+
+        resp = self.client.get(
+            reverse(
+                "api-1.0.0:afgiftsanmeldelse_get", args=[self.afgiftsanmeldelse.id]
+            ),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.json()["version"], version + 1)
+        self.assertEqual(
+            resp.json()["sidste_ændringsdato"],
+            self.afgiftsanmeldelse.sidste_ændringsdato.isoformat(),
+        )
+
+    def test_update_if_match_any(self):
+        resp = self.patch_if_match('"0", *')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_update_if_match_stale(self):
+        version = self.afgiftsanmeldelse.version
+        for if_match in (f'"{version - 1}"', f'W/"{version}"', f"{version + 1}"):
+            resp = self.patch_if_match(if_match)
+            self.assertEqual(resp.status_code, 412, if_match)
+        self.afgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(self.afgiftsanmeldelse.version, version)
+        self.assertEqual(self.afgiftsanmeldelse.leverandørfaktura_nummer, "12345")
+
     def test_update_status_invalid_permissions(self):
         self.user.user_permissions.remove(
             self.approve_reject_anmeldelse_afgiftanmeldelse_perm
@@ -1245,6 +1420,503 @@ class AfgiftsanmeldelseAPITest(AnmeldelsesTestDataMixin, TestCase):
         self.assertEqual(resp, 1)
 
 
+class AfgiftsanmeldelseQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        view_all_anmeldelse_perm, _ = Permission.objects.update_or_create(
+            codename="view_all_anmeldelse",
+            content_type=ContentType.objects.get_for_model(
+                Afgiftsanmeldelse, for_concrete_model=False
+            ),
+            defaults={"name": "Kan se alle afgiftsanmeldelser"},
+        )
+        cls.user, cls.user_token, _ = RestMixin.make_user(
+            username="query-count-test-user",
+            plaintext_password="testpassword1337",
+            permissions=[
+                Permission.objects.get(codename="view_afgiftsanmeldelse"),
+                Permission.objects.get(codename="view_varelinje"),
+                Permission.objects.get(codename="view_notat"),
+                Permission.objects.get(codename="view_prismeresponse"),
+                view_all_anmeldelse_perm,
+            ],
+        )
+        cls.limited_user, cls.limited_user_token, _ = RestMixin.make_user(
+            username="query-count-test-limited-user",
+            plaintext_password="testpassword1337",
+            permissions=[
+                Permission.objects.get(codename="view_afgiftsanmeldelse"),
+                view_all_anmeldelse_perm,
+            ],
+        )
+        group = Group.objects.create(name="query-count-test-group")
+        group.permissions.add(Permission.objects.get(codename="add_afgiftsanmeldelse"))
+
+        # Hver anmeldelse har sin egen opretter med profil, gruppe og
+        # rettigheder, så intet kan genbruges på tværs af rækker
+        for i in range(12):
+            user = User.objects.create(username=f"query-count-opretter-{i}")
+            user.groups.add(group)
+            user.user_permissions.add(
+                Permission.objects.get(codename="view_afgiftsanmeldelse")
+            )
+            IndberetterProfile.objects.create(
+                user=user, cvr=str(10000000 + i), api_key=uuid4()
+            )
+            anmeldelse = _create_afgiftsanmeldelse(user, str(i))
+            for antal in range(i % 3):
+                Varelinje.objects.create(
+                    afgiftsanmeldelse=anmeldelse, antal=antal, kladde=True
+                )
+            Notat.objects.create(
+                afgiftsanmeldelse=anmeldelse, user=user, tekst=f"notat {i}"
+            )
+            PrismeResponse.objects.create(
+                afgiftsanmeldelse=anmeldelse,
+                rec_id=i,
+                tax_notification_number=i,
+                delivery_date=datetime(2024, 1, 1, tzinfo=UTC),
+            )
+
+    def count_queries(self, url_name: str, limit: int, **params) -> int:
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(
+                reverse(url_name) + "?" + urlencode({"limit": limit, **params}),
+                HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["items"]), limit)
+        return len(context.captured_queries)
+
+    def test_list_full_query_count(self):
+        self.assertEqual(
+            self.count_queries("api-1.0.0:afgiftsanmeldelse_list_full", 2),
+            self.count_queries("api-1.0.0:afgiftsanmeldelse_list_full", 12),
+        )
+
+    def test_list_query_count(self):
+        self.assertEqual(
+            self.count_queries("api-1.0.0:afgiftsanmeldelse_list", 2),
+            self.count_queries("api-1.0.0:afgiftsanmeldelse_list", 12),
+        )
+
+    def test_list_full_nested_data(self):
+        resp = self.client.get(
+            reverse("api-1.0.0:afgiftsanmeldelse_list_full"),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        for item in resp.json()["items"]:
+            self.assertEqual(item["oprettet_af"]["groups"], ["query-count-test-group"])
+            self.assertEqual(
+                item["oprettet_af"]["permissions"],
+                [
+                    "anmeldelse.add_afgiftsanmeldelse",
+                    "anmeldelse.view_afgiftsanmeldelse",
+                ],
+            )
+            self.assertIsNotNone(item["oprettet_af"]["indberetter_data"]["cvr"])
+            self.assertFalse(item["oprettet_af"]["twofactor_enabled"])
+            self.assertEqual(item["afsender"]["navn"], item["modtager"]["navn"])
+
+    def test_expand_query_count(self):
+        expand = "varelinjer,notater,prismeresponses"
+        for url_name in (
+            "api-1.0.0:afgiftsanmeldelse_list",
+            "api-1.0.0:afgiftsanmeldelse_list_full",
+        ):
+            with self.subTest(url_name=url_name):
+                self.assertEqual(
+                    self.count_queries(url_name, 2, expand=expand),
+                    self.count_queries(url_name, 12, expand=expand),
+                )
+
+    def test_expand_list(self):
+        resp = self.client.get(
+            reverse("api-1.0.0:afgiftsanmeldelse_list"),
+            {"expand": "varelinjer,notater,prismeresponses"},
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.status_code, 200)
+        for item in resp.json()["items"]:
+            anmeldelse = Afgiftsanmeldelse.objects.get(id=item["id"])
+            self.assertEqual(
+                sorted(varelinje["id"] for varelinje in item["varelinjer"]),
+                sorted(anmeldelse.varelinje_set.values_list("id", flat=True)),
+            )
+            self.assertEqual(len(item["notater"]), 1)
+            self.assertEqual(
+                item["notater"][0]["tekst"], anmeldelse.notat_set.get().tekst
+            )
+            self.assertEqual(
+                item["prismeresponses"][0]["rec_id"],
+                anmeldelse.prismeresponse_set.get().rec_id,
+            )
+
+        # Uden expand er underobjekterne slet ikke med i svaret
+        resp = self.client.get(
+            reverse("api-1.0.0:afgiftsanmeldelse_list"),
+            {"expand": "notater"},
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        for item in resp.json()["items"]:
+            self.assertIn("notater", item)
+            self.assertNotIn("varelinjer", item)
+            self.assertNotIn("prismeresponses", item)
+
+    def test_expand_get(self):
+        anmeldelse = Afgiftsanmeldelse.objects.filter(varelinje__isnull=False).first()
+        for url_name in (
+            "api-1.0.0:afgiftsanmeldelse_get",
+            "api-1.0.0:afgiftsanmeldelse_get_full",
+        ):
+            with self.subTest(url_name=url_name):
+                resp = self.client.get(
+                    reverse(url_name, kwargs={"id": anmeldelse.id}),
+                    {"expand": "varelinjer"},
+                    HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+                )
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(
+                    len(resp.json()["varelinjer"]), anmeldelse.varelinje_set.count()
+                )
+                self.assertNotIn("notater", resp.json())
+
+    def test_expand_invalid(self):
+        resp = self.client.get(
+            reverse("api-1.0.0:afgiftsanmeldelse_list"),
+            {"expand": "varelinjer,foo"},
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("expand", resp.json())
+
+    def test_list_fields(self):
+        fields = "id,status,afsender__navn,fragtforsendelse__forbindelsesnr"
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(
+                reverse("api-1.0.0:afgiftsanmeldelse_list_full"),
+                {"fields": fields, "expand": "notater"},
+                HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["count"], 12)
+        for item in resp.json()["items"]:
+            anmeldelse = Afgiftsanmeldelse.objects.get(id=item["id"])
+            self.assertEqual(
+                item,
+                {
+                    "id": anmeldelse.id,
+                    "status": anmeldelse.status,
+                    "afsender": {"navn": anmeldelse.afsender.navn},
+                    "fragtforsendelse": None,
+                },
+            )
+        # Kun de udvalgte kolonner hentes
+        select = next(
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith('SELECT "anmeldelse_afgiftsanmeldelse"."id"')
+            and "LIMIT" in query["sql"]
+        )
+        self.assertIn('"aktør_afsender"."navn"', select)
+        self.assertNotIn("leverandørfaktura_nummer", select)
+        self.assertNotIn('"aktør_afsender"."adresse"', select)
+
+    def test_list_fields_invalid(self):
+        for fields in ("id,foo", "status__navn"):
+            with self.subTest(fields=fields):
+                resp = self.client.get(
+                    reverse("api-1.0.0:afgiftsanmeldelse_list"),
+                    {"fields": fields},
+                    HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+                )
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn("fields", resp.json())
+
+    def test_expand_permission(self):
+        # Underobjekter kræver samme rettigheder som deres egne endpoints
+        resp = self.client.get(
+            reverse("api-1.0.0:afgiftsanmeldelse_list"),
+            {"expand": "notater"},
+            HTTP_AUTHORIZATION=f"Bearer {self.limited_user_token}",
+        )
+        self.assertEqual(resp.status_code, 403)
+
+
+class BeregnetFaktureringsdatoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(1337)
+        user = User.objects.create(username="faktureringsdato-test-user")
+        Postnummer.objects.create(postnummer=3900, navn="Nuuk", dage=5)
+        # To byer med samme postnummer; den første vinder
+        Postnummer.objects.create(postnummer=3910, navn="Kangerlussuaq", dage=10)
+        Postnummer.objects.create(postnummer=3910, navn="Andetsteds", dage=3)
+        Postnummer.objects.create(postnummer=3920, navn="Qaqortoq", dage=0)
+
+        datoer = [
+            date(2023, 12, 31),
+            date(2024, 1, 1),
+            date(2024, 2, 10),  # skudår
+            date(2025, 2, 28),
+            date(2025, 6, 30),
+        ] + [date(2024, 1, 1) + timedelta(days=rng.randrange(730)) for _ in range(10)]
+        for i in range(40):
+            dato = rng.choice(datoer)
+            fragtforsendelse = postforsendelse = None
+            if rng.random() < 0.5:
+                fragtforsendelse = Fragtforsendelse.objects.create(
+                    forsendelsestype=Fragtforsendelse.Forsendelsestype.FLY,
+                    fragtbrevsnummer=f"{i:08}",
+                    forbindelsesnr=f"{i:03}",
+                    afgangsdato=dato,
+                    oprettet_af=user,
+                )
+            else:
+                postforsendelse = Postforsendelse.objects.create(
+                    postforsendelsesnummer=f"PF{i}",
+                    afsenderbykode="8200",
+                    afgangsdato=dato,
+                    oprettet_af=user,
+                )
+            modtager = Modtager.objects.create(
+                navn=f"Modtager {i}",
+                postnummer=rng.choice((3900, 3910, 3920, 3930, None)),
+                kladde=True,
+            )
+            afgiftsanmeldelse = Afgiftsanmeldelse.objects.create(
+                afsender=Afsender.objects.create(navn=f"Afsender {i}", kladde=True),
+                modtager=modtager,
+                fragtforsendelse=fragtforsendelse,
+                postforsendelse=postforsendelse,
+                toldkategori=rng.choice((None, "70", "73A", "76")),
+                oprettet_af=user,
+                status="kladde",
+            )
+            # Ekstra historik med ændret toldkategori
+            afgiftsanmeldelse.toldkategori = rng.choice((None, "70", "76"))
+            afgiftsanmeldelse.save()
+
+    def test_parity(self):
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(Afgiftsanmeldelse.objects.all())
+        self.assertEqual(qs.count(), 40)
+        for afgiftsanmeldelse in qs:
+            self.assertEqual(
+                afgiftsanmeldelse.beregnet_faktureringsdato,
+                Afgiftsanmeldelse.beregn_faktureringsdato(afgiftsanmeldelse),
+                afgiftsanmeldelse,
+            )
+
+    def test_parity_history(self):
+        qs = Afgiftsanmeldelse.annoter_faktureringsdato(Afgiftsanmeldelse.history.all())
+        self.assertEqual(qs.count(), 80)
+        for historisk in qs:
+            self.assertEqual(
+                historisk.beregnet_faktureringsdato,
+                Afgiftsanmeldelse.beregn_faktureringsdato(historisk),
+            )
+
+    def test_annotation_used(self):
+        afgiftsanmeldelse = Afgiftsanmeldelse.annoter_faktureringsdato(
+            Afgiftsanmeldelse.objects.all()
+        ).first()
+        with self.assertNumQueries(0):
+            afgiftsanmeldelse.beregnet_faktureringsdato
+
+    def test_fallback(self):
+        afgiftsanmeldelse = Afgiftsanmeldelse.objects.first()
+        self.assertEqual(
+            afgiftsanmeldelse.beregnet_faktureringsdato,
+            Afgiftsanmeldelse.beregn_faktureringsdato(afgiftsanmeldelse),
+        )
+
+
+class AfgiftsanmeldelseAdgangTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="indberetter")
+        self.profil = IndberetterProfile.objects.create(
+            user=self.user, cvr=12345678, api_key=uuid4()
+        )
+        self.afgiftsanmeldelse = _create_afgiftsanmeldelse(self.user)
+
+    def adgange(self):
+        return set(
+            AfgiftsanmeldelseAdgang.objects.filter(
+                afgiftsanmeldelse=self.afgiftsanmeldelse
+            ).values_list("user_id", "cvr")
+        )
+
+    def test_oprettelse(self):
+        self.assertEqual(self.adgange(), {(self.user.id, None), (None, 12345678)})
+
+    def test_fuldmagtshaver(self):
+        speditør = Speditør.objects.create(cvr=87654321, navn="Speditøren")
+        self.afgiftsanmeldelse.fuldmagtshaver = speditør
+        self.afgiftsanmeldelse.save()
+        self.assertEqual(
+            self.adgange(),
+            {(self.user.id, None), (None, 12345678), (None, 87654321)},
+        )
+        self.afgiftsanmeldelse.fuldmagtshaver = None
+        self.afgiftsanmeldelse.save()
+        self.assertEqual(self.adgange(), {(self.user.id, None), (None, 12345678)})
+
+    def test_oprettet_på_vegne_af(self):
+        other = User.objects.create(username="anden")
+        IndberetterProfile.objects.create(user=other, cvr=11223344, api_key=uuid4())
+        self.afgiftsanmeldelse.oprettet_på_vegne_af = other
+        self.afgiftsanmeldelse.save()
+        self.assertEqual(
+            self.adgange(),
+            {
+                (self.user.id, None),
+                (other.id, None),
+                (None, 12345678),
+                (None, 11223344),
+            },
+        )
+
+    def test_uændrede_felter(self):
+        # Gemning af andre felter genberegner ikke adgangen
+        with CaptureQueriesContext(connection) as context:
+            self.afgiftsanmeldelse.status = "afvist"
+            self.afgiftsanmeldelse.save(update_fields=["status"])
+            # Heller ikke når hele anmeldelsen gemmes, fx af en varelinje
+            self.afgiftsanmeldelse.leverandørfaktura_nummer = "54321"
+            self.afgiftsanmeldelse.save()
+            Varelinje.objects.create(
+                afgiftsanmeldelse=self.afgiftsanmeldelse,
+                vareafgiftssats=Vareafgiftssats.objects.create(
+                    afgiftstabel=Afgiftstabel.objects.create(),
+                    vareart_da="Vin",
+                    vareart_kl="Vin",
+                    afgiftsgruppenummer=1,
+                    enhed=Vareafgiftssats.Enhed.ANTAL,
+                ),
+                antal=1,
+            )
+        self.assertFalse(
+            any(
+                "anmeldelse_afgiftsanmeldelseadgang" in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+        self.assertEqual(self.adgange(), {(self.user.id, None), (None, 12345678)})
+
+    def test_profil_ændret(self):
+        self.profil.cvr = 22334455
+        self.profil.save()
+        self.assertEqual(self.adgange(), {(self.user.id, None), (None, 22334455)})
+
+    def test_profil_slettet(self):
+        self.profil.delete()
+        self.assertEqual(self.adgange(), {(self.user.id, None)})
+
+    def test_bruger_slettet(self):
+        self.user.delete()
+        self.assertEqual(self.adgange(), set())
+
+    def test_synlige(self):
+        anden = _create_afgiftsanmeldelse(
+            User.objects.create(username="fremmed"), idx="2"
+        )
+        synlige = Afgiftsanmeldelse.objects.filter(
+            id__in=AfgiftsanmeldelseAdgang.synlige(self.user, self.profil.cvr)
+        )
+        self.assertEqual(list(synlige), [self.afgiftsanmeldelse])
+        self.assertNotIn(anden, synlige)
+
+
+class LeverandørfakturaDownloadTest(AnmeldelsesTestDataMixin, TestCase):
+    indhold = bytes(range(256)) * 1000
+
+    def setUp(self):
+        super().setUp()
+        self.afgiftsanmeldelse.leverandørfaktura = ContentFile(
+            self.indhold, name="leverandørfaktura.pdf"
+        )
+        self.afgiftsanmeldelse.save()
+        self.url = reverse(
+            "api-1.0.0:afgiftsanmeldelse_leverandørfaktura",
+            args=[self.afgiftsanmeldelse.id],
+        )
+
+    def tearDown(self):
+        self.afgiftsanmeldelse.leverandørfaktura.delete(save=False)
+        super().tearDown()
+
+    def hent(self, **headers):
+        return self.client.get(
+            self.url, HTTP_AUTHORIZATION=f"Bearer {self.user_token}", **headers
+        )
+
+    def test_json_har_reference(self):
+        resp = self.client.get(
+            reverse(
+                "api-1.0.0:afgiftsanmeldelse_get", args=[self.afgiftsanmeldelse.id]
+            ),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(
+            resp.json()["leverandørfaktura"],
+            self.afgiftsanmeldelse.leverandørfaktura.url,
+        )
+
+    def test_download(self):
+        resp = self.hent()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Length"], str(len(self.indhold)))
+        self.assertEqual(resp["Content-Type"], "application/pdf")
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertIn("ETag", resp)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(b"".join(resp.streaming_content), self.indhold)
+
+    def test_not_modified(self):
+        etag = self.hent()["ETag"]
+        resp = self.hent(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(self.hent(HTTP_IF_NONE_MATCH='"andet"').status_code, 200)
+
+    def test_range(self):
+        resp = self.hent(HTTP_RANGE="bytes=100-199")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Length"], "100")
+        self.assertEqual(resp["Content-Range"], f"bytes 100-199/{len(self.indhold)}")
+        self.assertEqual(b"".join(resp.streaming_content), self.indhold[100:200])
+
+        resp = self.hent(HTTP_RANGE="bytes=-10")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b"".join(resp.streaming_content), self.indhold[-10:])
+
+        resp = self.hent(HTTP_RANGE=f"bytes={len(self.indhold)}-")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{len(self.indhold)}")
+
+    def test_if_range(self):
+        etag = self.hent()["ETag"]
+        resp = self.hent(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)
+        # Filen er ændret siden, så hele filen sendes
+        resp = self.hent(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"andet"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Length"], str(len(self.indhold)))
+
+    def test_ingen_fil(self):
+        self.afgiftsanmeldelse.leverandørfaktura.delete()
+        self.assertEqual(self.hent().status_code, 404)
+
+    def test_adgang(self):
+        user, token, _ = RestMixin.make_user(
+            username="anden-bruger",
+            plaintext_password="testpassword1337",
+            permissions=[self.view_afgiftsanmeldelse_perm],
+        )
+        IndberetterProfile.objects.create(user=user, cvr="87654321", api_key=uuid4())
+        resp = self.client.get(self.url, HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(resp.status_code, 403)
+
+
 class AfgiftsanmeldelseFilterSchemaTest(TestCase):
     def test_filter_toldkategori(self):
         schema = AfgiftsanmeldelseFilterSchema()
@@ -1507,9 +2179,30 @@ class PrivatAfgiftsanmeldelseAPITest(TestCase):
                 "anonym": False,
                 "payment_status": "created",
                 "sidste_ændringsdato": ANY,
+                "version": ANY,
             },
         )
 
+    def test_list_fields(self):
+        resp = self.client.get(
+            reverse("api-1.0.0:privat_afgiftsanmeldelse_list"),
+            {"fields": "id,indleveringsdato,payment_status"},
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            resp.json()["items"],
+            [
+                {
+                    "id": self.privatafgiftsanmeldelse.id,
+                    "indleveringsdato": str(
+                        self.privatafgiftsanmeldelse.indleveringsdato
+                    ),
+                    "payment_status": "created",
+                }
+            ],
+        )
+
     def test_list(self):
         query_params = {"sort": "navn", "order": "asc"}
         url = reverse("api-1.0.0:privat_afgiftsanmeldelse_list")
@@ -1526,6 +2219,8 @@ class PrivatAfgiftsanmeldelseAPITest(TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": self.privatafgiftsanmeldelse.id,
@@ -1561,6 +2256,7 @@ class PrivatAfgiftsanmeldelseAPITest(TestCase):
                         "anonym": False,
                         "payment_status": "created",
                         "sidste_ændringsdato": ANY,
+                        "version": ANY,
                     }
                 ],
             },
@@ -1688,6 +2384,31 @@ class PrivatAfgiftsanmeldelseAPITest(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.json(), {"success": True})
 
+    def test_update_if_match(self):
+        url = reverse(
+            "api-1.0.0:privatafgiftsanmeldelse_update",
+            args=[self.privatafgiftsanmeldelse.id],
+        )
+        version = self.privatafgiftsanmeldelse.version
+        resp = self.client.patch(
+            url,
+            json_dump({"navn": "Test privatafgiftsanmeldelse 1.3"}),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            HTTP_IF_MATCH=f'"{version + 1}"',
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 412)
+        resp = self.client.patch(
+            url,
+            json_dump({"navn": "Test privatafgiftsanmeldelse 1.3"}),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            HTTP_IF_MATCH=f'"{version}"',
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.privatafgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(self.privatafgiftsanmeldelse.version, version + 1)
+
     def test_update_leniency(self):
         resp = self.client.patch(
             reverse(
@@ -2517,6 +3238,8 @@ class VarelinjeAPITest(TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": varelinje.id,
@@ -2548,6 +3271,8 @@ class VarelinjeAPITest(TestCase):
             resp_angiftsanmeldelse_with_history.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": varelinje.id,
@@ -2576,7 +3301,260 @@ class VarelinjeAPITest(TestCase):
 
         self.assertEqual(resp_angiftsanmeldelse_with_history_none.status_code, 200)
         self.assertEqual(
-            resp_angiftsanmeldelse_with_history_none.json(), {"count": 0, "items": []}
+            resp_angiftsanmeldelse_with_history_none.json(),
+            {"count": 0, "count_estimated": False, "next": None, "items": []},
+        )
+
+    def bulk(self, data: dict):
+        return self.client.post(
+            reverse("api-1.0.0:varelinje_bulk"),
+            json_dump(data),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            content_type="application/json",
+        )
+
+    def test_bulk(self):
+        anmeldelse = {"privatafgiftsanmeldelse_id": self.privatafgiftsanmeldelse.id}
+        resp = self.bulk(
+            {
+                **anmeldelse,
+                "create": [
+                    {"vareafgiftssats_afgiftsgruppenummer": 1337, "antal": 2},
+                    {"vareafgiftssats_id": self.varelinjesats2.id, "mængde": "1.5"},
+                    {"vareafgiftssats_id": self.pantsats.id, "antal": 4},
+                    {"vareafgiftssats_id": self.pantafgiftssats.id, "antal": 4},
+                ],
+            }
+        )
+        self.assertEqual(resp.status_code, 200)
+        created = resp.json()["created"]
+        self.assertEqual(len(created), 4)
+        self.assertIsNone(created[3])  # Indkommende pantgebyr ignoreres
+        linjer = Varelinje.objects.filter(
+            privatafgiftsanmeldelse=self.privatafgiftsanmeldelse
+        )
+        self.assertEqual(linjer.count(), 4)
+        self.assertEqual(linjer.get(id=created[0]).vareafgiftssats, self.varelinjesats)
+        gebyr = linjer.get(vareafgiftssats=self.pantafgiftssats)
+        self.assertEqual(gebyr.antal, 4)
+        self.assertEqual(Varelinje.history.filter(id=created[0]).count(), 1)
+
+        resp = self.bulk(
+            {
+                **anmeldelse,
+                "create": [{"vareafgiftssats_id": self.varelinjesats.id, "antal": 7}],
+                "update": [{"id": created[2], "antal": 6}],
+                "delete": [created[0]],
+            }
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(Varelinje.objects.filter(id=created[0]).exists())
+        self.assertEqual(Varelinje.objects.get(id=created[2]).antal, 6)
+        # Gebyrlinjen følger pantlinjen
+        gebyr.refresh_from_db()
+        self.assertEqual(gebyr.antal, 6)
+        self.assertEqual(Varelinje.history.filter(id=gebyr.id).count(), 2)
+        self.assertEqual(linjer.count(), 4)
+
+        # Sletning af pantlinjen fjerner også gebyret
+        resp = self.bulk({**anmeldelse, "delete": [created[2]]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(linjer.filter(vareafgiftssats=self.pantafgiftssats).exists())
+
+    def test_bulk_afgift_total(self):
+        sats = Vareafgiftssats.objects.create(
+            afgiftstabel=self.afgiftstabel,
+            vareart_da="Dyr",
+            vareart_kl="Dyr",
+            afgiftsgruppenummer=1340,
+            enhed=Vareafgiftssats.Enhed.ANTAL,
+            afgiftssats=Decimal("2.50"),
+        )
+        afgiftsanmeldelse = _create_afgiftsanmeldelse(self.user)
+        historik = afgiftsanmeldelse.history.count()
+        resp = self.bulk(
+            {
+                "afgiftsanmeldelse_id": afgiftsanmeldelse.id,
+                "create": [
+                    {"vareafgiftssats_id": sats.id, "antal": antal}
+                    for antal in range(1, 11)
+                ],
+            }
+        )
+        self.assertEqual(resp.status_code, 200)
+        afgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(afgiftsanmeldelse.afgift_total, Decimal("137.50"))
+        # Anmeldelsen gemmes kun én gang, uanset antallet af linjer
+        self.assertEqual(afgiftsanmeldelse.history.count(), historik + 1)
+
+    def test_bulk_rollback(self):
+        anmeldelse = {"privatafgiftsanmeldelse_id": self.privatafgiftsanmeldelse.id}
+        varelinje = Varelinje.objects.create(
+            privatafgiftsanmeldelse=self.privatafgiftsanmeldelse,
+            vareafgiftssats=self.varelinjesats,
+            antal=1,
+        )
+        resp = self.bulk(
+            {
+                **anmeldelse,
+                "create": [{"vareafgiftssats_id": self.varelinjesats.id, "antal": 5}],
+                "update": [{"id": varelinje.id, "vareafgiftssats_id": 999999}],
+                "delete": [],
+            }
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(
+            list(
+                Varelinje.objects.filter(
+                    privatafgiftsanmeldelse=self.privatafgiftsanmeldelse
+                )
+            ),
+            [varelinje],
+        )
+
+    def test_bulk_other_anmeldelse(self):
+        afgiftsanmeldelse = _create_afgiftsanmeldelse(self.user)
+        varelinje = Varelinje.objects.create(
+            afgiftsanmeldelse=afgiftsanmeldelse,
+            vareafgiftssats=self.varelinjesats,
+            antal=1,
+        )
+        resp = self.bulk(
+            {
+                "privatafgiftsanmeldelse_id": self.privatafgiftsanmeldelse.id,
+                "delete": [varelinje.id],
+            }
+        )
+        self.assertEqual(resp.status_code, 404)
+        self.assertTrue(Varelinje.objects.filter(id=varelinje.id).exists())
+
+        resp = self.bulk({"delete": [varelinje.id]})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_bulk_access(self):
+        anden = User.objects.create(username="anden")
+        privatafgiftsanmeldelse = _create_privatafgiftsanmeldelse(
+            anden, self.indberetter
+        )
+        afgiftsanmeldelse = _create_afgiftsanmeldelse(anden)
+        for anmeldelse in (
+            {"privatafgiftsanmeldelse_id": privatafgiftsanmeldelse.id},
+            {"afgiftsanmeldelse_id": afgiftsanmeldelse.id},
+        ):
+            resp = self.bulk(
+                {
+                    **anmeldelse,
+                    "create": [
+                        {"vareafgiftssats_id": self.varelinjesats.id, "antal": 1}
+                    ],
+                }
+            )
+            self.assertEqual(resp.status_code, 403, anmeldelse)
+            self.assertFalse(Varelinje.objects.filter(**anmeldelse).exists())
+        afgiftsanmeldelse.refresh_from_db()
+        self.assertEqual(afgiftsanmeldelse.version, 1)
+
+    def test_list_history_cursor(self):
+        afgiftsanmeldelse = _create_afgiftsanmeldelse(self.user)
+        for antal in (1, 2, 3):
+            Varelinje.objects.create(
+                afgiftsanmeldelse=afgiftsanmeldelse,
+                vareafgiftssats=self.varelinjesats,
+                antal=antal,
+            )
+        params = {
+            "afgiftsanmeldelse": afgiftsanmeldelse.id,
+            "afgiftsanmeldelse_history_index": 0,
+        }
+        url = reverse("api-1.0.0:varelinje_list")
+        auth = f"Bearer {self.user_token}"
+        expected = [
+            item["id"]
+            for item in self.client.get(url, params, HTTP_AUTHORIZATION=auth).json()[
+                "items"
+            ]
+        ]
+        self.assertEqual(len(expected), 3)
+        # Historik-listen pagineres med cursor som de andre lister
+        ids = []
+        data = self.client.get(
+            url, {**params, "limit": 1}, HTTP_AUTHORIZATION=auth
+        ).json()
+        while True:
+            ids += [item["id"] for item in data["items"]]
+            if data["next"] is None:
+                break
+            data = self.client.get(
+                url,
+                {**params, "limit": 1, "cursor": data["next"]},
+                HTTP_AUTHORIZATION=auth,
+            ).json()
+        self.assertEqual(ids, expected)
+
+    def test_list_fastpath(self):
+        afgiftsanmeldelse = _create_afgiftsanmeldelse(self.user)
+        for antal in (1, 2, 3):
+            Varelinje.objects.create(
+                afgiftsanmeldelse=afgiftsanmeldelse,
+                vareafgiftssats=self.varelinjesats2,
+                mængde=Decimal("1.500") * antal,
+                fakturabeløb=Decimal("100.25"),
+                antal=antal,
+            )
+        url = reverse("api-1.0.0:varelinje_list")
+        auth = f"Bearer {self.user_token}"
+        schema = CursorPaginationResponseSchema[VarelinjeOut]
+        varelinjer = list(Varelinje.objects.order_by("pk"))
+        params = {"afgiftsanmeldelse": afgiftsanmeldelse.id, "limit": 2}
+        pages = []
+        while True:
+            resp = self.client.get(url, params, HTTP_AUTHORIZATION=auth)
+            self.assertEqual(resp.status_code, 200)
+            data = resp.json()
+            pages.append((resp.content, data))
+            if data["next"] is None:
+                break
+            params["cursor"] = data["next"]
+        self.assertEqual(len(pages), 2)
+        # Samme JSON, byte for byte, som ad skema-vejen
+        for (content, data), items in zip(pages, (varelinjer[:2], varelinjer[2:])):
+            expected = schema.model_validate(
+                {"count": data["count"], "next": data["next"], "items": items}
+            ).model_dump()
+            self.assertEqual(content, json_dump(expected))
+        self.assertEqual(pages[0][1]["items"][1]["mængde"], "3.000")
+
+    def test_list_afgiftsanmeldelse__in(self):
+        # Én postforsendelse pr. bruger
+        anmeldelser = [
+            _create_afgiftsanmeldelse(
+                User.objects.create(username=f"varelinje-in-{idx}"), str(idx)
+            )
+            for idx in (1, 2, 3)
+        ]
+        varelinjer = {
+            anmeldelse.id: [
+                Varelinje.objects.create(
+                    afgiftsanmeldelse=anmeldelse,
+                    vareafgiftssats=self.varelinjesats,
+                    antal=antal,
+                ).id
+                for antal in (1, 2)
+            ]
+            for anmeldelse in anmeldelser
+        }
+        ids = [anmeldelser[0].id, anmeldelser[2].id]
+        resp = self.client.get(
+            reverse("api-1.0.0:varelinje_list"),
+            {"afgiftsanmeldelse__in": ids},
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            sorted(
+                (item["afgiftsanmeldelse"], item["id"]) for item in resp.json()["items"]
+            ),
+            sorted((id, varelinje) for id in ids for varelinje in varelinjer[id]),
         )
 
     def test_filter_user(self):
@@ -2794,6 +3772,8 @@ class NotatAPITest(TestCase):
             resp.json(),
             {
                 "count": 2,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": resp_notat_create_cpr_data["id"],
@@ -2832,6 +3812,8 @@ class NotatAPITest(TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": resp_notat_create_cpr_data["id"],
@@ -2860,6 +3842,8 @@ class NotatAPITest(TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": resp_notat_create_cvr_data["id"],
@@ -2887,7 +3871,7 @@ class NotatAPITest(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(
             resp.json(),
-            {"count": 0, "items": []},
+            {"count": 0, "count_estimated": False, "next": None, "items": []},
         )
 
         resp = self.client.get(
@@ -2902,9 +3886,36 @@ class NotatAPITest(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(
             resp.json(),
-            {"count": 0, "items": []},
+            {"count": 0, "count_estimated": False, "next": None, "items": []},
         )
 
+    def test_list_privatafgiftsanmeldelse__in(self):
+        notater = [
+            Notat.objects.create(
+                privatafgiftsanmeldelse=self.privatafgiftsanmeldelse,
+                tekst="privat",
+                index=0,
+            ),
+            Notat.objects.create(
+                afgiftsanmeldelse=self.afgiftsanmeldelse, tekst="tf10", index=0
+            ),
+        ]
+        for field, notat in (
+            ("privatafgiftsanmeldelse__in", notater[0]),
+            ("afgiftsanmeldelse__in", notater[1]),
+        ):
+            resp = self.client.get(
+                reverse("api-1.0.0:notat_list"),
+                {
+                    field: [
+                        notat.privatafgiftsanmeldelse_id or notat.afgiftsanmeldelse_id
+                    ]
+                },
+                HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            )
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([item["id"] for item in resp.json()["items"]], [notat.id])
+
     def test_delete(self):
         resp_notat_create_cpr = self.client.post(
             reverse(f"api-1.0.0:notat_create"),
@@ -3123,6 +4134,8 @@ class PrismeResponseAPITest(TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": new_prism_resp.id,
@@ -3215,17 +4228,168 @@ class StatistikTest(RestMixin, TestCase):
             },
         )
 
+    def get_statistik(self, **params):
+        response = self.client.get(
+            reverse("api-1.0.0:statistik_get"),
+            params,
+            HTTP_AUTHORIZATION=f"Bearer {self.authorized_access_token}",
+        )
+        return {
+            item["afgiftsgruppenummer"]: item["sum_afgiftsbeløb"]
+            for item in response.json()["items"]
+        }
+
+    def test_statistik_dato(self):
+        idag = timezone.localdate(self.afgiftsanmeldelse.dato)
+        self.assertEqual(
+            self.get_statistik(startdato=idag, slutdato=idag),
+            {1234: "1787.50", 5678: "1400000.00"},
+        )
+        self.assertEqual(self.get_statistik(startdato=idag + timedelta(days=1)), {})
+        self.assertEqual(self.get_statistik(anmeldelsestype="tf5"), {})
+
+    def test_statistik_opdateres(self):
+        self.varelinje4.delete()
+        self.assertEqual(self.get_statistik()[5678], "500000.00")
+        self.afgiftsanmeldelse.status = "godkendt"
+        self.afgiftsanmeldelse.save()
+        self.assertFalse(StatistikDag.objects.exists())
+        self.assertEqual(self.get_statistik(), {})
+        self.afgiftsanmeldelse.status = "afsluttet"
+        self.afgiftsanmeldelse.save()
+        self.assertEqual(self.get_statistik()[1234], "1787.50")
+        self.assertEqual(StatistikDag.forskelle(), [])
+
+    def test_statistik_forespørgsler(self):
+        # Antallet af forespørgsler afhænger ikke af antallet af varelinjer
+        for i in range(20):
+            Varelinje.objects.create(
+                vareafgiftssats=self.vareafgiftssats2,
+                afgiftsanmeldelse=self.afgiftsanmeldelse,
+                mængde=1,
+                fakturabeløb=10,
+            )
+        self.get_statistik()
+        with CaptureQueriesContext(connection) as context:
+            self.get_statistik()
+        self.assertFalse(
+            any(
+                "anmeldelse_varelinje" in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_rebuild_statistik(self):
+        StatistikDag.objects.filter(vareafgiftssats=self.vareafgiftssats2).update(
+            sum_afgiftsbeløb=0
+        )
+        self.assertEqual(len(StatistikDag.forskelle()), 1)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_statistik", check=True, stdout=StringIO())
+        call_command("rebuild_statistik", stdout=StringIO())
+        self.assertEqual(StatistikDag.forskelle(), [])
+        call_command("rebuild_statistik", check=True, stdout=StringIO())
+
+
+class CreateLoadDataTest(TestCase):
+    options = {
+        "anmeldelser": 300,
+        "privatanmeldelser": 100,
+        "speditører": 4,
+        "virksomheder": 20,
+        "borgere": 20,
+        "aktører": 30,
+        "tabeller": 3,
+        "satser": 5,
+    }
+
+    @staticmethod
+    def snapshot():
+        # Data uden id'er, som afhænger af sekvenserne
+        return (
+            list(
+                Afgiftsanmeldelse.objects.order_by("id").values_list(
+                    "oprettet_af__username",
+                    "afsender__navn",
+                    "fuldmagtshaver__navn",
+                    "dato",
+                    "status",
+                    "afgift_total",
+                    "version",
+                )
+            ),
+            list(
+                Varelinje.objects.order_by("id").values_list(
+                    "vareafgiftssats__vareart_da", "mængde", "antal", "afgiftsbeløb"
+                )
+            ),
+            list(
+                PrivatAfgiftsanmeldelse.objects.order_by("id").values_list(
+                    "cpr", "navn", "status", "indleveringsdato"
+                )
+            ),
+        )
+
+    def test_create_load_data(self):
+        with transaction.atomic():
+            call_command("create_load_data", seed=7, stdout=StringIO(), **self.options)
+            first = self.snapshot()
+            transaction.set_rollback(True)
+        call_command("create_load_data", seed=7, stdout=StringIO(), **self.options)
+        self.assertEqual(self.snapshot(), first)
+        with self.assertRaises(CommandError):
+            call_command("create_load_data", seed=7, stdout=StringIO(), **self.options)
+
+        self.assertEqual(Afgiftsanmeldelse.objects.count(), 300)
+        self.assertEqual(PrivatAfgiftsanmeldelse.objects.count(), 100)
+        for anmeldelse in Afgiftsanmeldelse.objects.all()[:20]:
+            self.assertFalse(anmeldelse.beregn_afgift_total())
+            self.assertEqual(anmeldelse.history.count(), anmeldelse.version)
+            self.assertEqual(
+                anmeldelse.history.order_by("-history_date").first().status,
+                anmeldelse.status,
+            )
+        self.assertEqual(
+            Afgiftsanmeldelse.objects.filter(status="afsluttet").count(),
+            PrismeResponse.objects.count(),
+        )
+        self.assertEqual(StatistikDag.forskelle(), [])
+        # Adgangstabellen er som hvis signalerne havde opdateret den
+        adgange = set(
+            AfgiftsanmeldelseAdgang.objects.values_list(
+                "afgiftsanmeldelse", "cvr", "user"
+            )
+        )
+        AfgiftsanmeldelseAdgang.opdater(Afgiftsanmeldelse.objects.all())
+        self.assertEqual(
+            set(
+                AfgiftsanmeldelseAdgang.objects.values_list(
+                    "afgiftsanmeldelse", "cvr", "user"
+                )
+            ),
+            adgange,
+        )
+        # Få speditører har de fleste anmeldelser
+        pr_speditør = sorted(
+            Afgiftsanmeldelse.objects.filter(fuldmagtshaver__isnull=False)
+            .values("fuldmagtshaver")
+            .annotate(antal=Count("id"))
+            .values_list("antal", flat=True),
+            reverse=True,
+        )
+        self.assertGreater(pr_speditør[0], 2 * pr_speditør[-1])
+
 
 class StatistikFilterSchemaTest(TestCase):
     def test_filter_anmeldelsestype(self):
         filter = StatistikFilterSchema()
         self.assertEqual(
             filter.filter_anmeldelsestype("tf5"),
-            Q(privatafgiftsanmeldelse__isnull=False),
+            Q(anmeldelsestype="tf5"),
         )
         self.assertEqual(
             filter.filter_anmeldelsestype("tf10"),
-            Q(afgiftsanmeldelse__isnull=False),
+            Q(anmeldelsestype="tf10"),
         )
 
 
@@ -3294,6 +4458,44 @@ class ToldkategoriAPITest(TestCase):
             ],
         )
 
+    def test_list_conditional(self):
+        url = reverse("api-1.0.0:toldkategori_get")
+        auth = f"Bearer {self.cvr_user_token}"
+        etag = self.client.get(url, HTTP_AUTHORIZATION=auth).headers["ETag"]
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_list_referencedata(self):
+        referencedata._afsluttet()
+        caches[referencedata.CACHE_ALIAS].clear()
+        url = reverse("api-1.0.0:toldkategori_get")
+        auth = f"Bearer {self.cvr_user_token}"
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        version = int(resp.headers[referencedata.HEADER])
+
+        # Andet kald svares fra cachen, uden at slå toldkategorierne op
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(cached.content, resp.content)
+        # Versionen sendes også med 304
+        resp304 = self.client.get(
+            url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH=cached.headers["ETag"]
+        )
+        self.assertEqual(resp304.status_code, 304)
+        self.assertEqual(int(resp304.headers[referencedata.HEADER]), version)
+        self.assertFalse([q for q in queries if "anmeldelse_toldkategori" in q["sql"]])
+
+        # En ændring tæller versionen op, og svaret hentes igen
+        with self.captureOnCommitCallbacks(execute=True):
+            kategori = Toldkategori.objects.get(kategori="76")
+            kategori.navn = "Fra Tusass"
+            kategori.save()
+        resp = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(int(resp.headers[referencedata.HEADER]), version + 1)
+        self.assertIn("Fra Tusass", [k["navn"] for k in resp.json()])
+
 
 # Model magic-str-method tests
 
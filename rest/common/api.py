@@ -4,15 +4,17 @@
 # mypy: disable-error-code="call-arg, attr-defined"
 import base64
 import re
-from typing import Annotated, Dict, List, Optional, Union
+from itertools import chain
+from typing import Annotated, ClassVar, Dict, List, Optional, Tuple, Union
 
+from common import auth_cache
 from common.models import EboksBesked, IndberetterProfile
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import BadRequest
 from django.db.models import QuerySet
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404
-from django_otp.plugins.otp_totp.models import TOTPDevice
+from django.utils.translation import gettext_lazy as _
 from ninja import Field, ModelSchema
 from ninja.errors import ValidationError
 from ninja.filter_schema import FilterSchema
@@ -21,9 +23,11 @@ from ninja.schema import Schema
 from ninja.security import APIKeyHeader
 from ninja_extra import ControllerBase, api_controller, paginate, permissions, route
 from ninja_extra.exceptions import PermissionDenied
-from ninja_extra.schemas import NinjaPaginationResponseSchema
-from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.authentication import JWTAuth as BaseJWTAuth
+from ninja_jwt.exceptions import AuthenticationFailed, InvalidToken
+from ninja_jwt.settings import api_settings as jwt_settings
 from ninja_jwt.tokens import RefreshToken
+from project.pagination import CursorPagination, CursorPaginationResponseSchema
 
 # Django-ninja har endnu ikke understøttelse for PATCH med filer i multipart/form-data
 # Se https://github.com/vitalik/django-ninja/pull/397
@@ -44,12 +48,28 @@ class APIKeyAuth(APIKeyHeader):
     param_name = "X-API-Key"
 
     def authenticate(self, request, key):
+        user = auth_cache.get_api_key_user(key)
+        if user is not None:
+            request.user = user
+        return user
+
+
+class JWTAuth(BaseJWTAuth):
+    # Slår brugeren op i auth_cache i stedet for i databasen
+    def get_user(self, validated_token) -> User:
         try:
-            ib = IndberetterProfile.objects.get(api_key=key)
-            request.user = ib.user
-            return ib.user
-        except IndberetterProfile.DoesNotExist:
-            return None
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        user = auth_cache.get_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"))
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"))
+        return user
 
 
 class DjangoPermission(permissions.BasePermission):
@@ -91,6 +111,13 @@ class UserOut(ModelSchema):
     )
     twofactor_enabled: bool
 
+    # Relationer som resolverne herunder læser; se project.eager
+    eager_relations: ClassVar[Tuple[str, ...]] = (
+        "groups__permissions__content_type",
+        "user_permissions__content_type",
+        "totpdevice_set",
+    )
+
     class Config:
         model = User
         model_fields = [
@@ -108,6 +135,23 @@ class UserOut(ModelSchema):
 
     @staticmethod
     def resolve_permissions(user: User):
+        prefetched = getattr(user, "_prefetched_objects_cache", {})
+        if (
+            user.is_active
+            and not user.is_superuser
+            and not hasattr(user, "_perm_cache")
+            and "groups" in prefetched
+            and "user_permissions" in prefetched
+        ):
+            # Byg ModelBackends permission-cache ud fra prefetchede
+            # rettigheder, så vi undgår to forespørgsler pr. bruger
+            user._perm_cache = {
+                f"{permission.content_type.app_label}.{permission.codename}"
+                for permission in chain(
+                    user.user_permissions.all(),
+                    *(group.permissions.all() for group in user.groups.all()),
+                )
+            }
         return sorted(user.get_all_permissions())
 
     @staticmethod
@@ -119,7 +163,7 @@ class UserOut(ModelSchema):
 
     @staticmethod
     def resolve_twofactor_enabled(user: User) -> bool:
-        return TOTPDevice.objects.filter(user=user).exists()
+        return user.totpdevice_set.exists()
 
 
 class UserOutWithTokens(Schema):
@@ -316,13 +360,13 @@ class UserAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[UserOut],
+        response=CursorPaginationResponseSchema[UserOut],
         auth=get_auth_methods(),
         url_name="user_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def list(self, filters: UserFilterSchema = Query(...)):  # type: ignore
-        return list(filters.filter(User.objects.all().order_by("id")))
+        return filters.filter(User.objects.all().order_by("id"))
 
     @route.patch(
         "/cpr/{cpr}",
@@ -7,3 +7,9 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     name = "common"
+
+    def ready(self):
+        # Registrerer signalerne der invaliderer cachen
+        import common.auth_cache  # noqa: F401
+        import common.referencedata  # noqa: F401
+        import project.counting  # noqa: F401
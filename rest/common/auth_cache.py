@@ -0,0 +1,153 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import hashlib
+import time
+from typing import Optional
+
+from common.models import IndberetterProfile
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+# Cache af autentificerede brugere på tværs af requests.
+#
+# En bruger gemmes med sin IndberetterProfile og sit samlede rettighedssæt
+# (ModelBackends `_perm_cache`), så hverken opslag af brugeren, profilen eller
+# has_perm() rammer databasen når brugeren findes i cachen. API-nøgler slås op
+# til bruger-id'er, og gemmes kun som hash.
+#
+# Nøglerne indeholder en generation; ændringer der kan påvirke mange brugere
+# (grupper, rettigheder, profiler) tæller generationen op, så alle tidligere
+# opslag bliver ugyldige. Ændringer på en enkelt bruger sletter kun den.
+#
+# Cachen er cache-aliaset "auth" (se project/settings/cache.py). Med den
+# procesinterne LocMemCache når invalideringen kun den proces der lavede
+# ændringen; andre processer ser ændringen når deres opslag udløber (TIMEOUT).
+# Brug en delt cache (fx memcached), hvis det ikke er godt nok.
+
+CACHE_ALIAS = "auth"
+GENERATION_KEY = "auth:generation"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation() -> int:
+    cache = _cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start fra tidspunktet, så en generation der er røget ud af cachen
+        # ikke genbruger et tal fra før
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _user_key(user_id: int, generation: Optional[int] = None) -> str:
+    if generation is None:
+        generation = _generation()
+    return f"auth:{generation}:user:{user_id}"
+
+
+def _api_key_key(api_key: str, generation: int) -> str:
+    digest = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()
+    return f"auth:{generation}:apikey:{digest}"
+
+
+def invalidate_all() -> None:
+    cache = _cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id: int) -> None:
+    _cache().delete(_user_key(user_id))
+
+
+def get_user(user_id) -> Optional[User]:
+    """
+    Aktiv eller inaktiv bruger med profil og rettigheder indlæst,
+    eller None hvis brugeren ikke findes
+    """
+    cache = _cache()
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = (
+            User.objects.select_related("indberetter_data").filter(pk=user_id).first()
+        )
+        if user is None:
+            return None
+        # Udfylder user._perm_cache, som has_perm() derefter bruger
+        ModelBackend().get_all_permissions(user)
+        cache.set(key, user)
+    return user
+
+
+def get_api_key_user(api_key: str) -> Optional[User]:
+    if not api_key:
+        return None
+    cache = _cache()
+    generation = _generation()
+    key = _api_key_key(api_key, generation)
+    user_id = cache.get(key)
+    if user_id is None:
+        user_id = (
+            IndberetterProfile.objects.filter(api_key=api_key)
+            .values_list("user_id", flat=True)
+            .first()
+        )
+        if user_id is None:
+            # Ukendte nøgler caches ikke
+            return None
+        cache.set(key, user_id)
+    return get_user(user_id)
+
+
+@receiver(post_save, sender=User, dispatch_uid="auth_cache_user_saved")
+@receiver(post_delete, sender=User, dispatch_uid="auth_cache_user_deleted")
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=IndberetterProfile, dispatch_uid="auth_cache_profile_saved")
+@receiver(
+    post_delete, sender=IndberetterProfile, dispatch_uid="auth_cache_profile_deleted"
+)
+@receiver(post_save, sender=Group, dispatch_uid="auth_cache_group_saved")
+@receiver(post_delete, sender=Group, dispatch_uid="auth_cache_group_deleted")
+@receiver(post_save, sender=Permission, dispatch_uid="auth_cache_permission_saved")
+@receiver(post_delete, sender=Permission, dispatch_uid="auth_cache_permission_deleted")
+def principals_changed(sender, **kwargs):
+    # API-nøgler og profiler kan skifte bruger, og grupper og rettigheder
+    # deles af mange brugere
+    invalidate_all()
+
+
+@receiver(
+    m2m_changed, sender=User.groups.through, dispatch_uid="auth_cache_user_groups"
+)
+@receiver(
+    m2m_changed,
+    sender=User.user_permissions.through,
+    dispatch_uid="auth_cache_user_permissions",
+)
+@receiver(
+    m2m_changed,
+    sender=Group.permissions.through,
+    dispatch_uid="auth_cache_group_permissions",
+)
+def relations_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if isinstance(instance, User):
+        invalidate_user(instance.pk)
+    else:
+        invalidate_all()
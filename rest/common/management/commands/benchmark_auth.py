@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import time
+from uuid import uuid4
+
+from common import auth_cache
+from common.api import APIKeyAuth, JWTAuth
+from common.models import IndberetterProfile
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from ninja_extra import ControllerBase
+from ninja_jwt.tokens import AccessToken
+from project.util import RestPermission
+
+
+class AnmeldelsePermission(RestPermission):
+    appname = "anmeldelse"
+    modelname = "afgiftsanmeldelse"
+
+
+class Command(BaseCommand):
+    help = (
+        "Måler autentificering og rettighedstjek pr. request, "
+        "med og uden auth-cachen"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Testbrugeren rulles tilbage når målingen er færdig
+        with transaction.atomic():
+            self.benchmark(options["requests"])
+            transaction.set_rollback(True)
+
+    def benchmark(self, requests: int):
+        user = User.objects.create(username=f"benchmark-{uuid4()}")
+        group = Group.objects.create(name=f"benchmark-{uuid4()}")
+        group.permissions.set(
+            Permission.objects.filter(content_type__app_label="anmeldelse")
+        )
+        user.groups.add(group)
+        profile = IndberetterProfile.objects.create(
+            user=user, cvr=12345678, api_key=str(uuid4())
+        )
+        factory = RequestFactory()
+        jwt_request = factory.get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}"
+        )
+        api_key_request = factory.get("/", HTTP_X_API_KEY=profile.api_key)
+        permission = AnmeldelsePermission()
+        controller = ControllerBase()
+
+        for name, auth, request in (
+            ("JWT", JWTAuth(), jwt_request),
+            ("API-nøgle", APIKeyAuth(), api_key_request),
+        ):
+            for cached in (False, True):
+                auth_cache.invalidate_all()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    for i in range(requests):
+                        if not cached:
+                            auth_cache.invalidate_all()
+                        auth(request)
+                        # Permission-cachen lever på brugerobjektet, som er nyt
+                        # for hvert request
+                        assert permission.has_permission(request, controller)
+                    duration = time.perf_counter() - start
+                self.stdout.write(
+                    f"{name:10} {'med cache' if cached else 'uden cache':11}"
+                    f"{duration / requests * 1e6:10.1f} µs/request"
+                    f"{len(context.captured_queries) / requests:8.2f} "
+                    "forespørgsler/request"
+                )
@@ -0,0 +1,37 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from common.storage import DokumentStorage, importer, ryd_op
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Retter referencetallene for uploadede dokumenter og sletter indhold "
+        "som ingen filer længere henviser til"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--importer",
+            action="store_true",
+            help="Deduplikér først filer der er gemt før indholdsadresseringen",
+        )
+        parser.add_argument(
+            "--min-alder",
+            type=int,
+            default=3600,
+            help="Slet kun indhold der har været urørt i så mange sekunder",
+        )
+
+    def handle(self, *args, **options):
+        storage = storages["default"]
+        if not isinstance(storage, DokumentStorage):
+            raise CommandError("Default storage er ikke DokumentStorage")
+        if options["importer"]:
+            links, sparet = importer(storage)
+            self.stdout.write(f"{links} filer deduplikeret, {sparet} bytes sparet")
+        slettet, frigjort = ryd_op(storage, options["min_alder"])
+        self.stdout.write(f"{slettet} dokumenter slettet, {frigjort} bytes frigjort")
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0009_alter_indberetterprofile_unique_together"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Dokument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("størrelse", models.PositiveBigIntegerField()),
+                ("referencer", models.PositiveIntegerField(default=0)),
+                ("oprettet", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
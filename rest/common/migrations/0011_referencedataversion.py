@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    apps.get_model("common", "ReferencedataVersion").objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0010_dokument"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReferencedataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
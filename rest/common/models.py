@@ -174,3 +174,31 @@ class EboksDispatch(models.Model):
 
     def __str__(self):
         return f"EboksDispatch(besked={self.besked.id})"
+
+
+def blob_navn(sha256: str) -> str:
+    return f"dokumenter/{sha256[:2]}/{sha256}"
+
+
+class Dokument(models.Model):
+    # En uploadet fil, gemt én gang pr. indhold (se common.storage)
+    sha256 = models.CharField(max_length=64, unique=True)
+    størrelse = models.PositiveBigIntegerField()
+    referencer = models.PositiveIntegerField(default=0)
+    oprettet = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def navn(self) -> str:
+        return blob_navn(self.sha256)
+
+    def __str__(self):
+        return f"Dokument(sha256={self.sha256}, referencer={self.referencer})"
+
+
+class ReferencedataVersion(models.Model):
+    # Én række, hvis version tælles op når referencedata ændres
+    # (se common.referencedata)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"ReferencedataVersion(version={self.version})"
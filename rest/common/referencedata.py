@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from aktør.models import Speditør
+from anmeldelse.models import Toldkategori
+from common.models import Postnummer, ReferencedataVersion
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse
+from sats.models import Afgiftstabel, Vareafgiftssats
+
+# Cache af referencedata (toldkategorier, afgiftstabeller, satser, postnumre og
+# speditører), som sjældent ændres.
+#
+# Referencedata har ét fælles versionsnummer, som ligger i databasen
+# (ReferencedataVersion) og tælles op i samme transaktion som ændringen, når en
+# af modellerne gemmes eller slettes. Versionen er dermed global for alle
+# processer, og en ændring der rulles tilbage, tæller heller ikke versionen op.
+# Hver proces læser versionen højst én gang pr. MAX_ALDER sekunder.
+#
+# Endpoints markeret med @referencedata gemmer deres svar i cache-aliaset
+# "referencedata" under versionen og URL'en (efter auth og rettighedstjek), og
+# svarer fra cachen indtil versionen skifter. Svarene har versionen i headeren
+# X-Referencedata-Version, så klienterne (se told_common.response_cache) også
+# kan genbruge referencedata til versionen skifter.
+#
+# En tråd med uafsluttede ændringer i referencedata bruger ikke cachen, så
+# data fra en transaktion der rulles tilbage aldrig deles.
+
+CACHE_ALIAS = "referencedata"
+HEADER = "X-Referencedata-Version"
+MAX_ALDER = 1.0
+
+# (version, læst) og (version, postnumre) udskiftes samlet i én tildeling, så
+# andre tråde altid ser et helt par uden at skulle låse
+_memo: Optional[Tuple[int, float]] = None
+_tråd = threading.local()
+_postnumre: Optional[Tuple[int, Dict[int, List[Postnummer]]]] = None
+_tabel_findes = False
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _glem() -> None:
+    global _memo
+    _memo = None
+
+
+def version() -> Optional[int]:
+    """
+    Den aktuelle version, eller None hvis tråden har uafsluttede ændringer
+    i referencedata
+    """
+    global _memo
+    if getattr(_tråd, "ændret", False):
+        if connection.in_atomic_block:
+            return None
+        _tråd.ændret = False
+    memo = _memo
+    if memo is not None and time.monotonic() - memo[1] < MAX_ALDER:
+        return memo[0]
+    aktuel = (
+        ReferencedataVersion.objects.filter(pk=1)
+        .values_list("version", flat=True)
+        .first()
+    )
+    if aktuel is None:
+        aktuel = ReferencedataVersion.objects.get_or_create(pk=1)[0].version
+    _memo = (aktuel, time.monotonic())
+    return aktuel
+
+
+def _afsluttet():
+    _tråd.ændret = False
+    _glem()
+
+
+def bump() -> None:
+    global _tabel_findes
+    if not _tabel_findes:
+        # Migrationer (fx common 0008) gemmer referencedata før tabellen findes
+        _tabel_findes = ReferencedataVersion._meta.db_table in (
+            connection.introspection.table_names()
+        )
+        if not _tabel_findes:
+            return
+    if not ReferencedataVersion.objects.filter(pk=1).update(version=F("version") + 1):
+        ReferencedataVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+    _tråd.ændret = True
+    _glem()
+    transaction.on_commit(_afsluttet)
+
+
+@receiver(post_save, sender=Toldkategori, dispatch_uid="referencedata_toldkategori")
+@receiver(post_delete, sender=Toldkategori, dispatch_uid="referencedata_toldkategori")
+@receiver(post_save, sender=Afgiftstabel, dispatch_uid="referencedata_afgiftstabel")
+@receiver(post_delete, sender=Afgiftstabel, dispatch_uid="referencedata_afgiftstabel")
+@receiver(
+    post_save, sender=Vareafgiftssats, dispatch_uid="referencedata_vareafgiftssats"
+)
+@receiver(
+    post_delete, sender=Vareafgiftssats, dispatch_uid="referencedata_vareafgiftssats"
+)
+@receiver(post_save, sender=Postnummer, dispatch_uid="referencedata_postnummer")
+@receiver(post_delete, sender=Postnummer, dispatch_uid="referencedata_postnummer")
+@receiver(post_save, sender=Speditør, dispatch_uid="referencedata_speditør")
+@receiver(post_delete, sender=Speditør, dispatch_uid="referencedata_speditør")
+def referencedata_ændret(sender, **kwargs):
+    bump()
+
+
+def referencedata(func):
+    """
+    Dekoratør til et endpoint der kun returnerer referencedata. Placeres under
+    @route og over evt. @paginate
+    """
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        request = self.context.request
+        aktuel = version()
+        if aktuel is not None:
+            request.referencedata_version = aktuel
+            key = f"{aktuel}:{request.get_full_path()}"
+            content = _cache().get(key)
+            if content is not None:
+                return HttpResponse(content, content_type="application/json")
+            # Svaret gemmes af ReferencedataMiddleware når det er renderet
+            request.referencedata_key = key
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def gem_svar(request: HttpRequest, response: HttpResponse) -> None:
+    key = getattr(request, "referencedata_key", None)
+    if key is not None and response.status_code == 200 and not response.streaming:
+        _cache().set(key, response.content)
+
+
+def postnumre() -> Dict[int, List[Postnummer]]:
+    """
+    Postnumrene i hukommelsen, pr. nummer og sorteret efter pk
+    """
+    global _postnumre
+    aktuel = version()
+    gemt = _postnumre
+    if aktuel is not None and gemt is not None and gemt[0] == aktuel:
+        return gemt[1]
+    resultat: Dict[int, List[Postnummer]] = defaultdict(list)
+    for postnummer in Postnummer.objects.order_by("pk"):
+        resultat[postnummer.postnummer].append(postnummer)
+    if aktuel is not None:
+        _postnumre = (aktuel, resultat)
+    return resultat
@@ -0,0 +1,168 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import hashlib
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Tuple
+
+from common.models import Dokument, blob_navn
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+
+# Indholdsadresseret lagring af uploadede filer (leverandørfakturaer, fragtbreve)
+#
+# Hvert indhold gemmes én gang, under dokumenter/<sha256[:2]>/<sha256>, og har
+# en Dokument-række med hash, størrelse og antal referencer. Filfelternes navne
+# er uændrede (fx leverandørfakturaer/<id>/faktura.pdf), så klienterne kan
+# åbne filerne på det delte /upload-volumen som hidtil; navnene er hårde links
+# til indholdet, så samme faktura uploadet til mange anmeldelser kun fylder én
+# gang på disken, og en upload af kendt indhold ikke skrives.
+#
+# Referencetallet opdateres når filer gemmes og slettes, og antallet af hårde
+# links er facit: `manage.py gc_dokumenter` retter referencetallene og sletter
+# indhold uden referencer (fx efter en upload i en transaktion der blev rullet
+# tilbage). `gc_dokumenter --importer` deduplikerer filer gemt før dette.
+
+log = logging.getLogger(__name__)
+
+BLOB_MAPPE = "dokumenter"
+
+
+def indholdshash(content: File) -> Tuple[str, int]:
+    sha256 = hashlib.sha256()
+    størrelse = 0
+    for chunk in content.chunks():
+        if isinstance(chunk, str):
+            # ContentFile med tekst; FileSystemStorage gemmer den som UTF-8
+            chunk = chunk.encode("utf-8")
+        sha256.update(chunk)
+        størrelse += len(chunk)
+    return sha256.hexdigest(), størrelse
+
+
+class DokumentStorage(FileSystemStorage):
+    def _save(self, name, content):
+        sha256, størrelse = indholdshash(content)
+        blob = blob_navn(sha256)
+        if not self.exists(blob):
+            gemt = super()._save(blob, content)
+            if gemt != blob:
+                # En anden upload nåede at gemme det samme indhold
+                super().delete(gemt)
+        else:
+            log.info("Dokument %s findes allerede; gemmer ikke %s", sha256, name)
+
+        dokument, _ = Dokument.objects.get_or_create(
+            sha256=sha256, defaults={"størrelse": størrelse}
+        )
+        name = self._link(blob, name)
+        Dokument.objects.filter(pk=dokument.pk).update(referencer=F("referencer") + 1)
+        return name
+
+    def _link(self, blob: str, name: str) -> str:
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        while True:
+            try:
+                os.link(self.path(blob), self.path(name))
+            except FileExistsError:
+                # Navnet blev taget siden get_available_name
+                name = self.get_available_name(name)
+                continue
+            except OSError:
+                # Filsystemet understøtter ikke hårde links; gem en kopi
+                shutil.copyfile(self.path(blob), self.path(name))
+            return name
+
+    def delete(self, name):
+        try:
+            links = os.stat(self.path(name)).st_nlink
+        except FileNotFoundError:
+            return
+        if links > 1 and not name.startswith(BLOB_MAPPE + "/"):
+            with self.open(name) as fil:
+                sha256, _ = indholdshash(fil)
+            Dokument.objects.filter(sha256=sha256, referencer__gt=0).update(
+                referencer=F("referencer") - 1
+            )
+        super().delete(name)
+
+
+def importer(storage: DokumentStorage) -> Tuple[int, int]:
+    """
+    Erstatter filer gemt før DokumentStorage med hårde links til indholdet.
+    Returnerer antal filer der blev til links og antal sparede bytes
+    """
+    links = 0
+    sparet = 0
+    for mappe, undermapper, filer in os.walk(storage.location):
+        if os.path.relpath(mappe, storage.location) == ".":
+            undermapper[:] = [m for m in undermapper if m != BLOB_MAPPE]
+        for filnavn in filer:
+            path = os.path.join(mappe, filnavn)
+            if os.stat(path).st_nlink > 1:
+                continue
+            with open(path, "rb") as fil:
+                sha256, størrelse = indholdshash(File(fil))
+            blob = storage.path(blob_navn(sha256))
+            if os.path.exists(blob):
+                midlertidig = f"{path}.{sha256[:8]}.tmp"
+                os.link(blob, midlertidig)
+                os.replace(midlertidig, path)
+                links += 1
+                sparet += størrelse
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.link(path, blob)
+            Dokument.objects.get_or_create(
+                sha256=sha256, defaults={"størrelse": størrelse}
+            )
+    return links, sparet
+
+
+def ryd_op(storage: DokumentStorage, min_alder: int = 3600) -> Tuple[int, int]:
+    """
+    Retter referencetallene efter antallet af hårde links, og sletter indhold
+    uden referencer. Indhold der er oprettet eller linket til inden for de
+    seneste `min_alder` sekunder røres ikke, da en upload kan være i gang.
+    Returnerer antal slettede dokumenter og antal frigjorte bytes
+    """
+    grænse = time.time() - min_alder
+    blobs: Dict[str, os.stat_result] = {}
+    rod = storage.path(BLOB_MAPPE)
+    for mappe, _, filer in os.walk(rod):
+        for filnavn in filer:
+            blobs[filnavn] = os.stat(os.path.join(mappe, filnavn))
+
+    slettet = 0
+    frigjort = 0
+    for dokument in Dokument.objects.iterator():
+        stat = blobs.pop(dokument.sha256, None)
+        if stat is None:
+            dokument.delete()
+            continue
+        referencer = stat.st_nlink - 1
+        if referencer == 0 and stat.st_ctime < grænse:
+            os.remove(storage.path(dokument.navn))
+            dokument.delete()
+            slettet += 1
+            frigjort += stat.st_size
+        elif referencer != dokument.referencer:
+            Dokument.objects.filter(pk=dokument.pk).update(referencer=referencer)
+
+    # Indhold uden Dokument-række, fx fra en rullet-tilbage transaktion
+    for sha256, stat in blobs.items():
+        if stat.st_nlink > 1:
+            Dokument.objects.get_or_create(
+                sha256=sha256,
+                defaults={"størrelse": stat.st_size, "referencer": stat.st_nlink - 1},
+            )
+        elif stat.st_ctime < grænse:
+            os.remove(storage.path(blob_navn(sha256)))
+            slettet += 1
+            frigjort += stat.st_size
+    return slettet, frigjort
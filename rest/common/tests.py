@@ -1,16 +1,28 @@
 import base64
+import os
+import shutil
+import tempfile
 from datetime import datetime
 from typing import List, Optional
 from unittest.mock import ANY, MagicMock, call, patch
 from uuid import uuid4
 
 from anmeldelse.models import Afgiftsanmeldelse
+from common import auth_cache
 from common.api import APIKeyAuth, DjangoPermission, UserAPI, UserOut
 from common.eboks import EboksClient, MockResponse
-from common.models import EboksBesked, EboksDispatch, IndberetterProfile, Postnummer
+from common.models import (
+    Dokument,
+    EboksBesked,
+    EboksDispatch,
+    IndberetterProfile,
+    Postnummer,
+)
+from common.storage import DokumentStorage, importer, ryd_op
 from common.util import get_postnummer
 from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
 from django.db.models import QuerySet
 from django.test import TestCase
 from django.urls import reverse
@@ -201,6 +213,68 @@ class CommonAPITests(CommonTest, TestCase):
         )
 
 
+class AuthCacheTests(CommonTest, TestCase):
+    def setUp(self):
+        auth_cache.invalidate_all()
+
+    def test_get_user_cached(self):
+        auth_cache.get_user(self.user.id)
+        with self.assertNumQueries(0):
+            user = auth_cache.get_user(self.user.id)
+            self.assertEqual(user, self.user)
+            self.assertEqual(user.indberetter_data.cvr, 13371337)
+            self.assertTrue(user.has_perm("anmeldelse.view_afgiftsanmeldelse"))
+
+    def test_get_user_missing(self):
+        self.assertIsNone(auth_cache.get_user(999999))
+
+    def test_api_key_cached(self):
+        auth_cache.get_api_key_user(self.indberetter.api_key)
+        with self.assertNumQueries(0):
+            user = auth_cache.get_api_key_user(self.indberetter.api_key)
+        self.assertEqual(user, self.user)
+        self.assertIsNone(auth_cache.get_api_key_user("ukendt"))
+        self.assertIsNone(auth_cache.get_api_key_user(None))
+
+    def test_invalidate_user_permissions(self):
+        auth_cache.get_user(self.user.id)
+        self.user.user_permissions.add(self.auth_read_apikeys)
+        user = auth_cache.get_user(self.user.id)
+        self.assertTrue(user.has_perm("auth.read_apikeys"))
+
+    def test_invalidate_group_permissions(self):
+        self.user.groups.add(self.group)
+        self.assertFalse(
+            auth_cache.get_user(self.user.id).has_perm("auth.read_apikeys")
+        )
+        self.group.permissions.add(self.auth_read_apikeys)
+        self.assertTrue(auth_cache.get_user(self.user.id).has_perm("auth.read_apikeys"))
+
+    def test_invalidate_user(self):
+        auth_cache.get_user(self.user.id)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(auth_cache.get_user(self.user.id).is_active)
+
+    def test_invalidate_profile(self):
+        auth_cache.get_api_key_user(self.indberetter.api_key)
+        api_key = self.indberetter.api_key
+        self.indberetter.api_key = IndberetterProfile.create_api_key()
+        self.indberetter.save()
+        self.assertIsNone(auth_cache.get_api_key_user(api_key))
+        user = auth_cache.get_api_key_user(self.indberetter.api_key)
+        self.assertEqual(user, self.user)
+
+    def test_jwt_inactive(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(
+            reverse("api-1.0.0:user_view"),
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+        )
+        self.assertEqual(response.status_code, 401)
+
+
 class CommonUserAPITests(CommonTest, TestCase):
     maxDiff = None
 
@@ -917,6 +991,78 @@ class CommonEboksModuleTests(CommonTest, TestCase):
             )
 
 
+class DokumentStorageTest(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = DokumentStorage(location=self.location)
+
+    def links(self, name):
+        return os.stat(self.storage.path(name)).st_nlink
+
+    def test_dedup(self):
+        a = self.storage.save("leverandørfakturaer/1/faktura.pdf", ContentFile(b"PDF"))
+        b = self.storage.save("fragtbreve/2/fragtbrev.pdf", ContentFile(b"PDF"))
+        self.storage.save("fragtbreve/3/andet.pdf", ContentFile(b"Andet"))
+        self.assertEqual(a, "leverandørfakturaer/1/faktura.pdf")
+        with self.storage.open(b) as fil:
+            self.assertEqual(fil.read(), b"PDF")
+        self.assertEqual(
+            os.stat(self.storage.path(a)).st_ino, os.stat(self.storage.path(b)).st_ino
+        )
+        dokument = Dokument.objects.get(referencer=2)
+        self.assertEqual(dokument.størrelse, 3)
+        self.assertEqual(self.links(dokument.navn), 3)
+        self.assertEqual(Dokument.objects.count(), 2)
+
+    def test_same_name(self):
+        a = self.storage.save("fragtbreve/1/fragtbrev.pdf", ContentFile(b"PDF"))
+        b = self.storage.save("fragtbreve/1/fragtbrev.pdf", ContentFile(b"PDF"))
+        self.assertNotEqual(a, b)
+        self.assertEqual(Dokument.objects.get().referencer, 2)
+
+    def test_delete_and_gc(self):
+        a = self.storage.save("fragtbreve/1/fragtbrev.pdf", ContentFile(b"PDF"))
+        b = self.storage.save("fragtbreve/2/fragtbrev.pdf", ContentFile(b"PDF"))
+        dokument = Dokument.objects.get()
+        self.storage.delete(a)
+        dokument.refresh_from_db()
+        self.assertEqual(dokument.referencer, 1)
+        self.assertEqual(ryd_op(self.storage, min_alder=0), (0, 0))
+        self.assertTrue(self.storage.exists(dokument.navn))
+
+        self.storage.delete(b)
+        # Nyligt brugt indhold får lov at blive
+        self.assertEqual(ryd_op(self.storage), (0, 0))
+        self.assertEqual(ryd_op(self.storage, min_alder=0), (1, 3))
+        self.assertFalse(self.storage.exists(dokument.navn))
+        self.assertFalse(Dokument.objects.exists())
+
+    def test_gc_reconcile(self):
+        self.storage.save("fragtbreve/1/fragtbrev.pdf", ContentFile(b"PDF"))
+        Dokument.objects.all().delete()
+        ryd_op(self.storage, min_alder=0)
+        self.assertEqual(Dokument.objects.get().referencer, 1)
+        Dokument.objects.update(referencer=7)
+        ryd_op(self.storage, min_alder=0)
+        self.assertEqual(Dokument.objects.get().referencer, 1)
+
+    def test_importer(self):
+        for name in ("fragtbreve/1/a.pdf", "fragtbreve/2/b.pdf"):
+            path = os.path.join(self.location, name)
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as fil:
+                fil.write(b"Gammel PDF")
+        self.assertEqual(importer(self.storage), (1, 10))
+        dokument = Dokument.objects.get()
+        self.assertEqual(self.links("fragtbreve/1/a.pdf"), 3)
+        self.assertEqual(self.links(dokument.navn), 3)
+        self.assertEqual(importer(self.storage), (0, 0))
+        ryd_op(self.storage, min_alder=0)
+        dokument.refresh_from_db()
+        self.assertEqual(dokument.referencer, 2)
+
+
 class CommonUtilTest(TestCase):
     @classmethod
     def setUpTestData(cls):
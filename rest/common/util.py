@@ -2,6 +2,7 @@ from datetime import date, timedelta
 from typing import Any
 
 from common.models import Postnummer
+from django.db.models import DateField, Func
 
 
 def coerce_num_to_str(value: Any) -> Any:
@@ -22,14 +23,27 @@ def dato_måned_slut(dato: date) -> date:
     return dato_næste_måned_start(dato) - timedelta(days=1)
 
 
+class MånedSlut(Func):
+    # Databaseudgaven af dato_måned_slut, til brug i annoteringer
+    template = (
+        "CAST(DATE_TRUNC('month', CAST(%(expressions)s AS timestamp))"
+        " + INTERVAL '1 month - 1 day' AS date)"
+    )
+    output_field = DateField()
+
+
 def get_postnummer(postnummer: int, by: str):
-    objs = Postnummer.objects.filter(postnummer=postnummer)
+    # Postnumrene slås op i hukommelsen, se common.referencedata
+    from common.referencedata import postnumre
+
+    objs = postnumre().get(postnummer)
     if not objs:
         raise Postnummer.DoesNotExist("Postnummer kunne ikke findes")
-    if objs.count() == 1:
-        return objs.first()
+    if len(objs) == 1:
+        return objs[0]
     if by is not None:
-        obj = objs.filter(navn__iexact=by.lower().strip()).first()
-        if obj is not None:
-            return obj
+        navn = by.strip().upper()
+        for obj in objs:
+            if obj.navn.upper() == navn:
+                return obj
     raise Postnummer.DoesNotExist(f"Postnummer med bynavn '{by}' kunne ikke findes")
@@ -2,16 +2,14 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 # mypy: disable-error-code="call-arg, attr-defined"
-import base64
 import logging
 from typing import Annotated, Optional
-from uuid import uuid4
 
+from anmeldelse.models import AfgiftsanmeldelseAdgang
 from common.api import get_auth_methods
 from common.models import IndberetterProfile
 from common.util import coerce_num_to_str
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.db.models import QuerySet
 from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
@@ -20,7 +18,8 @@ from ninja import Field, FilterSchema, ModelSchema, Query
 from ninja_extra import api_controller, permissions, route
 from ninja_extra.exceptions import PermissionDenied
 from ninja_extra.pagination import paginate
-from ninja_extra.schemas import NinjaPaginationResponseSchema
+from project.files import file_response, request_fil
+from project.pagination import CursorPagination, CursorPaginationResponseSchema
 from project.util import RestPermission, json_dump
 from pydantic import BeforeValidator
 
@@ -133,14 +132,14 @@ class PostforsendelseAPI:
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[PostforsendelseOut],
+        response=CursorPaginationResponseSchema[PostforsendelseOut],
         auth=get_auth_methods(),
         url_name="postforsendelse_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def list_postforsendelser(self, filters: PostforsendelseFilterSchema = Query(...)):
         # https://django-ninja.rest-framework.com/guides/input/filtering/
-        return list(filters.filter(self.filter_user(Postforsendelse.objects.all())))
+        return filters.filter(self.filter_user(Postforsendelse.objects.all()))
         """
         return list(Post.objects.filter(
             filters.get_filter_expression() & Q("mere filtrering fra vores side")
@@ -168,23 +167,13 @@ class PostforsendelseAPI:
         user = self.context.request.user
         if user.has_perm("forsendelse.view_all_postforsendelser"):
             return qs
-        q = qs.none()
-        q |= qs.filter(afgiftsanmeldelse__oprettet_af__pk=user.pk)
-        q |= qs.filter(afgiftsanmeldelse__oprettet_på_vegne_af__pk=user.pk)
         try:
             cvr = getattr(user.indberetter_data, "cvr")
         except IndberetterProfile.DoesNotExist:
-            pass
-        else:
-            if cvr is not None:
-                q |= qs.filter(
-                    afgiftsanmeldelse__oprettet_af__indberetter_data__cvr=cvr
-                )
-                q |= qs.filter(
-                    afgiftsanmeldelse__oprettet_på_vegne_af__indberetter_data__cvr=cvr
-                )
-                q |= qs.filter(afgiftsanmeldelse__fuldmagtshaver__cvr=cvr)
-        return q
+            cvr = None
+        return qs.filter(
+            afgiftsanmeldelse__id__in=AfgiftsanmeldelseAdgang.synlige(user, cvr)
+        )
 
     def check_user(self, item: Postforsendelse):
         if not self.filter_user(Postforsendelse.objects.filter(id=item.id)).exists():
@@ -264,8 +253,12 @@ class FragtforsendelseAPI:
         payload: FragtforsendelseIn,
     ):
         data = payload.dict()
-        fragtbrev = data.pop("fragtbrev", None)
-        fragtbrev_navn = data.pop("fragtbrev_navn", None) or (str(uuid4()) + ".pdf")
+        fragtbrev = request_fil(
+            self.context.request,
+            "fragtbrev",
+            data.pop("fragtbrev", None),
+            data.pop("fragtbrev_navn", None),
+        )
         try:
             item = Fragtforsendelse.objects.create(
                 **data, oprettet_af=self.context.request.user
@@ -275,14 +268,12 @@ class FragtforsendelseAPI:
                 json_dump(e.message_dict), content_type="application/json"
             )
         if fragtbrev is not None:
-            item.fragtbrev = ContentFile(
-                base64.b64decode(fragtbrev), name=fragtbrev_navn
-            )
+            item.fragtbrev = fragtbrev
             log.info(
                 "Rest API opretter Fragtforsendelse %d med fragtbrev %s (%d bytes)",
                 item.id,
-                fragtbrev_navn,
-                item.fragtbrev.size,
+                fragtbrev.name,
+                fragtbrev.size,
             )
             item.save()
         else:
@@ -302,18 +293,28 @@ class FragtforsendelseAPI:
         self.check_user(item)
         return item
 
+    @route.get(
+        "/{id}/fragtbrev",
+        auth=get_auth_methods(),
+        url_name="fragtforsendelse_fragtbrev",
+    )
+    def get_fragtbrev(self, id: int):
+        item = get_object_or_404(Fragtforsendelse, id=id)
+        self.check_user(item)
+        return file_response(self.context.request, item.fragtbrev)
+
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[FragtforsendelseOut],
+        response=CursorPaginationResponseSchema[FragtforsendelseOut],
         auth=get_auth_methods(),
         url_name="fragtforsendelse_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @paginate(CursorPagination)
     def list_fragtforsendelser(
         self, filters: FragtforsendelseFilterSchema = Query(...)
     ):
         # https://django-ninja.rest-framework.com/guides/input/filtering/
-        return list(filters.filter(self.filter_user(Fragtforsendelse.objects.all())))
+        return filters.filter(self.filter_user(Fragtforsendelse.objects.all()))
         """
         return list(Fragt.objects.filter(
             filters.get_filter_expression() & Q("mere filtrering fra vores side")
@@ -325,20 +326,22 @@ class FragtforsendelseAPI:
         item = get_object_or_404(Fragtforsendelse, id=id)
         self.check_user(item)
         data = payload.dict(exclude_unset=True)
-        fragtbrev = data.pop("fragtbrev", None)
-        fragtbrev_navn = data.pop("fragtbrev_navn", None) or (str(uuid4()) + ".pdf")
+        fragtbrev = request_fil(
+            self.context.request,
+            "fragtbrev",
+            data.pop("fragtbrev", None),
+            data.pop("fragtbrev_navn", None),
+        )
         for attr, value in data.items():
             if value is not None:
                 setattr(item, attr, value)
         if fragtbrev is not None:
-            item.fragtbrev = ContentFile(
-                base64.b64decode(fragtbrev), name=fragtbrev_navn
-            )
+            item.fragtbrev = fragtbrev
             log.info(
                 "Rest API opdaterer Fragtforsendelse %d med fragtbrev %s (%d bytes)",
                 item.id,
-                fragtbrev_navn,
-                item.fragtbrev.size,
+                fragtbrev.name,
+                fragtbrev.size,
             )
         else:
             log.info(
@@ -360,23 +363,13 @@ class FragtforsendelseAPI:
         user = self.context.request.user
         if user.has_perm("forsendelse.view_all_fragtforsendelser"):
             return qs
-        q = qs.none()
-        q |= qs.filter(afgiftsanmeldelse__oprettet_af__pk=user.pk)
-        q |= qs.filter(afgiftsanmeldelse__oprettet_på_vegne_af__pk=user.pk)
         try:
             cvr = getattr(user.indberetter_data, "cvr")
         except IndberetterProfile.DoesNotExist:
-            pass
-        else:
-            if cvr is not None:
-                q |= qs.filter(
-                    afgiftsanmeldelse__oprettet_af__indberetter_data__cvr=cvr
-                )
-                q |= qs.filter(
-                    afgiftsanmeldelse__oprettet_på_vegne_af__indberetter_data__cvr=cvr
-                )
-                q |= qs.filter(afgiftsanmeldelse__fuldmagtshaver__cvr=cvr)
-        return q
+            cvr = None
+        return qs.filter(
+            afgiftsanmeldelse__id__in=AfgiftsanmeldelseAdgang.synlige(user, cvr)
+        )
 
     def check_user(self, item: Fragtforsendelse):
         if not self.filter_user(Fragtforsendelse.objects.filter(id=item.id)).exists():
@@ -8,6 +8,8 @@ from aktør.models import Afsender, Modtager
 from anmeldelse.models import Afgiftsanmeldelse
 from common.models import IndberetterProfile
 from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
 from django.test import TestCase
 from django.urls import reverse
 from forsendelse.models import Forsendelse, Fragtforsendelse, Postforsendelse
@@ -291,7 +293,10 @@ class PostforsendelseAPITests(TestCase):
         )
 
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp.json(), {"count": 0, "items": []})
+        self.assertEqual(
+            resp.json(),
+            {"count": 0, "count_estimated": False, "next": None, "items": []},
+        )
 
     def test_list_postforsendelser_filter_user_created_by_indberetter_cvr(self):
         _ = IndberetterProfile.objects.create(
@@ -331,6 +336,8 @@ class PostforsendelseAPITests(TestCase):
             resp.json(),
             {
                 "count": 1,
+                "count_estimated": False,
+                "next": None,
                 "items": [
                     {
                         "id": postforsendelse.id,
@@ -397,6 +404,40 @@ class FragtforsendelseAPITests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.json(), {"id": ANY})
 
+    def test_get_fragtbrev(self):
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="view_fragtforsendelse"),
+            Permission.objects.create(
+                name="Kan se alle fragtforsendeler, ikke kun egne",
+                codename="view_all_fragtforsendelser",
+                content_type=ContentType.objects.get_for_model(
+                    Fragtforsendelse, for_concrete_model=False
+                ),
+            ),
+        )
+        fragtforsendelse = Fragtforsendelse.objects.create(
+            kladde=True,
+            oprettet_af=self.user,
+            fragtbrev=ContentFile(b"fragtbrev" * 1000, name="fragtbrev.pdf"),
+        )
+        self.addCleanup(fragtforsendelse.fragtbrev.delete, save=False)
+        url = reverse(
+            "api-1.0.0:fragtforsendelse_fragtbrev", args=[fragtforsendelse.id]
+        )
+
+        resp = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {self.user_token}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Length"], "9000")
+        self.assertEqual(b"".join(resp.streaming_content), b"fragtbrev" * 1000)
+
+        resp = self.client.get(
+            url,
+            HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            HTTP_RANGE="bytes=9-17",
+        )
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b"".join(resp.streaming_content), b"fragtbrev")
+
     def test_create_fragtforsendelse_skib_bad_requests(self):
         resp_invalid_forbindelsesnr = self.client.post(
             reverse("api-1.0.0:fragtforsendelse_create"),
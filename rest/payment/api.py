@@ -6,12 +6,11 @@
 from typing import Callable, Dict, List, Optional, Tuple
 
 from anmeldelse.models import PrivatAfgiftsanmeldelse, Varelinje
-from common.api import get_auth_methods
+from common.api import JWTAuth, get_auth_methods
 from django.conf import settings
 from django.forms import model_to_dict
 from ninja_extra import api_controller, permissions, route
 from ninja_extra.exceptions import PermissionDenied, ValidationError
-from ninja_jwt.authentication import JWTAuth
 from payment.models import Item, Payment
 from payment.permissions import PaymentPermission
 from payment.provider_handlers import (
@@ -0,0 +1,488 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import json
+import os
+import time
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from aktør.models import Afsender, Modtager
+from anmeldelse.models import (
+    Afgiftsanmeldelse,
+    Notat,
+    PrismeResponse,
+    PrivatAfgiftsanmeldelse,
+    Varelinje,
+)
+from common.models import IndberetterProfile
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from forsendelse.models import Fragtforsendelse, Postforsendelse
+from payment.models import Payment
+from project.test_mixins import RestMixin
+from project.util import json_dump
+from sats.models import Afgiftstabel, Vareafgiftssats
+
+# Regressionsmålinger af REST-API'et
+#
+# Hver controllers list-, get-, create- og update-endpoints kaldes mod et
+# realistisk datasæt, og antallet af databaseforespørgsler, svartiden og
+# svarets størrelse sammenlignes med baseline.json:
+#
+# - Flere forespørgsler end i baseline fejler (typisk en ny N+1).
+# - Et svar mere end SIZE_TOLERANCE (plus SIZE_FLOOR bytes) større end i
+#   baseline fejler. Id'er og tidsstempler varierer lidt mellem kørsler, så
+#   størrelsen er ikke eksakt.
+# - Svartiden afhænger af maskinen og af parallelle testkørsler, så den
+#   kontrolleres kun med REST_BENCHMARK_TIME=1, med en bred tolerance.
+#
+# Færre forespørgsler eller mindre svar er en forbedring; så opdateres
+# baseline med:
+#
+#   REST_BENCHMARK_UPDATE=1 python manage.py test project.benchmark
+#
+# Målingerne kører mod testdatabasen og kræver ingen netværksadgang.
+
+BASELINE = Path(__file__).parent / "baseline.json"
+SIZE_TOLERANCE = 0.1
+SIZE_FLOOR = 16
+TIME_TOLERANCE = 3.0
+TIME_FLOOR_MS = 20.0
+
+
+def _flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+class RestBenchmarkTest(RestMixin, TestCase):
+    anmeldelser = 60
+    privatanmeldelser = 40
+    varelinjer = 5
+
+    token: str
+    update: bool
+    check_time: bool
+    baseline: Dict[str, Dict[str, Any]]
+    results: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.update = _flag("REST_BENCHMARK_UPDATE")
+        cls.check_time = _flag("REST_BENCHMARK_TIME")
+        cls.results = {}
+        try:
+            cls.baseline = json.loads(BASELINE.read_text())
+        except FileNotFoundError:
+            cls.baseline = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.update and cls.results:
+            baseline = {**cls.baseline, **cls.results}
+            BASELINE.write_text(
+                json.dumps(baseline, indent=2, sort_keys=True, ensure_ascii=False)
+                + "\n"
+            )
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.token, _ = cls.make_user(
+            "benchmark", "benchmarkpassword", is_superuser=True
+        )
+        cls.tabel = Afgiftstabel.objects.create(
+            gyldig_fra=datetime(2020, 1, 1, tzinfo=UTC), kladde=False
+        )
+        cls.satser = [
+            Vareafgiftssats.objects.create(
+                afgiftstabel=cls.tabel,
+                vareart_da=f"Vareart {nummer}",
+                vareart_kl=f"Vareart {nummer}",
+                afgiftsgruppenummer=800000 + nummer,
+                enhed=Vareafgiftssats.Enhed.KILOGRAM,
+                afgiftssats=Decimal(nummer) / 4,
+            )
+            for nummer in range(50)
+        ]
+        for i in range(cls.anmeldelser):
+            # Hver anmeldelse har sin egen opretter, aktører og forsendelse,
+            # så intet kan genbruges på tværs af rækker
+            opretter = User.objects.create(username=f"benchmark-{i}")
+            IndberetterProfile.objects.create(
+                user=opretter,
+                cpr=1100000000 + i,
+                cvr=20000000 + i,
+                api_key=uuid4(),
+            )
+            afsender = Afsender.objects.create(
+                navn=f"Afsender {i}",
+                adresse=f"Afsendervej {i}",
+                postnummer=3900,
+                by="Nuuk",
+            )
+            modtager = Modtager.objects.create(
+                navn=f"Modtager {i}",
+                adresse=f"Modtagervej {i}",
+                postnummer=3900,
+                by="Nuuk",
+            )
+            if i % 2:
+                forsendelse = {
+                    "fragtforsendelse": Fragtforsendelse.objects.create(
+                        forsendelsestype=Fragtforsendelse.Forsendelsestype.SKIB,
+                        fragtbrevsnummer=f"BENCH{i:07}",
+                        forbindelsesnr=f"ABC {i:03}",
+                        afgangsdato=date(2024, 1, 1),
+                        oprettet_af=opretter,
+                    )
+                }
+            else:
+                forsendelse = {
+                    "postforsendelse": Postforsendelse.objects.create(
+                        forsendelsestype=Postforsendelse.Forsendelsestype.FLY,
+                        postforsendelsesnummer=f"{i}",
+                        afsenderbykode="8200",
+                        afgangsdato=date(2024, 1, 1),
+                        oprettet_af=opretter,
+                    )
+                }
+            anmeldelse = Afgiftsanmeldelse.objects.create(
+                afsender=afsender,
+                modtager=modtager,
+                leverandørfaktura_nummer=str(i),
+                betales_af="afsender",
+                status="ny",
+                oprettet_af=opretter,
+                **forsendelse,
+            )
+            for j in range(cls.varelinjer):
+                Varelinje.objects.create(
+                    afgiftsanmeldelse=anmeldelse,
+                    vareafgiftssats=cls.satser[(i + j) % len(cls.satser)],
+                    mængde=Decimal(j + 1),
+                    fakturabeløb=Decimal(100 * (j + 1)),
+                )
+            Notat.objects.create(
+                afgiftsanmeldelse=anmeldelse, user=opretter, tekst=f"Notat {i}"
+            )
+            PrismeResponse.objects.create(
+                afgiftsanmeldelse=anmeldelse,
+                rec_id=i,
+                tax_notification_number=i,
+                delivery_date=datetime(2024, 1, 1, tzinfo=UTC),
+            )
+        for i in range(cls.privatanmeldelser):
+            privat = PrivatAfgiftsanmeldelse.objects.create(
+                cpr=1000000000 + i,
+                navn=f"Privat {i}",
+                adresse=f"Privatvej {i}",
+                postnummer=3900,
+                by="Nuuk",
+                telefon="123456",
+                bookingnummer=str(i),
+                indleveringsdato=date(2024, 1, 1),
+                leverandørfaktura_nummer=str(i),
+                oprettet_af=cls.user,
+                status="ny",
+            )
+            for j in range(cls.varelinjer):
+                Varelinje.objects.create(
+                    privatafgiftsanmeldelse=privat,
+                    vareafgiftssats=cls.satser[(i + j) % len(cls.satser)],
+                    mængde=Decimal(j + 1),
+                    fakturabeløb=Decimal(100 * (j + 1)),
+                )
+            Payment.objects.create(
+                amount=10000,
+                currency="DKK",
+                reference=str(i),
+                declaration=privat,
+                status="paid" if i % 2 else "created",
+            )
+        cls.anmeldelse = Afgiftsanmeldelse.objects.order_by("pk").first()
+        cls.privatanmeldelse = PrivatAfgiftsanmeldelse.objects.order_by("pk").first()
+        cls.indberetter = IndberetterProfile.objects.order_by("pk").first()
+
+    def request(self, method: str, url: str, data: Optional[dict] = None):
+        return getattr(self.client, method)(
+            url,
+            json_dump(data) if data is not None else None,
+            HTTP_AUTHORIZATION=f"Bearer {self.token}",
+            content_type="application/json",
+        )
+
+    def measure(
+        self,
+        name: str,
+        method: str,
+        url_name: str,
+        kwargs: Optional[dict] = None,
+        data: Optional[dict] = None,
+        query: str = "",
+    ):
+        url = reverse(f"api-1.0.0:{url_name}", kwargs=kwargs) + query
+        # Godkendelse og referencedata caches på tværs af requests, så de
+        # fyldes før målingen
+        self.request("get", reverse("api-1.0.0:user_view"))
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = self.request(method, url, data)
+            elapsed = (time.perf_counter() - start) * 1000
+        self.assertIn(
+            response.status_code,
+            (200, 201),
+            f"{method.upper()} {url}: {response.content}",
+        )
+        result = {
+            "queries": len(context.captured_queries),
+            "bytes": len(response.content),
+            "ms": round(elapsed, 1),
+        }
+        self.results[name] = result
+        if self.update:
+            return response
+        expected = self.baseline.get(name)
+        if expected is None:
+            self.fail(f"{name} mangler i {BASELINE.name}, opdatér den")
+        with self.subTest(name):
+            self.assertLessEqual(
+                result["queries"],
+                expected["queries"],
+                f"{method.upper()} {url} laver flere forespørgsler end før:\n"
+                + "\n".join(query["sql"] for query in context.captured_queries),
+            )
+            self.assertLessEqual(
+                result["bytes"],
+                expected["bytes"] * (1 + SIZE_TOLERANCE) + SIZE_FLOOR,
+                f"{method.upper()} {url} giver et større svar end før",
+            )
+            if self.check_time:
+                self.assertLessEqual(
+                    result["ms"],
+                    expected["ms"] * TIME_TOLERANCE + TIME_FLOOR_MS,
+                    f"{method.upper()} {url} er langsommere end før",
+                )
+        return response
+
+    def test_aktør(self):
+        for navn, data in (
+            ("afsender", self.afsender_data),
+            ("modtager", self.modtager_data),
+        ):
+            item = (Afsender if navn == "afsender" else Modtager).objects.first()
+            self.measure(f"{navn}_list", "get", f"{navn}_list")
+            self.measure(f"{navn}_get", "get", f"{navn}_get", {"id": item.id})
+            self.measure(f"{navn}_create", "post", f"{navn}_create", data=data)
+            self.measure(
+                f"{navn}_update",
+                "patch",
+                f"{navn}_update",
+                {"id": item.id},
+                {"navn": f"Ny {navn}"},
+            )
+        self.measure("speditør_list", "get", "speditør_list")
+
+    def test_forsendelse(self):
+        fragtforsendelse_data = {**self.fragtforsendelse_data}
+        fragtforsendelse_data.pop("fragtbrev")
+        for navn, data in (
+            ("postforsendelse", self.postforsendelse_data),
+            ("fragtforsendelse", fragtforsendelse_data),
+        ):
+            item = (
+                Postforsendelse if navn == "postforsendelse" else Fragtforsendelse
+            ).objects.first()
+            self.measure(f"{navn}_list", "get", f"{navn}_list")
+            self.measure(f"{navn}_get", "get", f"{navn}_get", {"id": item.id})
+            self.measure(f"{navn}_create", "post", f"{navn}_create", data=data)
+            self.measure(
+                f"{navn}_update",
+                "patch",
+                f"{navn}_update",
+                {"id": item.id},
+                {"kladde": True},
+            )
+
+    def test_afgiftsanmeldelse(self):
+        id = {"id": self.anmeldelse.id}
+        self.measure("afgiftsanmeldelse_list", "get", "afgiftsanmeldelse_list")
+        self.measure(
+            "afgiftsanmeldelse_list_full", "get", "afgiftsanmeldelse_list_full"
+        )
+        self.measure(
+            "afgiftsanmeldelse_list_expand",
+            "get",
+            "afgiftsanmeldelse_list",
+            query="?expand=varelinjer,notater,prismeresponses",
+        )
+        self.measure("afgiftsanmeldelse_get", "get", "afgiftsanmeldelse_get", id)
+        self.measure(
+            "afgiftsanmeldelse_get_full", "get", "afgiftsanmeldelse_get_full", id
+        )
+        data = {**self.afgiftsanmeldelse_data}
+        data.pop("leverandørfaktura")
+        postforsendelse = Postforsendelse.objects.create(
+            forsendelsestype=Postforsendelse.Forsendelsestype.FLY,
+            postforsendelsesnummer="ny",
+            afsenderbykode="8200",
+            afgangsdato=date(2024, 1, 1),
+            oprettet_af=self.user,
+        )
+        self.measure(
+            "afgiftsanmeldelse_create",
+            "post",
+            "afgiftsanmeldelse_create",
+            data={
+                **data,
+                "afsender_id": self.anmeldelse.afsender_id,
+                "modtager_id": self.anmeldelse.modtager_id,
+                "postforsendelse_id": postforsendelse.id,
+            },
+        )
+        self.measure(
+            "afgiftsanmeldelse_update",
+            "patch",
+            "afgiftsanmeldelse_update",
+            id,
+            {"leverandørfaktura_nummer": "54321"},
+        )
+
+    def test_privat_afgiftsanmeldelse(self):
+        id = {"id": self.privatanmeldelse.id}
+        self.measure(
+            "privat_afgiftsanmeldelse_list", "get", "privat_afgiftsanmeldelse_list"
+        )
+        self.measure(
+            "privat_afgiftsanmeldelse_get", "get", "privat_afgiftsanmeldelse_get", id
+        )
+        self.measure(
+            "privat_afgiftsanmeldelse_create",
+            "post",
+            "privat_afgiftsanmeldelse_create",
+            data={
+                "cpr": 1111111111,
+                "navn": "Ny privat",
+                "adresse": "Privatvej 1",
+                "postnummer": 3900,
+                "by": "Nuuk",
+                "telefon": "123456",
+                "bookingnummer": "1",
+                "indleveringsdato": "2024-01-01",
+                "leverandørfaktura_nummer": "1",
+            },
+        )
+        self.measure(
+            "privat_afgiftsanmeldelse_update",
+            "patch",
+            "privatafgiftsanmeldelse_update",
+            id,
+            {"navn": "Nyt navn"},
+        )
+
+    def test_varelinje(self):
+        varelinje = Varelinje.objects.filter(afgiftsanmeldelse=self.anmeldelse).first()
+        self.measure("varelinje_list", "get", "varelinje_list")
+        self.measure(
+            "varelinje_list_anmeldelse",
+            "get",
+            "varelinje_list",
+            query=f"?afgiftsanmeldelse={self.anmeldelse.id}",
+        )
+        self.measure("varelinje_get", "get", "varelinje_get", {"id": varelinje.id})
+        self.measure(
+            "varelinje_create",
+            "post",
+            "varelinje_create",
+            data={
+                **self.varelinje_data,
+                "afgiftsanmeldelse_id": self.anmeldelse.id,
+                "vareafgiftssats_id": self.satser[0].id,
+            },
+        )
+        self.measure(
+            "varelinje_update",
+            "patch",
+            "varelinje_update",
+            {"id": varelinje.id},
+            {"fakturabeløb": "2000.00"},
+        )
+
+    def test_notat_prismeresponse(self):
+        notat = Notat.objects.first()
+        prismeresponse = PrismeResponse.objects.first()
+        self.measure("notat_list", "get", "notat_list")
+        self.measure("notat_get", "get", "notat_get", {"id": notat.id})
+        self.measure(
+            "notat_create",
+            "post",
+            "notat_create",
+            data={"tekst": "Nyt notat", "afgiftsanmeldelse_id": self.anmeldelse.id},
+        )
+        self.measure("prismeresponse_list", "get", "prismeresponse_list")
+        self.measure(
+            "prismeresponse_get", "get", "prismeresponse_get", {"id": prismeresponse.id}
+        )
+        self.measure(
+            "prismeresponse_create",
+            "post",
+            "prismeresponse_create",
+            data={
+                "afgiftsanmeldelse_id": self.anmeldelse.id,
+                "rec_id": 1000,
+                "tax_notification_number": 1000,
+                "delivery_date": "2024-01-01T00:00:00+00:00",
+            },
+        )
+        self.measure("toldkategori_list", "get", "toldkategori_get")
+
+    def test_sats(self):
+        id = {"id": self.tabel.id}
+        self.measure("afgiftstabel_list", "get", "afgiftstabel_list")
+        self.measure("afgiftstabel_get", "get", "afgiftstabel_get", id)
+        self.measure(
+            "afgiftstabel_create",
+            "post",
+            "afgiftstabel_create",
+            data={"gyldig_fra": "2030-01-01T00:00:00+00:00", "kladde": True},
+        )
+        self.measure(
+            "afgiftstabel_update", "patch", "afgiftstabel_update", id, {"kladde": False}
+        )
+        sats = {"id": self.satser[0].id}
+        self.measure("vareafgiftssats_list", "get", "vareafgiftssats_list")
+        self.measure("vareafgiftssats_get", "get", "vareafgiftssats_get", sats)
+        self.measure(
+            "vareafgiftssats_create",
+            "post",
+            "vareafgiftssats_create",
+            data={
+                **self.vareafgiftssats_data,
+                "afgiftsgruppenummer": 900000,
+                "afgiftstabel_id": self.tabel.id,
+            },
+        )
+        self.measure(
+            "vareafgiftssats_update",
+            "patch",
+            "vareafgiftssats_update",
+            sats,
+            {"vareart_da": "Ny vareart"},
+        )
+
+    def test_user(self):
+        self.measure("user_list", "get", "user_list")
+        self.measure(
+            "user_get",
+            "get",
+            "user_get",
+            {"cpr": self.indberetter.cpr, "cvr": self.indberetter.cvr},
+        )
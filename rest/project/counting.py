@@ -0,0 +1,143 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import hashlib
+import json
+import logging
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Optælling af paginerede lister (feltet `count`).
+#
+# Uden videre tælles listen med COUNT(*) over hele det filtrerede queryset,
+# hvilket på store tabeller med fx icontains-filtre koster lige så meget som
+# selve siden. Med pagineringsparameteren `count` vælges en strategi:
+#
+# - "exact" (standard): COUNT(*) som hidtil.
+# - "auto": Tæller højst PAGINATION_COUNT_EXACT_LIMIT rækker. Er der ikke
+#   flere, er antallet eksakt; ellers bruges PostgreSQL's estimat
+#   (planlæggerens rækkeantal for forespørgslen, eller tabellens reltuples for
+#   en ufiltreret liste, som så slet ikke tælles). Resultatet gemmes i
+#   cache-aliaset "counts" under en hash af forespørgslen og tabellernes
+#   generationer, som tælles op når rækker i tabellerne gemmes eller slettes;
+#   bulk-operationer uden signaler ses først når cachen udløber. Estimerede
+#   antal markeres med `count_estimated`.
+# - "none": Ingen optælling; om der er flere sider, ses af `next`.
+
+log = logging.getLogger(__name__)
+
+CACHE_ALIAS = "counts"
+KEY_PREFIX = "count"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def exact_limit() -> int:
+    return getattr(settings, "PAGINATION_COUNT_EXACT_LIMIT", 10000)
+
+
+def _generation_key(table: str) -> str:
+    return f"{KEY_PREFIX}:gen:{table}"
+
+
+def _bump(table: str) -> None:
+    key = _generation_key(table)
+    cache = _cache()
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as e:
+        log.warning("Kunne ikke invalidere optællinger af %s: %s", table, e)
+
+
+@receiver(post_save, dispatch_uid="counting_save")
+@receiver(post_delete, dispatch_uid="counting_delete")
+def række_ændret(sender, **kwargs):
+    table = sender._meta.db_table
+    _bump(table)
+    # Igen når ændringen er synlig for andre forbindelser, så en optælling
+    # foretaget i mellemtiden ikke bliver hængende
+    transaction.on_commit(lambda: _bump(table))
+
+
+def _key(queryset: QuerySet) -> str:
+    query = queryset.query
+    tables = sorted(
+        {queryset.model._meta.db_table}
+        | {join.table_name for join in query.alias_map.values()}
+    )
+    generations = _cache().get_many([_generation_key(table) for table in tables])
+    sql, params = query.sql_with_params()
+    digest = hashlib.sha256(
+        repr(
+            (sql, params, [generations.get(_generation_key(t)) for t in tables])
+        ).encode("utf-8")
+    ).hexdigest()
+    return f"{KEY_PREFIX}:{digest}"
+
+
+def _reltuples(queryset: QuerySet) -> int:
+    # Tabellens estimerede antal rækker, eller -1 hvis den ikke er analyseret
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row else -1
+
+
+def _plan_rows(queryset: QuerySet) -> int:
+    plan = json.loads(queryset.explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _estimate(queryset: QuerySet) -> Tuple[int, bool]:
+    limit = exact_limit()
+    if not queryset.query.where and not queryset.query.distinct:
+        estimate = _reltuples(queryset)
+        if estimate > limit:
+            return estimate, True
+    count = queryset[: limit + 1].count()
+    if count <= limit:
+        return count, False
+    try:
+        return max(_plan_rows(queryset), count), True
+    except (DatabaseError, KeyError, IndexError, TypeError, ValueError) as e:
+        log.warning("Kunne ikke estimere antal: %s", e)
+        return count, True
+
+
+def count(queryset: QuerySet, strategy: str = "exact") -> Tuple[int, bool]:
+    """
+    Antallet af elementer i `queryset` med den givne strategi,
+    og om antallet er estimeret
+    """
+    if strategy != "auto":
+        return queryset.count(), False
+    key: Optional[str]
+    cached: Optional[Tuple[int, bool]]
+    try:
+        key = _key(queryset)
+        cached = _cache().get(key)
+    except Exception as e:
+        log.warning("Kunne ikke læse optælling fra cachen: %s", e)
+        key = cached = None
+    if cached is not None:
+        return cached
+    result = _estimate(queryset)
+    if key is not None:
+        try:
+            _cache().set(key, result)
+        except Exception as e:
+            log.warning("Kunne ikke gemme optælling i cachen: %s", e)
+    return result
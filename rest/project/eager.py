@@ -0,0 +1,127 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from functools import lru_cache
+from typing import Optional, Set, Tuple, Type, get_args
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, QuerySet
+from pydantic import BaseModel
+
+# Planlægning af eager loading ud fra output-skemaer.
+#
+# Et skema der nester et andet skema (fx `afsender: AfsenderOut`) læser den
+# tilsvarende relation på modellen. Enkeltværdi-relationer (ForeignKey og
+# OneToOne, begge veje) hentes med select_related, mens flerværdi-relationer
+# (ManyToMany og omvendte ForeignKeys) hentes med prefetch_related.
+#
+# Relationer der kun læses i resolvers kan skemaet ikke se, så de erklæres på
+# skemaet som stier i stil med prefetch_related-argumenter:
+#
+# class FooOut(ModelSchema):
+#     eager_relations: ClassVar[Tuple[str, ...]] = ("bar", "baz__quux_set")
+#
+# Stierne er relative til skemaets model, og følger med når skemaet nestes.
+
+
+def _nested_schema(annotation) -> Optional[Type[BaseModel]]:
+    # Pak Optional[...], List[...], Annotated[...] osv. ud
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in get_args(annotation):
+        schema = _nested_schema(arg)
+        if schema is not None:
+            return schema
+    return None
+
+
+def _relation(model: Type[Model], name: str):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # Omvendte relationer uden related_name tilgås med "<model>_set"
+        for field in model._meta.related_objects:
+            if field.get_accessor_name() == name:
+                break
+        else:
+            return None
+    return field if field.is_relation else None
+
+
+def _is_multivalued(relation) -> bool:
+    return bool(relation.many_to_many or relation.one_to_many)
+
+
+def _add_hint(
+    model: Type[Model],
+    prefix: str,
+    many: bool,
+    path: str,
+    select: Set[str],
+    prefetch: Set[str],
+):
+    for name in path.split("__"):
+        relation = _relation(model, name)
+        if relation is None:
+            raise FieldDoesNotExist(
+                f"{model.__name__} har ingen relation med navnet '{name}'"
+            )
+        many = many or _is_multivalued(relation)
+        model = relation.related_model
+    (prefetch if many else select).add(prefix + path)
+
+
+def _walk(
+    model: Type[Model],
+    schema: Type[BaseModel],
+    prefix: str,
+    many: bool,
+    select: Set[str],
+    prefetch: Set[str],
+):
+    for path in getattr(schema, "eager_relations", ()):
+        _add_hint(model, prefix, many, path, select, prefetch)
+    for name, field in schema.model_fields.items():
+        nested = _nested_schema(field.annotation)
+        if nested is None:
+            continue
+        relation = _relation(model, field.alias or name)
+        if relation is None:
+            continue
+        path = prefix + (field.alias or name)
+        nested_many = many or _is_multivalued(relation)
+        (prefetch if nested_many else select).add(path)
+        _walk(
+            relation.related_model, nested, path + "__", nested_many, select, prefetch
+        )
+
+
+@lru_cache(maxsize=None)
+def eager_plan(
+    model: Type[Model], schema: Type[BaseModel]
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Returnerer (select_related, prefetch_related) for at serialisere
+    instanser af `model` med `schema` uden forespørgsler pr. række
+    """
+    select: Set[str] = set()
+    prefetch: Set[str] = set()
+    _walk(model, schema, "", False, select, prefetch)
+    # select_related på en sti implicerer dens forældre
+    select = {
+        path
+        for path in select
+        if not any(other.startswith(path + "__") for other in select)
+    }
+    return tuple(sorted(select)), tuple(sorted(prefetch))
+
+
+def eager_load(qs: QuerySet, schema: Type[BaseModel]) -> QuerySet:
+    model: Type[Model] = qs.model
+    select, prefetch = eager_plan(model, schema)
+    if select:
+        qs = qs.select_related(*select)
+    if prefetch:
+        qs = qs.prefetch_related(*prefetch)
+    return qs
@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from functools import lru_cache, wraps
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Field, FileField, Model, QuerySet
+from django.http import HttpResponse
+from django.http.response import HttpResponseBase
+from ninja import Schema
+from project.eager import _is_multivalued, _nested_schema
+from project.util import json_dump
+
+# Hurtig serialisering af store lister direkte fra values().
+#
+# Ad den almindelige vej bygger ninja en pydantic-model pr. element og kører
+# dens resolvers, før ORJSONRenderer koder resultatet. For lister med tusindvis
+# af elementer (fx varelinjer) er det det dyreste i requestet.
+#
+# Et skema der kun består af modellens egne kolonner (ingen resolvers, nestede
+# skemaer eller filer), kan i stedet hentes med values(), og rækkerne omdøbes
+# direkte til skemaets felter (fx "afgiftsanmeldelse" fra "afgiftsanmeldelse_id")
+# og kodes af orjson. Felterne og kolonnerne beregnes én gang pr. skema, og
+# JSON'en er den samme som ad den almindelige vej.
+#
+# Et list-endpoint slår det til ved at returnere `fast_values(qs, Skema)` og
+# have @fastpath(Skema) mellem @route og @paginate. Returnerer endpointet
+# modelinstanser (fx ved historik-opslag), bruges den almindelige vej.
+
+
+@lru_cache(maxsize=256)
+def fast_plan(
+    model: Type[Model], schema: Type[Schema]
+) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """
+    Skemaets felter og kolonnerne de hentes fra, eller None hvis skemaet
+    ikke kan serialiseres fra values()
+    """
+    plan: List[Tuple[str, str]] = []
+    for name, field in schema.model_fields.items():
+        if name in schema._ninja_resolvers or _nested_schema(field.annotation):
+            return None
+        column = field.validation_alias or name
+        if not isinstance(column, str):
+            return None
+        try:
+            model_field = model._meta.get_field(column)
+        except FieldDoesNotExist:
+            return None
+        if (
+            not isinstance(model_field, Field)
+            or not model_field.concrete
+            or _is_multivalued(model_field)
+            or isinstance(model_field, FileField)
+        ):
+            return None
+        if model_field.is_relation and column == model_field.name:
+            # Relationen i skemaet er fremmednøglens værdi
+            column = model_field.attname
+        plan.append((name, column))
+    return tuple(plan)
+
+
+def fast_values(qs: QuerySet, schema: Type[Schema]) -> QuerySet:
+    """
+    Querysettet som values() med kolonnerne til `schema`
+    """
+    model: Type[Model] = qs.model
+    plan = fast_plan(model, schema)
+    if plan is None:
+        raise TypeError(f"{schema.__name__} kan ikke serialiseres fra values()")
+    return qs.values(*[column for _, column in plan])
+
+
+def fast_items(
+    rows: List[Dict[str, Any]], model: Type[Model], schema: Type[Schema]
+) -> List[Dict[str, Any]]:
+    """
+    Rækker fra `fast_values` som `schema` ville serialisere dem
+    """
+    plan = fast_plan(model, schema)
+    if plan is None:
+        raise TypeError(f"{schema.__name__} kan ikke serialiseres fra values()")
+    names = [name for name, _ in plan]
+    columns = itemgetter(*[column for _, column in plan])
+    if len(plan) == 1:
+        return [{names[0]: columns(row)} for row in rows]
+    return [dict(zip(names, columns(row))) for row in rows]
+
+
+def fastpath(schema: Type[Schema]):
+    """
+    Dekoratør til et pagineret list-endpoint der returnerer `fast_values(qs,
+    schema)`. Placeres under @route og over @paginate
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            result = func(self, *args, **kwargs)
+            if isinstance(result, HttpResponseBase):
+                return result
+            items = result["items"]
+            if not items or not isinstance(items[0], dict):
+                return result
+            # ModelSchema angiver modellen i Config (eller Meta)
+            model = (getattr(schema, "Meta", None) or schema.Config).model
+            # Samme rækkefølge som CursorPaginationResponseSchema
+            data = {
+                "count": result["count"],
+                "count_estimated": result["count_estimated"],
+                "next": result["next"],
+                "items": fast_items(items, model, schema),
+            }
+            return HttpResponse(
+                json_dump(data), content_type="application/json; charset=utf-8"
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,182 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import base64
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Iterator, Optional, Tuple
+from uuid import uuid4
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+# Upload og download af filer (leverandørfakturaer, fragtbreve)
+#
+# Filer kan uploades som multipart/form-data (se MultipartPayloadMiddleware),
+# hvor Django streamer dem til midlertidige filer, som storage flytter på plads
+# uden at læse dem ind i hukommelsen. Base64 i JSON-payloadet virker stadig.
+#
+# JSON-svarene indeholder kun en reference til filen; selve filen hentes fra et
+# særskilt endpoint, som streamer den i blokke af CHUNK_SIZE bytes, så
+# hukommelsesforbruget pr. request ikke afhænger af filens størrelse.
+#
+# Svaret har Content-Length, ETag og Last-Modified, og understøtter
+# If-None-Match/If-Modified-Since (304) samt én byte-range pr. request
+# (`Range: bytes=start-slut`, evt. med If-Range). Flere ranges i samme request
+# besvares med hele filen, hvilket RFC 9110 14.2 tillader.
+
+CHUNK_SIZE = 64 * 1024
+
+_range_re = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(file: FieldFile) -> Tuple[str, Optional[float]]:
+    """
+    ETag og ændringstidspunkt for en gemt fil. Navn, størrelse og
+    ændringstidspunkt skifter når filen udskiftes, så filen skal ikke læses
+    for at beregne ETag
+    """
+    name = file.name
+    if not name:
+        raise FileNotFoundError
+    modified: Optional[float]
+    try:
+        modified = file.storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        modified = None
+    digest = hashlib.sha256(f"{name}:{file.size}:{modified}".encode("utf-8"))
+    return quote_etag(digest.hexdigest()[:32]), modified
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Første og sidste byte (inklusive) for en Range-header, None hvis hele filen
+    skal sendes, og ValueError hvis intervallet ligger uden for filen
+    """
+    if not header:
+        return None
+    match = _range_re.match(header.replace(" ", ""))
+    if not match:
+        # Ukendte enheder og flere ranges ignoreres
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix: de sidste `end` bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        raise ValueError
+    return first, last
+
+
+def _read(handle: File, start: int, length: int) -> Iterator[bytes]:
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def file_response(request: HttpRequest, file: Optional[FieldFile]) -> HttpResponseBase:
+    """
+    Streamer en gemt fil, eller kaster Http404 hvis der ikke er nogen
+    """
+    if not file or not file.name:
+        raise Http404
+    name = file.name
+    try:
+        size = file.size
+        etag, modified = file_etag(file)
+    except FileNotFoundError:
+        raise Http404
+
+    conditional = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(modified) if modified is not None else None,
+    )
+    if conditional is not None:
+        return conditional
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            uden_for = HttpResponse(status=416)
+            uden_for.headers["Content-Range"] = f"bytes */{size}"
+            return uden_for
+
+    filename = os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    handle = file.storage.open(name, "rb")
+    response: StreamingHttpResponse
+    if byte_range is None:
+        hel = FileResponse(handle, filename=filename, content_type=content_type)
+        hel.block_size = CHUNK_SIZE
+        response = hel
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read(handle, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response.headers["Content-Length"] = str(end - start + 1)
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response.headers["Content-Disposition"] = (
+            content_disposition_header(False, filename) or "inline"
+        )
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["ETag"] = etag
+    if modified is not None:
+        response.headers["Last-Modified"] = http_date(modified)
+    return response
+
+
+def request_fil(
+    request: HttpRequest,
+    felt: str,
+    base64_data: Optional[str],
+    navn: Optional[str] = None,
+) -> Optional[File]:
+    """
+    Filen til et FileField: en multipart-del med feltets navn, ellers
+    base64-data fra JSON-payloadet, eller None hvis ingen af dem er sendt
+    """
+    fil = request.FILES.get(felt)
+    if fil is not None:
+        if navn:
+            fil.name = navn
+        return fil
+    if base64_data is not None:
+        return ContentFile(
+            base64.b64decode(base64_data), name=navn or str(uuid4()) + ".pdf"
+        )
+    return None
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from common import referencedata
+from django.http.multipartparser import MultiPartParser
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    set_response_etag,
+)
+from django.utils.deprecation import MiddlewareMixin
+
+
+def _api_request(request) -> bool:
+    return request.path_info.startswith("/api/") and not request.path_info.startswith(
+        "/api/admin/"
+    )
+
+
+class MultipartPayloadMiddleware(MiddlewareMixin):
+    """
+    Gør det muligt at sende filer som multipart/form-data til API'et.
+
+    JSON-payloadet sendes i delen `payload`, og filerne i hver sin del navngivet
+    efter feltet (fx `leverandørfaktura`). Djangos upload-handlere streamer
+    filerne til midlertidige filer (over FILE_UPLOAD_MAX_MEMORY_SIZE), så de
+    aldrig ligger i hukommelsen i deres fulde længde, og filerne tæller ikke med
+    i DATA_UPLOAD_MAX_MEMORY_SIZE. Endpointene finder filerne i request.FILES
+    (se project.files.request_fil).
+
+    Ninja læser payloadet fra request.body, så den sættes til JSON-delen; ellers
+    ville request.body læse hele requestet ind i hukommelsen. Uden en
+    `payload`-del er body tom, og ninja svarer med valideringsfejl.
+
+    Django fortolker kun multipart for POST; for PATCH og PUT gøres det her.
+    """
+
+    def process_request(self, request):
+        if request.content_type != "multipart/form-data":
+            return
+        if not _api_request(request):
+            return
+        if request.method != "POST":
+            request._post, request._files = MultiPartParser(
+                request.META, request, request.upload_handlers, request.encoding
+            ).parse()
+        payload = request.POST.get("payload", "")
+        request._body = payload.encode("utf-8")
+
+
+class ConditionalGetMiddleware(MiddlewareMixin):
+    """
+    Sætter ETag på API'ets svar på GET, og svarer 304 Not Modified uden indhold
+    når klienten sender If-None-Match med samme ETag (se
+    told_common.response_cache).
+
+    ETag er en hash af selve svaret: et objekts JSON indeholder også data fra
+    relaterede rækker (fx betalingsstatus, faktureringsdato og brugere), som
+    ikke tæller objektets version op. Af samme grund evalueres
+    If-Modified-Since ikke, og svarene markeres `no-cache`, så de altid
+    valideres med ETag før de genbruges; Last-Modified er kun informativ.
+    """
+
+    def process_response(self, request, response):
+        if (
+            request.method not in ("GET", "HEAD")
+            or response.status_code != 200
+            or response.streaming
+            or not _api_request(request)
+        ):
+            return response
+        if not response.has_header("ETag"):
+            set_response_etag(response)
+        patch_cache_control(response, private=True, no_cache=True)
+        return (
+            get_conditional_response(
+                request, etag=response.headers["ETag"], response=response
+            )
+            or response
+        )
+
+
+class ReferencedataMiddleware(MiddlewareMixin):
+    """
+    Gemmer svarene fra endpoints med @referencedata i cachen, og sætter
+    referencedatas version på deres svar (se common.referencedata)
+    """
+
+    def process_response(self, request, response):
+        referencedata.gem_svar(request, response)
+        version = getattr(request, "referencedata_version", None)
+        if version is not None:
+            response.headers[referencedata.HEADER] = str(version)
+        return response
@@ -0,0 +1,226 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import base64
+import binascii
+from typing import Any, Generic, List, Literal, Optional, Tuple, TypeVar
+
+import orjson
+from django.core.exceptions import ValidationError
+from django.db.models import F, OrderBy, Q, QuerySet
+from ninja import Field, Schema
+from ninja.conf import settings
+from ninja.pagination import PaginationBase
+from project.counting import count as count_items
+from project.util import json_dump
+
+# Keyset-paginering ("cursor pagination")
+#
+# Listen sorteres altid efter querysettets sortering efterfulgt af primærnøglen,
+# så rækkefølgen er entydig. Hver side returnerer en `next`-cursor, som koder
+# sorteringsværdierne for sidens sidste element. Den næste side hentes ved at
+# filtrere på elementer der kommer efter disse værdier, i stedet for at springe
+# `offset` rækker over, så opslaget koster det samme uanset hvor langt inde i
+# listen man er.
+#
+# `limit`/`offset` virker stadig, og uden `cursor` returneres også `count`.
+# Med `cursor` springes optællingen over; klienten kender den fra første side.
+# Parameteren `count` vælger hvordan der tælles (se project/counting.py).
+#
+# Sorteringskontrakt: Feltet `next` kan kun bruges sammen med samme sortering
+# og filtre som den forespørgsel der leverede den.
+
+T = TypeVar("T")
+
+# (sti, faldende, kan_være_null)
+OrderingKey = Tuple[str, bool, bool]
+
+
+class CursorPaginationResponseSchema(Schema, Generic[T]):
+    count: Optional[int] = None
+    count_estimated: bool = False
+    next: Optional[str] = None
+    items: List[T]
+
+
+def _resolve_path(model, path: str) -> Tuple[Any, bool]:
+    # Find feltet for en sti som "afsender__navn", og om værdien kan være NULL
+    nullable = False
+    field = None
+    for name in path.split("__"):
+        if name == "pk":
+            field = model._meta.pk
+        else:
+            field = model._meta.get_field(name)
+        nullable = nullable or getattr(field, "null", False)
+        if field.is_relation:
+            model = field.related_model
+    return field, nullable
+
+
+def _ordering_keys(model, ordering, prefix: str = "") -> List[OrderingKey]:
+    keys: List[OrderingKey] = []
+    for item in ordering:
+        if isinstance(item, str):
+            if item == "?":
+                raise ValueError("Tilfældig sortering kan ikke pagineres med cursor")
+            descending = item.startswith("-")
+            path = item.lstrip("-")
+        elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+            descending = item.descending
+            path = item.expression.name
+        elif isinstance(item, F):
+            descending = False
+            path = item.name
+        else:
+            raise ValueError(f"Sortering på {item!r} kan ikke pagineres med cursor")
+        path = prefix + path
+        field, nullable = _resolve_path(model, path)
+        if field.is_relation and not field.many_to_many:
+            # Sortering på en relation bruger den relaterede models sortering
+            related = field.related_model
+            sub_ordering = related._meta.ordering or ["pk"]
+            for sub_path, sub_descending, sub_nullable in _ordering_keys(
+                model, sub_ordering, path + "__"
+            ):
+                keys.append(
+                    (sub_path, descending != sub_descending, nullable or sub_nullable)
+                )
+        else:
+            keys.append((path, descending, nullable))
+    return keys
+
+
+def ordering_keys(queryset: QuerySet) -> List[OrderingKey]:
+    """
+    Querysettets sortering udfoldet til felt-stier, afsluttet med primærnøglen
+    """
+    model = queryset.model
+    ordering = queryset.query.order_by
+    if not ordering and queryset.query.default_ordering:
+        ordering = model._meta.ordering
+    keys = _ordering_keys(model, ordering)
+    pk_paths = {"pk", model._meta.pk.name, model._meta.pk.attname}
+    if not any(path in pk_paths for path, descending, nullable in keys):
+        keys.append(("pk", False, False))
+    return keys
+
+
+def _after(path: str, descending: bool, nullable: bool, value) -> Optional[Q]:
+    # Elementer der kommer efter `value` i sorteringen.
+    # PostgreSQL sorterer NULL sidst ved stigende og først ved faldende sortering
+    if descending:
+        if value is None:
+            return Q(**{f"{path}__isnull": False})
+        return Q(**{f"{path}__lt": value})
+    if value is None:
+        return None
+    q = Q(**{f"{path}__gt": value})
+    if nullable:
+        q |= Q(**{f"{path}__isnull": True})
+    return q
+
+
+def keyset_filter(keys: List[OrderingKey], values: List[Any]) -> Q:
+    q = Q(pk__in=[])
+    equal = Q()
+    for (path, descending, nullable), value in zip(keys, values):
+        after = _after(path, descending, nullable, value)
+        if after is not None:
+            q |= equal & after
+        if value is None:
+            equal &= Q(**{f"{path}__isnull": True})
+        else:
+            equal &= Q(**{path: value})
+    return q
+
+
+def encode_cursor(keys: List[OrderingKey], values: List[Any]) -> str:
+    data = json_dump({"k": [path for path, _, _ in keys], "v": values})
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(keys: List[OrderingKey], cursor: str) -> List[Any]:
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["k"] != [path for path, _, _ in keys] or len(data["v"]) != len(keys):
+            raise ValueError
+        return data["v"]
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise ValidationError(
+            {"cursor": ["Ugyldig cursor, eller cursor fra en anden sortering"]}
+        )
+
+
+class CursorPagination(PaginationBase):
+    class Input(Schema):
+        limit: int = Field(settings.PAGINATION_PER_PAGE, ge=1)
+        offset: int = Field(0, ge=0)
+        cursor: Optional[str] = None
+        count: Literal["exact", "auto", "none"] = "exact"
+
+    class Output(Schema):
+        count: Optional[int] = None
+        count_estimated: bool = False
+        next: Optional[str] = None
+        items: List[Any]
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        pagination: Input,
+        **params: Any,
+    ) -> Any:
+        limit = min(pagination.limit, settings.PAGINATION_MAX_LIMIT)
+        offset = pagination.offset
+        if not isinstance(queryset, QuerySet):
+            # Lister kan kun pagineres med offset
+            return {
+                "items": queryset[offset : offset + limit],
+                "count": len(queryset),
+                "count_estimated": False,
+                "next": None,
+            }
+
+        keys = ordering_keys(queryset)
+        paths = [path for path, _, _ in keys]
+        queryset = queryset.order_by(
+            *[("-" if descending else "") + path for path, descending, _ in keys]
+        )
+        count = None
+        estimated = False
+        if pagination.cursor:
+            values = decode_cursor(keys, pagination.cursor)
+            queryset = queryset.filter(keyset_filter(keys, values))
+            offset = 0
+        elif pagination.count != "none":
+            count, estimated = count_items(queryset, pagination.count)
+
+        # Sorteringsværdierne hentes med i samme forespørgsel, til næste cursor
+        page = queryset.annotate(
+            **{f"cursor_{index}": F(path) for index, path in enumerate(paths)}
+        )[offset : offset + limit + 1]
+        items = list(page)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            try:
+                if isinstance(last, dict):
+                    # values()-querysets (se project/fastpath.py)
+                    values = [last[f"cursor_{index}"] for index in range(len(paths))]
+                else:
+                    values = [
+                        getattr(last, f"cursor_{index}") for index in range(len(paths))
+                    ]
+            except AttributeError:
+                # Historik-querysets (as_of) giver modelinstanser uden annoteringer
+                values = list(page.values_list(*paths)[limit - 1])
+            next_cursor = encode_cursor(keys, values)
+        return {
+            "items": items,
+            "count": count,
+            "count_estimated": estimated,
+            "next": next_cursor,
+        }
@@ -15,6 +15,7 @@ include(
     "staticfiles.py",
     "logging.py",
     "upload.py",
+    "cache.py",
     "payment.py",
     "eboks.py",
 )
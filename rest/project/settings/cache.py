@@ -0,0 +1,33 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+import os
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Autentificerede brugere og deres rettigheder, se common/auth_cache.py
+    "auth": {
+        "BACKEND": os.environ.get(
+            "AUTH_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("AUTH_CACHE_LOCATION", "auth"),
+        "TIMEOUT": int(os.environ.get("AUTH_CACHE_TIMEOUT", 60)),
+    },
+    # Svar fra referencedata-endpoints, se common/referencedata.py
+    "referencedata": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "referencedata",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    },
+    # Optællinger af lister, se project/counting.py
+    "counts": {
+        "BACKEND": os.environ.get(
+            "COUNT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("COUNT_CACHE_LOCATION", "counts"),
+        "TIMEOUT": int(os.environ.get("COUNT_CACHE_TIMEOUT", 30)),
+    },
+}
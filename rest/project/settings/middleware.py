@@ -12,4 +12,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "simple_history.middleware.HistoryRequestMiddleware",
     "django_otp.middleware.OTPMiddleware",
+    "project.middleware.MultipartPayloadMiddleware",
+    # Skal stå før ConditionalGetMiddleware, så versionen også sendes med 304
+    "project.middleware.ReferencedataMiddleware",
+    "project.middleware.ConditionalGetMiddleware",
 ]
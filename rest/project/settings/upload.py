@@ -3,3 +3,13 @@
 # SPDX-License-Identifier: MPL-2.0
 MEDIA_ROOT = "/upload/"
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024
+
+STORAGES = {
+    # Uploadede filer gemmes én gang pr. indhold (se common.storage)
+    "default": {
+        "BACKEND": "common.storage.DokumentStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
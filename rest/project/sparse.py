@@ -0,0 +1,225 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import types
+from copy import copy
+from functools import lru_cache, wraps
+from typing import (
+    ClassVar,
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+)
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Model, QuerySet
+from django.http import HttpResponse
+from django.http.response import HttpResponseBase
+from ninja import Schema
+from project.eager import _is_multivalued, _nested_schema, _relation, eager_load
+from project.util import json_dump
+from pydantic import BaseModel
+
+# Udvalgte felter ("sparse fieldsets") på list-endpoints.
+#
+# Med `fields` begrænses hvert item til de felter klienten viser, fx
+# `?fields=id,status,afsender__navn`. Stierne følger output-skemaet, og felter
+# i nestede skemaer angives med "__". Et nestet skema uden underfelter, fx
+# `afsender`, medtages helt.
+#
+# Kun de udvalgte felter serialiseres, og rækkerne hentes med only(), så kun
+# de tilsvarende kolonner læses. Kolonnerne som en resolver læser, kan skemaet
+# ikke se; de erklæres på skemaet med stier relative til skemaets model:
+#
+# class FooOut(ModelSchema):
+#     sparse_columns: ClassVar[Dict[str, Tuple[str, ...]]] = {"bar": ("baz",)}
+#
+# Indgår en resolver uden erklærede kolonner, hentes alle kolonner som før.
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if fields is None:
+        return None
+    paths = tuple(sorted({path.strip() for path in fields.split(",")} - {""}))
+    return paths or None
+
+
+def _replace(annotation, old: Type[BaseModel], new: Type[BaseModel]):
+    # Erstat et nestet skema inde i Optional[...], List[...] osv.
+    if annotation is old:
+        return new
+    args = get_args(annotation)
+    if not args:
+        return annotation
+    args = tuple(_replace(arg, old, new) for arg in args)
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        return Union[args]
+    # List[X] har origin list, og list[X] svarer til List[X]
+    return origin[args]
+
+
+def _build(schema: Type[BaseModel], tree: Dict[str, dict], prefix: str) -> Type[Schema]:
+    annotations: Dict[str, object] = {}
+    namespace: Dict[str, object] = {
+        "__module__": schema.__module__,
+        "__annotations__": annotations,
+    }
+    resolvers = False
+    # Nestede skemaer kan være rene pydantic-modeller uden resolvers
+    ninja_resolvers = getattr(schema, "_ninja_resolvers", {})
+    for name, subtree in tree.items():
+        field = schema.model_fields.get(name)
+        if field is None:
+            raise ValidationError(
+                {"fields": [f"Ukendt felt '{prefix}{name}'"]}, code="invalid"
+            )
+        annotation = field.annotation
+        if subtree:
+            nested = _nested_schema(annotation)
+            if nested is None:
+                raise ValidationError(
+                    {"fields": [f"Feltet '{prefix}{name}' har ingen underfelter"]},
+                    code="invalid",
+                )
+            annotation = _replace(
+                annotation, nested, _build(nested, subtree, f"{prefix}{name}__")
+            )
+        annotations[name] = annotation
+        namespace[name] = copy(field)
+        if name in ninja_resolvers:
+            namespace[f"resolve_{name}"] = staticmethod(
+                getattr(schema, f"resolve_{name}")
+            )
+            resolvers = True
+    if resolvers:
+        # Relationerne som skemaets resolvers læser (se project/eager.py)
+        for attr in ("eager_relations", "sparse_columns"):
+            if hasattr(schema, attr):
+                annotations[attr] = ClassVar
+                namespace[attr] = getattr(schema, attr)
+    return type(f"{schema.__name__}Sparse", (Schema,), namespace)
+
+
+@lru_cache(maxsize=256)
+def sparse_schema(schema: Type[Schema], paths: Tuple[str, ...]) -> Type[Schema]:
+    """
+    Et skema med kun de udvalgte felter fra `schema`
+    """
+    tree: Dict[str, dict] = {}
+    for path in paths:
+        node = tree
+        for name in path.split("__"):
+            node = node.setdefault(name, {})
+    return _build(schema, tree, "")
+
+
+def _add_column(model: Type[Model], prefix: str, path: str, columns: Set[str]):
+    for name in path.split("__"):
+        relation = _relation(model, name)
+        if relation is not None and _is_multivalued(relation):
+            # Hentes med prefetch_related i sin egen forespørgsel
+            return
+        columns.add(prefix + name)
+        if relation is None:
+            return
+        model = relation.related_model
+        prefix += name + "__"
+
+
+def _columns(
+    model: Type[Model], schema: Type[BaseModel], prefix: str, columns: Set[str]
+) -> bool:
+    declared = getattr(schema, "sparse_columns", {})
+    ninja_resolvers = getattr(schema, "_ninja_resolvers", {})
+    for name, field in schema.model_fields.items():
+        if name in ninja_resolvers:
+            if name not in declared:
+                return False
+            for path in declared[name]:
+                _add_column(model, prefix, path, columns)
+            continue
+        attname = field.alias or name
+        try:
+            model_field = model._meta.get_field(attname)
+        except FieldDoesNotExist:
+            relation = _relation(model, attname)
+            if relation is not None and _is_multivalued(relation):
+                continue
+            # Fx en annotering eller property; kolonnerne er ukendte
+            return False
+        if _is_multivalued(model_field):
+            continue
+        if not model_field.concrete:
+            return False
+        columns.add(prefix + attname)
+        nested = _nested_schema(field.annotation)
+        related = model_field.related_model
+        if nested is not None and isinstance(related, type):
+            if not _columns(related, nested, f"{prefix}{attname}__", columns):
+                return False
+    return True
+
+
+@lru_cache(maxsize=256)
+def only_plan(model: Type[Model], schema: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """
+    Kolonnerne der skal hentes for at serialisere `model` med `schema`,
+    eller None hvis de ikke kan afgøres
+    """
+    columns: Set[str] = set()
+    if not _columns(model, schema, "", columns):
+        return None
+    return tuple(sorted(columns))
+
+
+def load_fields(qs: QuerySet, schema: Type[Schema], fields: Optional[str]) -> QuerySet:
+    """
+    Eager loading til `schema`, begrænset til de udvalgte felter
+    """
+    paths = parse_fields(fields)
+    if paths is None:
+        return eager_load(qs, schema)
+    schema = sparse_schema(schema, paths)
+    qs = eager_load(qs, schema)
+    model: Type[Model] = qs.model
+    columns = only_plan(model, schema)
+    if columns is not None:
+        qs = qs.only(*columns)
+    return qs
+
+
+def sparse(schema: Type[Schema]):
+    """
+    Dekoratør til et pagineret list-endpoint med parameteren `fields`, hvis
+    items serialiseres med `schema`. Placeres under @route og over @paginate
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            paths = parse_fields(kwargs.get("fields"))
+            result = func(self, *args, **kwargs)
+            if paths is None or isinstance(result, HttpResponseBase):
+                return result
+            item_schema = sparse_schema(schema, paths)
+            data = {
+                **result,
+                "items": [
+                    item_schema.model_validate(item).model_dump(exclude_unset=True)
+                    for item in result["items"]
+                ],
+            }
+            return HttpResponse(
+                json_dump(data), content_type="application/json; charset=utf-8"
+            )
+
+        return wrapper
+
+    return decorator
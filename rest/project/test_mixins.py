@@ -953,6 +953,16 @@ class RestTestMixin(RestMixin):
         expected_object_data.update(
             {"id": id, **self.strip_id(self.update_object_data)}
         )
+        if "version" in expected_object_data:
+            # Versionstæller og tidsstempel opdateres ved hver gemning
+            self.assertGreater(
+                item_dict["sidste_ændringsdato"],
+                expected_object_data["sidste_ændringsdato"],
+            )
+            expected_object_data["version"] += 1
+            expected_object_data["sidste_ændringsdato"] = item_dict[
+                "sidste_ændringsdato"
+            ]
         self.compare_dicts(
             item_dict,
             expected_object_data,
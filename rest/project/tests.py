@@ -2,10 +2,22 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 
+from datetime import UTC, datetime, timedelta
 from unittest import TestCase
 
+from anmeldelse.models import Varelinje
+from django.contrib.auth.models import Permission, User
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase as DjangoTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from project.counting import count
+from project.pagination import encode_cursor, ordering_keys
 from project.util import json_dump, strtobool
+from sats.models import Afgiftstabel
 
 
 class UtilTest(TestCase):
@@ -33,3 +45,151 @@ class UtilTest(TestCase):
         for value in ("j", "ja", "nej", "null", "None", "yep", "hephey", "2"):
             with self.assertRaises(ValueError):
                 strtobool(value)
+
+
+class CursorPaginationTest(DjangoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="pagination")
+        cls.user.set_password("testpassword")
+        cls.user.save()
+        cls.user.user_permissions.add(
+            Permission.objects.get(codename="view_afgiftstabel")
+        )
+        start = datetime(2024, 1, 1, tzinfo=UTC)
+        for i in range(25):
+            # Gentagne gyldig_fra og tomme gyldig_til, så sorteringen
+            # kun er entydig med primærnøglen
+            Afgiftstabel.objects.create(
+                gyldig_fra=start + timedelta(days=i // 3),
+                gyldig_til=(None if i % 4 == 0 else start + timedelta(days=40 - i)),
+                kladde=True,
+            )
+
+    def setUp(self):
+        response = self.client.post(
+            "/api/token/pair",
+            {"username": "pagination", "password": "testpassword"},
+            content_type="application/json",
+        )
+        self.token = response.json()["access"]
+
+    def get(self, **params):
+        return self.client.get(
+            reverse("api-1.0.0:afgiftstabel_list"),
+            params,
+            HTTP_AUTHORIZATION=f"Bearer {self.token}",
+        )
+
+    def traverse(self, limit, **params):
+        ids = []
+        response = self.get(limit=limit, **params).json()
+        self.assertEqual(response["count"], 25)
+        while True:
+            ids += [item["id"] for item in response["items"]]
+            if response["next"] is None:
+                return ids
+            response = self.get(limit=limit, cursor=response["next"], **params).json()
+            self.assertIsNone(response["count"])
+
+    def test_cursor_matches_offset(self):
+        for params in (
+            {},
+            {"sort": "gyldig_til", "order": "asc"},
+            {"sort": "gyldig_til", "order": "desc"},
+            {"sort": "gyldig_fra", "order": "asc"},
+        ):
+            with self.subTest(params=params):
+                expected = [
+                    item["id"] for item in self.get(limit=25, **params).json()["items"]
+                ]
+                self.assertEqual(len(set(expected)), 25)
+                for limit in (1, 4, 7, 25):
+                    self.assertEqual(self.traverse(limit, **params), expected)
+
+    def test_offset(self):
+        everything = self.get(limit=25).json()
+        self.assertIsNone(everything["next"])
+        page = self.get(limit=5, offset=5).json()
+        self.assertEqual(page["count"], 25)
+        self.assertEqual(page["items"], everything["items"][5:10])
+        # En offset-side giver også en cursor til siden efter
+        page = self.get(limit=5, cursor=page["next"]).json()
+        self.assertEqual(page["items"], everything["items"][10:15])
+
+    def test_invalid_cursor(self):
+        for cursor in ("foo", "Zm9v", encode_cursor([("id", False, False)], [1])):
+            with self.subTest(cursor=cursor):
+                response = self.get(cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.json())
+        # Cursor fra en anden sortering
+        cursor = self.get(limit=2).json()["next"]
+        response = self.get(cursor=cursor, sort="gyldig_til", order="asc")
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_flat(self):
+        first = self.get(limit=3).json()
+        response = first
+        for i in range(5):
+            response = self.get(limit=3, cursor=response["next"]).json()
+        with CaptureQueriesContext(connection) as early:
+            self.get(limit=3, cursor=first["next"])
+        with CaptureQueriesContext(connection) as late:
+            self.get(limit=3, cursor=response["next"])
+        self.assertEqual(len(early.captured_queries), len(late.captured_queries))
+        self.assertNotIn(
+            "COUNT(", " ".join(query["sql"] for query in late.captured_queries)
+        )
+
+    def test_count_strategies(self):
+        caches["counts"].clear()
+        response = self.get(limit=5, count="none").json()
+        self.assertIsNone(response["count"])
+        self.assertIsNotNone(response["next"])
+        response = self.get(limit=5, count="auto").json()
+        self.assertEqual(response["count"], 25)
+        self.assertFalse(response["count_estimated"])
+        self.assertEqual(self.get(count="foo").status_code, 422)
+
+    @override_settings(PAGINATION_COUNT_EXACT_LIMIT=10)
+    def test_count_auto(self):
+        caches["counts"].clear()
+        qs = Afgiftstabel.objects.filter(kladde=True)
+        self.assertEqual(count(qs, "exact"), (25, False))
+        self.assertEqual(count(qs.filter(gyldig_til=None), "auto"), (7, False))
+        # Over grænsen bruges planlæggerens estimat
+        antal, estimated = count(qs, "auto")
+        self.assertTrue(estimated)
+        self.assertGreater(antal, 10)
+        # Optællingen gemmes, indtil tabellen ændres
+        with self.assertNumQueries(0):
+            self.assertEqual(count(qs, "auto"), (antal, True))
+        Afgiftstabel.objects.filter(gyldig_til=None).first().delete()
+        self.assertEqual(count(qs.filter(gyldig_til=None), "auto"), (6, False))
+
+    @override_settings(PAGINATION_COUNT_EXACT_LIMIT=10)
+    def test_count_auto_unfiltered(self):
+        caches["counts"].clear()
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Afgiftstabel._meta.db_table}")
+        # En ufiltreret liste tælles ikke; tabellens estimat bruges
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(count(Afgiftstabel.objects.all(), "auto"), (25, True))
+        self.assertNotIn(
+            "COUNT(", " ".join(query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_ordering_keys(self):
+        # Sortering på en relation følger den relaterede models sortering
+        self.assertEqual(
+            ordering_keys(Varelinje.objects.all()),
+            [
+                ("vareafgiftssats__afgiftsgruppenummer", False, True),
+                ("pk", False, False),
+            ],
+        )
+        self.assertEqual(
+            ordering_keys(Afgiftstabel.objects.order_by("-id")),
+            [("id", True, False)],
+        )
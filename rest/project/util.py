@@ -3,13 +3,16 @@
 # SPDX-License-Identifier: MPL-2.0
 
 import base64
+from datetime import datetime
 from decimal import Decimal
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 
 import orjson
 from django.core.exceptions import ValidationError
 from django.core.files import File
-from django.http import HttpRequest
+from django.db.models.fields.files import FieldFile
+from django.http import HttpRequest, HttpResponse
+from django.utils.http import http_date
 from ninja.renderers import BaseRenderer
 from ninja_extra import ControllerBase, permissions
 
@@ -21,7 +24,12 @@ class ORJSONRenderer(BaseRenderer):
     def default(o):
         if type(o) is Decimal:
             return str(o)
+        if isinstance(o, FieldFile):
+            # Gemte filer indlejres ikke, men hentes fra deres eget endpoint
+            # (se project/files.py)
+            return o.url if o else None
         if isinstance(o, File):
+            # Filer i request-data sendes som base64
             with o.open("rb") as file:
                 return base64.b64encode(file.read()).decode("utf-8")
         if isinstance(o, ValidationError):
@@ -61,6 +69,39 @@ class RestPermission(permissions.BasePermission):
         return request.user.has_perm(f"{self.appname}.{operation}_{self.modelname}")
 
 
+def if_match(request: HttpRequest, version: int) -> bool:
+    """
+    Evaluerer en evt. If-Match-header mod en rækkes versionstæller.
+    ETag for en række er versionen i anførselstegn, fx "3".
+    Svage ETags (W/"3") matcher aldrig, jf. RFC 9110 13.1.1
+    """
+    header = request.headers.get("If-Match")
+    if header is None:
+        return True
+    for etag in header.split(","):
+        etag = etag.strip()
+        if etag == "*" or etag == f'"{version}"':
+            return True
+    return False
+
+
+def last_modified(response: HttpResponse, tidspunkt: Optional[datetime]) -> None:
+    """
+    Sætter Last-Modified ud fra en rækkes sidste_ændringsdato. Kun informativ;
+    betingede requests valideres med ETag (se ConditionalGetMiddleware)
+    """
+    if tidspunkt is not None:
+        response.headers["Last-Modified"] = http_date(tidspunkt.timestamp())
+
+
+def precondition_failed() -> HttpResponse:
+    return HttpResponse(
+        json_dump({"__all__": ["Objektet er blevet ændret siden det blev indlæst"]}),
+        status=412,
+        content_type="application/json",
+    )
+
+
 # Copied from core python because its containing module `distutils` is deprecated.
 def strtobool(val):
     val = val.lower()
@@ -4,16 +4,17 @@
 # mypy: disable-error-code="call-arg, attr-defined"
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Annotated, List, Optional
 
 from common.api import get_auth_methods
+from common.referencedata import referencedata
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from ninja import FilterSchema, ModelSchema, Query
+from ninja import Field, FilterSchema, ModelSchema, Query
 from ninja_extra import api_controller, permissions, route
 from ninja_extra.exceptions import PermissionDenied
 from ninja_extra.pagination import paginate
-from ninja_extra.schemas import NinjaPaginationResponseSchema
+from project.pagination import CursorPagination, CursorPaginationResponseSchema
 from project.util import RestPermission
 from sats import models
 from sats.models import Afgiftstabel, Vareafgiftssats
@@ -100,16 +101,18 @@ class AfgiftstabelAPI:
         auth=get_auth_methods(),
         url_name="afgiftstabel_get",
     )
+    @referencedata
     def get_afgiftstabel(self, id: int):
         return get_object_or_404(Afgiftstabel, id=id)
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[AfgiftstabelOut],
+        response=CursorPaginationResponseSchema[AfgiftstabelOut],
         auth=get_auth_methods(),
         url_name="afgiftstabel_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @referencedata
+    @paginate(CursorPagination)
     def list_afgiftstabeller(
         self,
         filters: AfgiftstabelFilterSchema = Query(...),
@@ -121,7 +124,7 @@ class AfgiftstabelAPI:
         order_by = self.map_sort(sort, order)
         if order_by:
             qs = qs.order_by(order_by, "id")
-        return list(qs)
+        return qs
         """
         return list(Afgiftstabel.objects.filter(
             filters.get_filter_expression() & Q("mere filtrering fra vores side")
@@ -235,6 +238,7 @@ class VareafgiftssatsOut(ModelSchema):
 
 
 class VareafgiftssatsFilterSchema(FilterSchema):
+    id: Annotated[Optional[List[int]], Field(None, q="id__in")]
     afgiftstabel: Optional[int] = None
     vareart_da: Optional[str] = None
     vareart_kl: Optional[str] = None
@@ -246,6 +250,7 @@ class VareafgiftssatsFilterSchema(FilterSchema):
     har_privat_tillægsafgift_alkohol: Optional[bool] = None
     minimumsbeløb: Optional[Decimal] = None
     overordnet: Optional[int] = None
+    overordnet__in: Annotated[Optional[List[int]], Field(None, q="overordnet_id__in")]
     segment_nedre: Optional[Decimal] = None
     segment_øvre: Optional[Decimal] = None
     synlig_privat: Optional[bool] = None
@@ -273,19 +278,21 @@ class VareafgiftssatsAPI:
         auth=get_auth_methods(),
         url_name="vareafgiftssats_get",
     )
+    @referencedata
     def get_vareafgiftssats(self, id: int):
         return get_object_or_404(Vareafgiftssats, id=id)
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[VareafgiftssatsOut],
+        response=CursorPaginationResponseSchema[VareafgiftssatsOut],
         auth=get_auth_methods(),
         url_name="vareafgiftssats_list",
     )
-    @paginate()  # https://eadwincode.github.io/django-ninja-extra/tutorial/pagination/
+    @referencedata
+    @paginate(CursorPagination)
     def list_vareafgiftssatser(self, filters: VareafgiftssatsFilterSchema = Query(...)):
         # https://django-ninja.rest-framework.com/guides/input/filtering/
-        return list(filters.filter(Vareafgiftssats.objects.all()))
+        return filters.filter(Vareafgiftssats.objects.all())
         """
         return list(Vareafgiftssats.objects.filter(
             filters.get_filter_expression() & Q("mere filtrering fra vores side")
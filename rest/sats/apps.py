@@ -7,3 +7,7 @@ from django.apps import AppConfig
 
 class SatsConfig(AppConfig):
     name = "sats"
+
+    def ready(self):
+        # Registrerer invalideringen af de kompilerede afgiftstabeller
+        import sats.satstabel  # noqa: F401
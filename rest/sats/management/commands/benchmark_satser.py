@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import random
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from sats.models import Afgiftstabel, Vareafgiftssats
+from sats.satstabel import beregn_afgift, invalider, satstabeller
+
+
+class Command(BaseCommand):
+    help = (
+        "Måler afgiftsberegning for et antal varelinjer, med databaseopslag "
+        "pr. linje og med de kompilerede afgiftstabeller"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linjer", type=int, default=10000)
+        parser.add_argument("--satser", type=int, default=200)
+
+    def handle(self, *args, **options):
+        # Testtabellen rulles tilbage når målingen er færdig
+        with transaction.atomic():
+            self.benchmark(options["linjer"], options["satser"])
+            transaction.set_rollback(True)
+
+    def opret_satser(self, antal: int):
+        tabel = Afgiftstabel.objects.create(
+            gyldig_fra=datetime(2000, 1, 1, tzinfo=timezone.utc), kladde=False
+        )
+        enheder = ["kg", "l", "ant", "pct"]
+        satser = []
+        for nummer in range(1, antal + 1):
+            enhed = "sam" if nummer % 5 == 0 else enheder[nummer % len(enheder)]
+            sats = Vareafgiftssats.objects.create(
+                afgiftstabel=tabel,
+                vareart_da=f"Benchmark {nummer}",
+                vareart_kl=f"Benchmark {nummer}",
+                afgiftsgruppenummer=900000 + nummer,
+                enhed=enhed,
+                afgiftssats=Decimal(nummer) / 10,
+            )
+            if enhed == "sam":
+                for index, underenhed in enumerate(("ant", "pct")):
+                    Vareafgiftssats.objects.create(
+                        afgiftstabel=tabel,
+                        vareart_da=f"Benchmark {nummer}.{index}",
+                        vareart_kl=f"Benchmark {nummer}.{index}",
+                        afgiftsgruppenummer=(900000 + nummer) * 10 + index,
+                        enhed=underenhed,
+                        afgiftssats=Decimal(index + 1),
+                        overordnet=sats,
+                        segment_nedre=Decimal(100) if underenhed == "pct" else None,
+                    )
+            satser.append(sats.id)
+        return satser
+
+    def benchmark(self, linjer: int, antal_satser: int):
+        satser = self.opret_satser(antal_satser)
+        rnd = random.Random(1234)
+        varelinjer = [
+            SimpleNamespace(
+                vareafgiftssats_id=rnd.choice(satser),
+                mængde=Decimal(rnd.randint(1, 1000)),
+                antal=rnd.randint(1, 100),
+                fakturabeløb=Decimal(rnd.randint(1, 100000)),
+            )
+            for i in range(linjer)
+        ]
+
+        def fra_databasen(linje):
+            # Som før: satsen og dens underordnede slås op pr. varelinje
+            sats = Vareafgiftssats.objects.get(id=linje.vareafgiftssats_id)
+            return beregn_afgift(sats, linje, sats.underordnede.all())
+
+        def kompileret(linje):
+            return satstabeller().sats(linje.vareafgiftssats_id).beregn_afgift(linje)
+
+        resultater = {}
+        for navn, beregn, kold in (
+            ("databaseopslag", fra_databasen, False),
+            ("kompileret, kold", kompileret, True),
+            ("kompileret, varm", kompileret, False),
+        ):
+            if kold:
+                invalider()
+            forespørgsler: List[str] = []
+
+            def tæl(execute, sql, params, many, context):
+                forespørgsler.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(tæl):
+                start = time.perf_counter()
+                resultater[navn] = [beregn(linje) for linje in varelinjer]
+                duration = time.perf_counter() - start
+            self.stdout.write(
+                f"{navn:18}{duration * 1000:10.1f} ms"
+                f"{duration / linjer * 1e6:10.1f} µs/linje"
+                f"{len(forespørgsler):8} forespørgsler"
+            )
+        if len({tuple(afgifter) for afgifter in resultater.values()}) != 1:
+            raise AssertionError("Beregningerne giver forskellige afgifter")
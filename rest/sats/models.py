@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 from decimal import Decimal
+from typing import Iterable
 
 from django.db import models
 from django.db.models import CheckConstraint, Q
@@ -202,30 +203,14 @@ class Vareafgiftssats(models.Model):
     _quantization_source = Decimal("0.01")
 
     def beregn_afgift(self, varelinje) -> Decimal:
-        if self.enhed in (
-            Vareafgiftssats.Enhed.KILOGRAM,
-            Vareafgiftssats.Enhed.LITER,
-        ):
-            return (varelinje.mængde * self.afgiftssats).quantize(
-                Vareafgiftssats._quantization_source
-            )
-        if self.enhed in (Vareafgiftssats.Enhed.ANTAL,):
-            return (varelinje.antal * self.afgiftssats).quantize(
-                Vareafgiftssats._quantization_source
-            )
-        if self.enhed == Vareafgiftssats.Enhed.PROCENT:
-            fakturabeløb: Decimal = varelinje.fakturabeløb
-            if self.segment_øvre:
-                fakturabeløb = fakturabeløb.min(self.segment_øvre)
-            if self.segment_nedre:
-                fakturabeløb = Decimal(fakturabeløb - self.segment_nedre).max(0)
-            return (fakturabeløb * Decimal(0.01) * self.afgiftssats).quantize(
-                Vareafgiftssats._quantization_source
-            )
-        if self.enhed == Vareafgiftssats.Enhed.SAMMENSAT:
-            afgifter: list[Decimal] = [
-                subsats.beregn_afgift(varelinje) for subsats in self.underordnede.all()
-            ]
+        from sats.satstabel import beregn_afgift, satstabeller
 
-            return Decimal(sum(afgifter))
-        raise AttributeError("Invalid unit")
+        underordnede: Iterable = ()
+        if self.enhed == Vareafgiftssats.Enhed.SAMMENSAT:
+            # Gemte satser beregnes med de kompilerede underordnede satser
+            underordnede = (
+                satstabeller().sats(self.pk).underordnede
+                if self.pk
+                else self.underordnede.all()
+            )
+        return beregn_afgift(self, varelinje, underordnede)
@@ -0,0 +1,282 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from sats.models import Afgiftstabel, Vareafgiftssats
+
+# Afgiftstabellerne kompileret til opslag i hukommelsen.
+#
+# Alle tabeller og satser indlæses på én gang (to forespørgsler), hvorefter
+# afgiftsberegning, også for sammensatte satser, og opslag af afgiftsgruppenumre
+# pr. dato sker uden databasen. Gyldighedsperioderne ligger i et sorteret indeks,
+# så tabellen for en dato findes ved binær søgning.
+#
+# Den kompilerede udgave hører til referencedatas version (se
+# common.referencedata), som ligger i databasen og tælles op i samme transaktion
+# når en Afgiftstabel eller Vareafgiftssats gemmes eller slettes. Er versionen
+# ændret, kompileres tabellerne igen ved næste opslag; andre processer ser
+# ændringen inden for referencedata.MAX_ALDER sekunder.
+#
+# Ændringer i en transaktion der endnu ikke er afsluttet, ses kun af den tråd der
+# laver dem: tråden får sin egen kompilerede udgave indtil transaktionen (eller
+# savepointet) er afsluttet, så en rullet-tilbage ændring aldrig deles.
+
+
+@dataclass(frozen=True)
+class KompileretSats:
+    id: int
+    afgiftstabel_id: int
+    afgiftsgruppenummer: int
+    enhed: str
+    afgiftssats: Decimal
+    segment_nedre: Optional[Decimal]
+    segment_øvre: Optional[Decimal]
+    overordnet_id: Optional[int]
+    underordnede: Tuple[KompileretSats, ...] = ()
+
+    def beregn_afgift(self, varelinje) -> Decimal:
+        return beregn_afgift(self, varelinje, self.underordnede)
+
+
+def beregn_afgift(sats, varelinje, underordnede) -> Decimal:
+    """
+    Afgiften for en varelinje efter en sats; `sats` kan være en Vareafgiftssats
+    eller en KompileretSats, og `underordnede` er satsens underordnede satser
+    """
+    quantize = Vareafgiftssats._quantization_source
+    if sats.enhed in (
+        Vareafgiftssats.Enhed.KILOGRAM,
+        Vareafgiftssats.Enhed.LITER,
+    ):
+        return (varelinje.mængde * sats.afgiftssats).quantize(quantize)
+    if sats.enhed in (Vareafgiftssats.Enhed.ANTAL,):
+        return (varelinje.antal * sats.afgiftssats).quantize(quantize)
+    if sats.enhed == Vareafgiftssats.Enhed.PROCENT:
+        fakturabeløb: Decimal = varelinje.fakturabeløb
+        if sats.segment_øvre:
+            fakturabeløb = fakturabeløb.min(sats.segment_øvre)
+        if sats.segment_nedre:
+            fakturabeløb = Decimal(fakturabeløb - sats.segment_nedre).max(0)
+        return (fakturabeløb * Decimal(0.01) * sats.afgiftssats).quantize(quantize)
+    if sats.enhed == Vareafgiftssats.Enhed.SAMMENSAT:
+        afgifter: List[Decimal] = [
+            subsats.beregn_afgift(varelinje) for subsats in underordnede
+        ]
+        return Decimal(sum(afgifter))
+    raise AttributeError("Invalid unit")
+
+
+@dataclass(frozen=True)
+class KompileretTabel:
+    id: int
+    gyldig_fra: Optional[datetime]
+    gyldig_til: Optional[datetime]
+    kladde: bool
+    satser_pr_kode: Dict[int, KompileretSats]
+
+    def sats_for_kode(self, afgiftsgruppenummer: int) -> Optional[KompileretSats]:
+        return self.satser_pr_kode.get(afgiftsgruppenummer)
+
+
+class Satstabeller:
+    def __init__(self, version: int):
+        self.version = version
+        felter = [
+            "id",
+            "afgiftstabel_id",
+            "afgiftsgruppenummer",
+            "enhed",
+            "afgiftssats",
+            "segment_nedre",
+            "segment_øvre",
+            "overordnet_id",
+        ]
+        rækker = list(Vareafgiftssats.objects.order_by("id").values(*felter))
+        børn: Dict[int, List[int]] = {}
+        for række in rækker:
+            if række["overordnet_id"] is not None:
+                børn.setdefault(række["overordnet_id"], []).append(række["id"])
+        rækker_pr_id = {række["id"]: række for række in rækker}
+
+        self.satser: Dict[int, KompileretSats] = {}
+
+        def kompilér(id: int, sti: Set[int]) -> KompileretSats:
+            if id not in self.satser:
+                if id in sti:
+                    raise ValueError(f"Vareafgiftssats {id} er sin egen overordnede")
+                self.satser[id] = KompileretSats(
+                    **rækker_pr_id[id],
+                    underordnede=tuple(
+                        kompilér(barn, sti | {id}) for barn in børn.get(id, ())
+                    ),
+                )
+            return self.satser[id]
+
+        for id in rækker_pr_id:
+            kompilér(id, set())
+
+        satser_pr_tabel: Dict[int, Dict[int, KompileretSats]] = {}
+        for sats in self.satser.values():
+            # Som ved Vareafgiftssats.objects.get(afgiftsgruppenummer=...)
+            # forventes numrene at være entydige i en tabel
+            satser_pr_tabel.setdefault(sats.afgiftstabel_id, {})[
+                sats.afgiftsgruppenummer
+            ] = sats
+
+        self.tabeller: Dict[int, KompileretTabel] = {
+            tabel["id"]: KompileretTabel(
+                **tabel, satser_pr_kode=satser_pr_tabel.get(tabel["id"], {})
+            )
+            for tabel in Afgiftstabel.objects.values(
+                "id", "gyldig_fra", "gyldig_til", "kladde"
+            )
+        }
+        # Intervalindeks over de gældende tabeller, sorteret efter gyldig_fra
+        gældende = sorted(
+            (
+                (tabel.gyldig_fra, tabel.id, tabel)
+                for tabel in self.tabeller.values()
+                if not tabel.kladde and tabel.gyldig_fra is not None
+            ),
+            key=lambda række: række[:2],
+        )
+        self._gældende = [tabel for _, _, tabel in gældende]
+        self._gyldig_fra: List[datetime] = [fra for fra, _, _ in gældende]
+
+    def sats(self, id: int) -> KompileretSats:
+        try:
+            return self.satser[id]
+        except KeyError:
+            raise Vareafgiftssats.DoesNotExist(f"Vareafgiftssats {id} findes ikke")
+
+    def sats_i_tabel(
+        self, afgiftstabel_id: int, afgiftsgruppenummer: int
+    ) -> KompileretSats:
+        tabel = self.tabeller.get(afgiftstabel_id)
+        sats = tabel.sats_for_kode(afgiftsgruppenummer) if tabel is not None else None
+        if sats is None:
+            raise Vareafgiftssats.DoesNotExist(
+                f"Vareafgiftssats {afgiftsgruppenummer} findes ikke "
+                f"i afgiftstabel {afgiftstabel_id}"
+            )
+        return sats
+
+    def tabel_for_dato(self, dato: datetime) -> Optional[KompileretTabel]:
+        """
+        Den gældende (ikke-kladde) tabel på tidspunktet `dato`
+        """
+        index = bisect_right(self._gyldig_fra, dato) - 1
+        if index < 0:
+            return None
+        tabel = self._gældende[index]
+        if tabel.gyldig_til is not None and tabel.gyldig_til < dato:
+            return None
+        return tabel
+
+    def sats_for_kode(
+        self, afgiftsgruppenummer: int, dato: datetime
+    ) -> Optional[KompileretSats]:
+        tabel = self.tabel_for_dato(dato)
+        if tabel is None:
+            return None
+        return tabel.sats_for_kode(afgiftsgruppenummer)
+
+
+_lock = threading.Lock()
+_satstabeller: Optional[Satstabeller] = None
+_lokal = threading.local()
+
+
+def _lokal_ændring() -> None:
+    # Trådens egen udgave kompileres igen ved næste opslag
+    _lokal.version = getattr(_lokal, "version", 0) + 1
+
+
+def invalider() -> None:
+    """
+    Kompilér tabellerne igen i alle processer, fx efter QuerySet.update(),
+    som ikke sender signaler
+    """
+    from common import referencedata
+
+    referencedata.bump()
+    _lokal_ændring()
+
+
+def _transaktion() -> Optional[str]:
+    # Savepointet (eller transaktionen) som ændringer lige nu foretages i
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+    # atomic(savepoint=False) lægger None på stakken
+    savepoints = [sid for sid in connection.savepoint_ids if sid is not None]
+    return savepoints[-1] if savepoints else ""
+
+
+def _åbne_ændringer() -> Set[str]:
+    # Savepoints i denne tråd hvor tabellerne er ændret, og som stadig er åbne
+    åbne: Set[str] = getattr(_lokal, "ændringer", set())
+    if åbne:
+        connection = transaction.get_connection()
+        levende = set(connection.savepoint_ids)
+        if connection.in_atomic_block:
+            levende.add("")
+        if åbne - levende:
+            # Afsluttet eller rullet tilbage
+            _lokal_ændring()
+        åbne &= levende
+        _lokal.ændringer = åbne
+    return åbne
+
+
+def satstabeller() -> Satstabeller:
+    """
+    Den aktuelle kompilerede udgave af alle afgiftstabeller
+    """
+    from common import referencedata
+
+    global _satstabeller
+    version = None if _åbne_ændringer() else referencedata.version()
+    if version is None:
+        # Tråden har uafsluttede ændringer i referencedata
+        lokal = getattr(_lokal, "satstabeller", None)
+        version = getattr(_lokal, "version", 0)
+        if lokal is None or lokal.version != version:
+            lokal = _lokal.satstabeller = Satstabeller(version)
+        return lokal
+    _lokal.satstabeller = None
+    aktuel = _satstabeller
+    if aktuel is None or aktuel.version != version:
+        with _lock:
+            aktuel = _satstabeller
+            if aktuel is None or aktuel.version != version:
+                aktuel = _satstabeller = Satstabeller(version)
+    return aktuel
+
+
+@receiver(post_save, sender=Afgiftstabel, dispatch_uid="satstabel_afgiftstabel_gemt")
+@receiver(
+    post_delete, sender=Afgiftstabel, dispatch_uid="satstabel_afgiftstabel_slettet"
+)
+@receiver(post_save, sender=Vareafgiftssats, dispatch_uid="satstabel_sats_gemt")
+@receiver(post_delete, sender=Vareafgiftssats, dispatch_uid="satstabel_sats_slettet")
+def satser_ændret(sender, **kwargs):
+    # Versionen tælles op af common.referencedata
+    _lokal_ændring()
+    savepoint = _transaktion()
+    if savepoint is not None:
+        ændringer = getattr(_lokal, "ændringer", set())
+        ændringer.add(savepoint)
+        _lokal.ændringer = ændringer
@@ -4,15 +4,22 @@
 
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
+from types import SimpleNamespace
 from unittest.mock import patch
 
+from common import referencedata
+from common.models import ReferencedataVersion
 from django.contrib.auth.models import Permission, User
+from django.db import transaction
+from django.db.models import F
 from django.test import TestCase
 from django.urls import reverse
 from ninja_extra.exceptions import PermissionDenied
 from project.test_mixins import RestMixin, RestTestMixin
 from project.util import json_dump
+from sats import satstabel
 from sats.models import Afgiftstabel, Vareafgiftssats
+from sats.satstabel import invalider, satstabeller
 
 
 class AfgiftstabelTest(RestTestMixin, TestCase):
@@ -337,3 +344,174 @@ class SatsAPITests(TestCase):
         mock_get_object_or_404.assert_called_once_with(
             Afgiftstabel, id=self.test_afgiftstabel_1.id
         )
+
+    def test_list_vareafgiftssatser_filter_id_overordnet__in(self):
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="view_vareafgiftssats")
+        )
+
+        def opret(nummer, **data):
+            return Vareafgiftssats.objects.create(
+                **{
+                    "afgiftstabel": self.test_afgiftstabel_1,
+                    "vareart_da": f"Vare {nummer}",
+                    "vareart_kl": f"Vare {nummer}",
+                    "afgiftsgruppenummer": nummer,
+                    "enhed": Vareafgiftssats.Enhed.KILOGRAM,
+                    "afgiftssats": Decimal("1.00"),
+                    **data,
+                }
+            )
+
+        sammensat = opret(1, enhed=Vareafgiftssats.Enhed.SAMMENSAT)
+        subs = [opret(nummer, overordnet=sammensat) for nummer in (2, 3)]
+        andre = [opret(nummer) for nummer in (4, 5)]
+        endpoint = reverse("api-1.0.0:vareafgiftssats_list")
+
+        def ids(query):
+            resp = self.client.get(
+                f"{endpoint}?{query}",
+                HTTP_AUTHORIZATION=f"Bearer {self.user_token}",
+            )
+            self.assertEqual(resp.status_code, 200)
+            return sorted(item["id"] for item in resp.json()["items"])
+
+        self.assertEqual(
+            ids(f"id={sammensat.id}&id={andre[1].id}"),
+            sorted([sammensat.id, andre[1].id]),
+        )
+        self.assertEqual(
+            ids(f"overordnet__in={sammensat.id}&overordnet__in={andre[0].id}"),
+            [sub.id for sub in subs],
+        )
+
+
+class SatstabelTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tabel1 = Afgiftstabel.objects.create(
+            gyldig_fra=datetime(2022, 1, 1, tzinfo=timezone.utc), kladde=False
+        )
+        cls.tabel2 = Afgiftstabel.objects.create(
+            gyldig_fra=datetime(2023, 1, 1, tzinfo=timezone.utc), kladde=False
+        )
+        cls.kladde = Afgiftstabel.objects.create(
+            gyldig_fra=datetime(2024, 1, 1, tzinfo=timezone.utc), kladde=True
+        )
+        cls.sats1 = cls.opret_sats(cls.tabel1, 1, "kg", "2.00")
+        cls.sats2 = cls.opret_sats(cls.tabel2, 1, "kg", "3.00")
+        cls.sammensat = cls.opret_sats(cls.tabel2, 2, "sam", "0")
+        cls.opret_sats(cls.tabel2, 3, "ant", "5.00", overordnet=cls.sammensat)
+        cls.opret_sats(
+            cls.tabel2,
+            4,
+            "pct",
+            "10",
+            overordnet=cls.sammensat,
+            segment_nedre=Decimal(100),
+        )
+        cls.opret_sats(cls.kladde, 1, "kg", "4.00")
+
+    @staticmethod
+    def opret_sats(tabel, nummer, enhed, afgiftssats, **kwargs):
+        return Vareafgiftssats.objects.create(
+            afgiftstabel=tabel,
+            vareart_da=f"Vare {nummer}",
+            vareart_kl=f"Vare {nummer}",
+            afgiftsgruppenummer=nummer,
+            enhed=enhed,
+            afgiftssats=Decimal(afgiftssats),
+            **kwargs,
+        )
+
+    def test_beregn_afgift(self):
+        varelinje = SimpleNamespace(
+            mængde=Decimal(10), antal=2, fakturabeløb=Decimal(300)
+        )
+        tabeller = satstabeller()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                tabeller.sats(self.sats2.id).beregn_afgift(varelinje), Decimal("30.00")
+            )
+            # 2 * 5.00 + (300 - 100) * 10%
+            self.assertEqual(
+                tabeller.sats(self.sammensat.id).beregn_afgift(varelinje),
+                Decimal("30.00"),
+            )
+        for sats in (self.sats2, self.sammensat):
+            self.assertEqual(
+                tabeller.sats(sats.id).beregn_afgift(varelinje),
+                Vareafgiftssats.objects.get(id=sats.id).beregn_afgift(varelinje),
+            )
+        with self.assertRaises(Vareafgiftssats.DoesNotExist):
+            tabeller.sats(-1)
+
+    def test_sats_for_kode(self):
+        tabeller = satstabeller()
+        with self.assertNumQueries(0):
+            self.assertIsNone(
+                tabeller.sats_for_kode(1, datetime(2021, 6, 1, tzinfo=timezone.utc))
+            )
+            self.assertEqual(
+                tabeller.sats_for_kode(1, datetime(2022, 6, 1, tzinfo=timezone.utc)).id,
+                self.sats1.id,
+            )
+            # Kladden gælder ikke
+            self.assertEqual(
+                tabeller.sats_for_kode(1, datetime(2024, 6, 1, tzinfo=timezone.utc)).id,
+                self.sats2.id,
+            )
+            self.assertIsNone(
+                tabeller.sats_for_kode(2, datetime(2022, 6, 1, tzinfo=timezone.utc))
+            )
+        self.assertEqual(
+            tabeller.sats_i_tabel(self.tabel1.id, 1).id,
+            self.sats1.id,
+        )
+        with self.assertRaises(Vareafgiftssats.DoesNotExist):
+            tabeller.sats_i_tabel(self.tabel1.id, 2)
+
+    def test_gyldig_til(self):
+        # save() udregner selv gyldig_til ud fra de andre tabeller
+        Afgiftstabel.objects.filter(id=self.tabel2.id).update(
+            gyldig_til=datetime(2023, 6, 1, tzinfo=timezone.utc)
+        )
+        invalider()
+        self.assertIsNone(
+            satstabeller().sats_for_kode(1, datetime(2023, 7, 1, tzinfo=timezone.utc))
+        )
+
+    def test_invalidering(self):
+        tabeller = satstabeller()
+        self.assertIs(satstabeller(), tabeller)
+        self.sats2.afgiftssats = Decimal("7.00")
+        self.sats2.save()
+        self.assertEqual(satstabeller().sats(self.sats2.id).afgiftssats, Decimal(7))
+
+    def test_anden_proces(self):
+        # En ændring fra en anden proces ses når versionen i databasen skifter.
+        # Testens egne uafsluttede ændringer ignoreres
+        with patch.object(referencedata._tråd, "ændret", False), patch.object(
+            satstabel._lokal, "ændringer", set()
+        ):
+            tabeller = satstabeller()
+            self.assertIs(satstabeller(), tabeller)
+            Vareafgiftssats.objects.filter(id=self.sats2.id).update(
+                afgiftssats=Decimal("7.00")
+            )
+            ReferencedataVersion.objects.filter(pk=1).update(version=F("version") + 1)
+            referencedata._glem()
+            self.assertEqual(satstabeller().sats(self.sats2.id).afgiftssats, Decimal(7))
+
+    def test_rullet_tilbage(self):
+        try:
+            with transaction.atomic():
+                self.sats2.afgiftssats = Decimal("7.00")
+                self.sats2.save()
+                self.assertEqual(
+                    satstabeller().sats(self.sats2.id).afgiftssats, Decimal(7)
+                )
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(satstabeller().sats(self.sats2.id).afgiftssats, Decimal(3))
@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+# Samtidige kald til REST.
+#
+# Et view der skal bruge flere uafhængige ting fra REST (fx anmeldelsen, satser
+# og notater), kan hente dem samtidigt med `run` (se
+# HasRestClientMixin.prefetch), så siden venter på det langsomste kald i stedet
+# for summen af dem. Kaldene udføres af en trådpulje fælles for processen, med
+# højst REST_FANOUT_WORKERS (8) tråde; den bør ikke være større end
+# forbindelsespuljen til REST (se told_common.transport).
+#
+# Et kald der selv bruger `run` eller `submit`, udfører sine kald sekventielt i
+# sin egen tråd, så puljen ikke kan gå i stå med tråde der venter på hinanden.
+#
+# Hvert `run` logges (debug) med hvornår hvert kald startede og sluttede, målt
+# fra starten, sammen med den samlede tid og summen af kaldenes tider.
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_local = threading.local()
+
+
+def executor() -> ThreadPoolExecutor:
+    # Oprettes først ved brug, så gunicorns workers får hver deres
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "REST_FANOUT_WORKERS", 8),
+                thread_name_prefix="rest-fanout",
+            )
+        return _executor
+
+
+def _worker(function: Callable[..., Any], *args: Any) -> Any:
+    _local.worker = True
+    try:
+        return function(*args)
+    finally:
+        _local.worker = False
+
+
+def _call(
+    name: str,
+    function: Callable[[], Any],
+    start: float,
+    spans: Dict[str, Tuple[float, float]],
+) -> Any:
+    began = time.perf_counter()
+    try:
+        return _worker(function)
+    finally:
+        spans[name] = (began - start, time.perf_counter() - start)
+
+
+def submit(function: Callable[..., Any], *args: Any) -> Future:
+    """
+    Udfører kaldet i trådpuljen. I puljens egne tråde udføres det med det samme
+    """
+    if not getattr(_local, "worker", False):
+        return executor().submit(_worker, function, *args)
+    future: Future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def run(calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    Udfører kaldene samtidigt og returnerer deres resultater under samme navne.
+    Fejler et kald, afbrydes de der ikke er startet, og fejlen rejses
+    """
+    start = time.perf_counter()
+    spans: Dict[str, Tuple[float, float]] = {}
+    try:
+        if len(calls) < 2 or getattr(_local, "worker", False):
+            results: Dict[str, Any] = {}
+            for name, function in calls.items():
+                began = time.perf_counter()
+                try:
+                    results[name] = function()
+                finally:
+                    spans[name] = (began - start, time.perf_counter() - start)
+            return results
+        futures: Dict[str, Future] = {
+            name: executor().submit(_call, name, function, start, spans)
+            for name, function in calls.items()
+        }
+        done, pending = wait(futures.values(), return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        for future in futures.values():
+            if future in done and future.exception() is not None:
+                raise future.exception()  # type: ignore
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(trace(spans, time.perf_counter() - start))
+
+
+def trace(spans: Dict[str, Tuple[float, float]], total: float) -> str:
+    parts: List[str] = [
+        f"{name} {began * 1000:.0f}-{ended * 1000:.0f}"
+        for name, (began, ended) in sorted(spans.items(), key=lambda item: item[1])
+    ]
+    sequential = sum(ended - began for began, ended in spans.values())
+    return (
+        f"{len(spans)} REST-kald på {total * 1000:.0f} ms "
+        f"(sekventielt {sequential * 1000:.0f} ms): {', '.join(parts)} ms"
+    )
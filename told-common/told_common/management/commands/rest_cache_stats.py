@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+from django.core.management.base import BaseCommand
+from told_common import transport
+from told_common.response_cache import response_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Viser hit rate og sparede bytes for cachen af svar fra REST, "
+        "og genbrug af forbindelser til REST"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nulstil", action="store_true", help="Nulstil tællerne bagefter"
+        )
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        self.stdout.write(
+            f"{stats['requests']:.0f} requests, {stats['hits']:.0f} hits (304), "
+            f"{stats['fresh']:.0f} hits uden request, "
+            f"{stats['misses']:.0f} misses, hit rate {stats['hit_rate']:.1%}, "
+            f"{stats['bytes_saved'] / 1024 / 1024:.1f} MB sparet"
+        )
+        stats = transport.adapter.stats()
+        self.stdout.write(
+            f"{stats['requests']:.0f} requests til REST, "
+            f"{stats['connections']:.0f} nye forbindelser, "
+            f"genbrug {stats['reuse_rate']:.1%}, {stats['errors']:.0f} fejl, "
+            f"højst {stats['peak']:.0f} samtidige i denne proces"
+        )
+        if options["nulstil"]:
+            response_cache.reset_stats()
+            transport.adapter.reset_stats()
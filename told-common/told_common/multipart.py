@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import mimetypes
+import uuid
+from typing import Dict, Iterator, List, Union
+
+from django.core.files import File
+
+# multipart/form-data til upload af filer til REST.
+#
+# requests bygger selv multipart-bodies i hukommelsen, så en fil på 20 MB
+# fylder mindst 20 MB ekstra pr. upload. MultipartStream streamer i stedet
+# filerne i blokke, og kender på forhånd sin samlede længde, så requests
+# sender en almindelig Content-Length (Djangos multipart-parser kræver den).
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\r\n", " ")
+
+
+class MultipartStream:
+    def __init__(self, fields: Dict[str, str], files: Dict[str, File]):
+        self.fields = fields
+        self.files = files
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.parts: List[Union[bytes, File]] = []
+        for name, value in fields.items():
+            self.parts.append(
+                self._header(f'form-data; name="{_quote(name)}"')
+                + value.encode("utf-8")
+                + b"\r\n"
+            )
+        for name, file in files.items():
+            filename = file.name.rsplit("/", 1)[-1] if file.name else name
+            content_type = (
+                getattr(file, "content_type", None)
+                or mimetypes.guess_type(filename)[0]
+                or "application/octet-stream"
+            )
+            self.parts.append(
+                self._header(
+                    f'form-data; name="{_quote(name)}"; '
+                    f'filename="{_quote(filename)}"',
+                    content_type,
+                )
+            )
+            self.parts.append(file)
+            self.parts.append(b"\r\n")
+        self.parts.append(f"--{self.boundary}--\r\n".encode("ascii"))
+
+    def _header(self, disposition: str, content_type: str = "") -> bytes:
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        return (header + "\r\n").encode("utf-8")
+
+    def __len__(self) -> int:
+        return sum(
+            part.size if isinstance(part, File) else len(part) for part in self.parts
+        )
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self.parts:
+            if isinstance(part, File):
+                yield from part.chunks(CHUNK_SIZE)
+            else:
+                yield part
@@ -0,0 +1,212 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from requests import Response
+
+# Cache af svar på GET fra REST.
+#
+# Svarene gemmes i Djangos cache (memcached) sammen med deres ETag, pr. bruger
+# og URL. Et gemt svar bruges normalt ikke uden at spørge REST: requestet sendes med
+# If-None-Match, og er svaret uændret, svarer REST 304 uden indhold, og det
+# gemte svar bruges. Så slipper REST for at sende, og klienten for at hente,
+# svaret igen, uden at klienten nogensinde ser forældede data.
+#
+# Cachen er begrænset på to måder: svar over REST_RESPONSE_CACHE_MAX_SIZE bytes
+# gemmes ikke, og hvert svar udløber efter REST_RESPONSE_CACHE_TIMEOUT sekunder
+# (memcached smider desuden de mindst brugte ud når den er fuld).
+#
+# Referencedata (afgiftstabeller, satser, toldkategorier og speditører) har et
+# fælles versionsnummer, som REST sender med svarene i headeren
+# X-Referencedata-Version (se common.referencedata i REST). Et gemt svar med
+# referencedata bruges uden at spørge REST, så længe det har samme version som
+# det seneste svar fra REST, og det svar højst er REFERENCEDATA_MAX_AGE sekunder
+# gammelt. En ændring i referencedata ses altså senest efter så mange sekunder.
+#
+# Hver proces tæller hits, misses og sparede bytes, og lægger dem jævnligt til
+# de samlede tællere i cachen; se `stats()` og `manage.py rest_cache_stats`.
+
+log = logging.getLogger(__name__)
+
+KEY_PREFIX = "rest_response"
+STATS_KEYS = ("requests", "hits", "fresh", "misses", "bytes_saved")
+STATS_INTERVAL = 60
+REFERENCEDATA_HEADER = "X-Referencedata-Version"
+REFERENCEDATA_PATHS = ("afgiftstabel", "vareafgiftssats", "toldkategori", "speditør")
+
+
+def _cache():
+    return caches[getattr(settings, "REST_RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _identity(access_token: Optional[str]) -> str:
+    # Svarene afhænger af brugerens rettigheder, så cachen deles pr. bruger.
+    # Bruger-id'et læses fra tokenets payload, så cachen overlever at tokenet
+    # fornyes; tokenet er allerede verificeret af REST
+    if not access_token:
+        return "anonym"
+    try:
+        payload = access_token.split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        return f"user:{claims['user_id']}"
+    except (IndexError, KeyError, TypeError, ValueError):
+        return "token:" + hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = dict.fromkeys(STATS_KEYS, 0)
+        self.flushed = time.monotonic()
+        self.version: Optional[str] = None
+        self.version_seen = 0.0
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, "REST_RESPONSE_CACHE_TIMEOUT", 3600)
+
+    @property
+    def max_size(self) -> int:
+        return getattr(settings, "REST_RESPONSE_CACHE_MAX_SIZE", 512 * 1024)
+
+    @property
+    def referencedata_max_age(self) -> int:
+        return getattr(settings, "REFERENCEDATA_MAX_AGE", 60)
+
+    def observe(self, response: Response):
+        """
+        Noterer referencedatas version fra et svar fra REST
+        """
+        version = response.headers.get(REFERENCEDATA_HEADER)
+        if isinstance(version, str):
+            self.version = version
+            self.version_seen = time.monotonic()
+
+    def fresh(self, path: str, cached: Optional[tuple]) -> bool:
+        """
+        Om et gemt svar med referencedata kan bruges uden at spørge REST
+        """
+        return (
+            cached is not None
+            and len(cached) > 2
+            and path.split("/", 1)[0].split("?", 1)[0] in REFERENCEDATA_PATHS
+            and cached[2] == self.version
+            and time.monotonic() - self.version_seen < self.referencedata_max_age
+        )
+
+    @staticmethod
+    def key(access_token: Optional[str], url: str) -> str:
+        digest = hashlib.sha256(
+            f"{_identity(access_token)}\n{url}".encode("utf-8")
+        ).hexdigest()
+        return f"{KEY_PREFIX}:{digest}"
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes, Optional[str]]]:
+        try:
+            return _cache().get(key)
+        except Exception as e:
+            # En utilgængelig cache må ikke vælte requestet
+            log.warning("Kunne ikke læse REST-svar fra cachen: %s", e)
+            return None
+
+    def hit(self, key: str, cached: tuple):
+        self.count(hits=1, bytes_saved=len(cached[1]))
+        if self.version is not None and cached[2:] != (self.version,):
+            # Svaret er også gyldigt for den nye version
+            self.set(key, (cached[0], cached[1], self.version))
+
+    def hit_fresh(self, cached: tuple):
+        self.count(fresh=1, bytes_saved=len(cached[1]))
+
+    def miss(self, key: str, response: Response):
+        self.count(misses=1)
+        etag = response.headers.get("ETag")
+        content = response.content
+        if (
+            response.status_code == 200
+            and isinstance(etag, str)
+            and isinstance(content, bytes)
+            and len(content) <= self.max_size
+        ):
+            version = response.headers.get(REFERENCEDATA_HEADER)
+            self.set(
+                key, (etag, content, version if isinstance(version, str) else None)
+            )
+
+    def set(self, key: str, entry: tuple):
+        try:
+            _cache().set(key, entry, self.timeout)
+        except Exception as e:
+            log.warning("Kunne ikke gemme REST-svar i cachen: %s", e)
+
+    def count(self, **counts: int):
+        with self.lock:
+            self.counts["requests"] += 1
+            for name, value in counts.items():
+                self.counts[name] += value
+            if time.monotonic() - self.flushed < STATS_INTERVAL:
+                return
+            counts, self.counts = self.counts, dict.fromkeys(STATS_KEYS, 0)
+            self.flushed = time.monotonic()
+        self.flush(counts)
+
+    def flush(self, counts: Optional[Dict[str, int]] = None):
+        if counts is None:
+            with self.lock:
+                counts, self.counts = self.counts, dict.fromkeys(STATS_KEYS, 0)
+                self.flushed = time.monotonic()
+        cache = _cache()
+        try:
+            for name, value in counts.items():
+                if value:
+                    key = f"{KEY_PREFIX}:stats:{name}"
+                    cache.add(key, 0, timeout=None)
+                    cache.incr(key, value)
+        except Exception as e:
+            log.warning("Kunne ikke gemme REST-cachens tællere: %s", e)
+            return
+        if counts["requests"]:
+            log.info(
+                "REST-cache: %d requests, %d hits, %d uden request, %d bytes sparet",
+                counts["requests"],
+                counts["hits"],
+                counts["fresh"],
+                counts["bytes_saved"],
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """
+        De samlede tællere for alle processer, med hit rate
+        (andel af requests besvaret med 304 fra REST eller uden at spørge REST)
+        """
+        self.flush()
+        cache = _cache()
+        stats: Dict[str, float] = {
+            name: cache.get(f"{KEY_PREFIX}:stats:{name}", 0) for name in STATS_KEYS
+        }
+        stats["hit_rate"] = (
+            (stats["hits"] + stats["fresh"]) / stats["requests"]
+            if stats["requests"]
+            else 0.0
+        )
+        return stats
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = dict.fromkeys(STATS_KEYS, 0)
+        _cache().delete_many([f"{KEY_PREFIX}:stats:{name}" for name in STATS_KEYS])
+
+
+response_cache = ResponseCache()
@@ -6,11 +6,25 @@ import json
 import logging
 import re
 import time
+import warnings
 from base64 import b64encode
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import Future
 from datetime import datetime, timedelta, timezone
 from functools import cached_property
-from typing import Any, Dict, List, Optional, Tuple, Union
+from itertools import islice
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from urllib.parse import unquote, urlencode
 
 import requests
@@ -20,6 +34,7 @@ from django.core.files import File
 from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
 from django.core.serializers.json import DjangoJSONEncoder
 from requests import HTTPError, Session
+from told_common import fanout, transport
 from told_common.data import (
     Afgiftsanmeldelse,
     Afgiftstabel,
@@ -37,10 +52,30 @@ from told_common.data import (
     Vareafgiftssats,
     Varelinje,
 )
+from told_common.multipart import MultipartStream
+from told_common.response_cache import response_cache
+from told_common.sats_cache import sats_cache
 from told_common.util import cast_or_none, filter_dict_none, opt_int
 
 log = logging.getLogger(__name__)
 
+# Lister hentet med udvalgte felter (`fields`) mangler bevidst de øvrige felter,
+# som sættes til None (infer_missing)
+warnings.filterwarnings(
+    "ignore", message="Missing value of non-optional type", category=RuntimeWarning
+)
+
+
+class EstimatedCount(int):
+    # Et estimeret antal fra en liste hentet med count=auto
+    pass
+
+
+def list_count(data: dict) -> int:
+    if data.get("count_estimated"):
+        return EstimatedCount(data["count"])
+    return data["count"]
+
 
 class RestClientException(Exception):
     def __init__(self, status_code, content):
@@ -238,7 +273,7 @@ class FragtforsendelseRestClient(ModelRestClient):
                     "fragtbrevsnummer": data.get("fragtbrevnr"),
                     "forsendelsestype": "S" if fragttype == "skibsfragt" else "F",
                     "forbindelsesnr": data.get("forbindelsesnr"),
-                    "fragtbrev": RestClient._uploadfile_to_base64str(file),
+                    "fragtbrev": file,
                     "fragtbrev_navn": file.name if file else None,
                     "afgangsdato": data.get("afgangsdato"),
                 },
@@ -270,12 +305,12 @@ class FragtforsendelseRestClient(ModelRestClient):
     def create(self, data: dict, file: Optional[UploadedFile]) -> Optional[int]:
         mapped = self.map(data, file)
         if mapped:
-            if mapped.get("fragtbrev"):
+            if file is not None:
                 log.info(
                     "rest_client opretter Fragtforsendelse "
-                    "med fragtbrev '%s' (%d bytes BASE64)",
-                    mapped["fragtbrev_navn"],
-                    len(mapped["fragtbrev"]),
+                    "med fragtbrev '%s' (%d bytes)",
+                    file.name,
+                    file.size,
                 )
             response = self.rest.post("fragtforsendelse", mapped)
             return response["id"]
@@ -299,13 +334,13 @@ class FragtforsendelseRestClient(ModelRestClient):
             pass
         else:
             # Håndterer opdatering af eksisterende
-            if mapped.get("fragtbrev"):
+            if file is not None:
                 log.info(
                     "rest_client opdaterer Fragtforsendelse "
-                    "%d med fragtbrev '%s' (%d bytes BASE64)",
+                    "%d med fragtbrev '%s' (%d bytes)",
                     id,
-                    mapped["fragtbrev_navn"],
-                    len(mapped["fragtbrev"]),
+                    file.name,
+                    file.size,
                 )
             self.rest.patch(f"fragtforsendelse/{id}", mapped)
         return id
@@ -355,7 +390,7 @@ class AfgiftanmeldelseRestClient(ModelRestClient):
             "postforsendelse_id": postforsendelse_id,
             "fragtforsendelse_id": fragtforsendelse_id,
             "toldkategori": data.get("toldkategori"),
-            "leverandørfaktura": self.rest._uploadfile_to_base64str(leverandørfaktura),
+            "leverandørfaktura": leverandørfaktura,
             "leverandørfaktura_navn": (
                 leverandørfaktura.name if leverandørfaktura else None
             ),
@@ -384,11 +419,11 @@ class AfgiftanmeldelseRestClient(ModelRestClient):
             postforsendelse_id,
             fragtforsendelse_id,
         )
-        if mapped.get("leverandørfaktura"):
+        if leverandørfaktura is not None:
             log.info(
-                "rest_client opretter TF10 med leverandørfaktura %s (%d bytes BASE64)",
-                mapped["leverandørfaktura_navn"],
-                len(mapped["leverandørfaktura"]),
+                "rest_client opretter TF10 med leverandørfaktura %s (%d bytes)",
+                leverandørfaktura.name,
+                leverandørfaktura.size,
             )
         response = self.rest.post("afgiftsanmeldelse", mapped)
         return response["id"]
@@ -416,13 +451,13 @@ class AfgiftanmeldelseRestClient(ModelRestClient):
             status,
         )
         if force_write or (existing and not self.compare(mapped, existing)):
-            if mapped.get("leverandørfaktura"):
+            if leverandørfaktura is not None:
                 log.info(
                     "rest_client opdaterer TF10 %d med "
-                    "leverandørfaktura %s (%d bytes BASE64)",
+                    "leverandørfaktura %s (%d bytes)",
                     id,
-                    mapped["leverandørfaktura_navn"],
-                    len(mapped["leverandørfaktura"]),
+                    leverandørfaktura.name,
+                    leverandørfaktura.size,
                 )
             self.rest.patch(f"afgiftsanmeldelse/{id}", mapped)
         return id
@@ -438,37 +473,72 @@ class AfgiftanmeldelseRestClient(ModelRestClient):
     def set_toldkategori(self, id: int, toldkategori: str):
         self.rest.patch(f"afgiftsanmeldelse/{id}", {"toldkategori": toldkategori})
 
+    @staticmethod
+    def expand(
+        include_varelinjer: bool,
+        include_notater: bool,
+        include_prismeresponses: bool,
+    ) -> Optional[str]:
+        # Underobjekter hentes inline i samme kald som anmeldelserne
+        names = [
+            name
+            for name, include in (
+                ("varelinjer", include_varelinjer),
+                ("notater", include_notater),
+                ("prismeresponses", include_prismeresponses),
+            )
+            if include
+        ]
+        return ",".join(names) or None
+
+    def set_expanded(self, item: dict):
+        # Underobjekter der ikke er bedt om, er ikke med i svaret
+        varelinjer = item.get("varelinjer")
+        notater = item.get("notater")
+        prismeresponses = item.get("prismeresponses")
+        item["varelinjer"] = (
+            self.rest.varelinje.from_items(varelinjer)
+            if varelinjer is not None
+            else None
+        )
+        item["notater"] = (
+            [Notat.from_dict(x) for x in notater] if notater is not None else None
+        )
+        item["prismeresponses"] = (
+            [PrismeResponse.from_dict(x) for x in prismeresponses]
+            if prismeresponses is not None
+            else None
+        )
+
     def list(
         self,
         full=False,
         include_varelinjer=False,
         include_notater=False,
         include_prismeresponses=False,
+        fields: Optional[Iterable[str]] = None,
         **filter: Union[str, int, float, bool, List[Union[str, int, float, bool]]],
     ) -> Tuple[int, List[Afgiftsanmeldelse]]:
+        expand = self.expand(
+            include_varelinjer, include_notater, include_prismeresponses
+        )
+        if expand:
+            filter = {**filter, "expand": expand}
+        if fields is not None:
+            # Kun de udvalgte felter hentes; de øvrige bliver None
+            filter = {**filter, "fields": ",".join(fields)}
         if full:
             data = self.rest.get("afgiftsanmeldelse/full", filter)
         else:
             data = self.rest.get("afgiftsanmeldelse", filter)
         for item in data["items"]:
-            id = item["id"]
-            item["varelinjer"] = None
-            item["notater"] = None
-            item["prismeresponses"] = None
-            if include_varelinjer:
-                item["varelinjer"] = self.rest.varelinje.list(afgiftsanmeldelse=id)
-            if include_notater:
-                item["notater"] = self.rest.notat.list(afgiftsanmeldelse=id)
-            if include_prismeresponses:
-                item["prismeresponses"] = self.rest.prismeresponse.list(
-                    afgiftsanmeldelse=id
-                )
-        for item in data["items"]:
+            self.set_expanded(item)
             self.set_file(item, "leverandørfaktura")
             if item.get("fragtforsendelse"):
                 self.set_file(item["fragtforsendelse"], "fragtbrev")
-        return data["count"], [
-            Afgiftsanmeldelse.from_dict(item) for item in data["items"]
+        return list_count(data), [
+            Afgiftsanmeldelse.from_dict(item, infer_missing=fields is not None)
+            for item in data["items"]
         ]
 
     def get(
@@ -479,24 +549,18 @@ class AfgiftanmeldelseRestClient(ModelRestClient):
         include_notater=False,
         include_prismeresponses=False,
     ):
-        if full:
-            item = self.rest.get(f"afgiftsanmeldelse/{id}/full")
+        path = f"afgiftsanmeldelse/{id}/full" if full else f"afgiftsanmeldelse/{id}"
+        expand = self.expand(
+            include_varelinjer, include_notater, include_prismeresponses
+        )
+        if expand:
+            item = self.rest.get(path, {"expand": expand})
         else:
-            item = self.rest.get(f"afgiftsanmeldelse/{id}")
+            item = self.rest.get(path)
         self.set_file(item, "leverandørfaktura")
         if item.get("fragtforsendelse"):
             self.set_file(item["fragtforsendelse"], "fragtbrev")
-        item["varelinjer"] = None
-        item["notater"] = None
-        item["prismeresponses"] = None
-        if include_varelinjer:
-            item["varelinjer"] = self.rest.varelinje.list(afgiftsanmeldelse=id)
-        if include_notater:
-            item["notater"] = self.rest.notat.list(afgiftsanmeldelse=id)
-        if include_prismeresponses:
-            item["prismeresponses"] = self.rest.prismeresponse.list(
-                afgiftsanmeldelse=item["id"]
-            )
+        self.set_expanded(item)
         return Afgiftsanmeldelse.from_dict(item)
 
     def delete(self, id: int):
@@ -561,9 +625,7 @@ class PrivatAfgiftanmeldelseRestClient(ModelRestClient):
         }
         mapped.update(
             {
-                "leverandørfaktura": self.rest._uploadfile_to_base64str(
-                    leverandørfaktura
-                ),
+                "leverandørfaktura": leverandørfaktura,
                 "leverandørfaktura_navn": (
                     leverandørfaktura.name if leverandørfaktura else None
                 ),
@@ -603,24 +665,41 @@ class PrivatAfgiftanmeldelseRestClient(ModelRestClient):
         self,
         include_varelinjer=False,
         include_notater=False,
+        fields: Optional[Iterable[str]] = None,
         **filter: Union[str, int, float, bool, List[Union[str, int, float, bool]]],
     ) -> Tuple[int, List[PrivatAfgiftsanmeldelse]]:
+        if fields is not None:
+            # Kun de udvalgte felter hentes; de øvrige bliver None
+            filter = {**filter, "fields": ",".join(fields)}
         data = self.rest.get("privat_afgiftsanmeldelse", filter)
+        # Underobjekter til hele siden hentes samlet, med ét kald pr. type
+        ids = [item["id"] for item in data["items"]]
+        varelinjer = (
+            self.rest.get_children("varelinje", "privatafgiftsanmeldelse", ids)
+            if include_varelinjer
+            else None
+        )
+        notater = (
+            self.rest.get_children("notat", "privatafgiftsanmeldelse", ids)
+            if include_notater
+            else None
+        )
         for item in data["items"]:
             id = item["id"]
             item["varelinjer"] = None
             item["notater"] = None
             item["prismeresponses"] = None
-            if include_varelinjer:
-                item["varelinjer"] = self.rest.varelinje.list(afgiftsanmeldelse=id)
-            if include_notater:
-                item["notater"] = self.rest.notat.list(privatafgiftsanmeldelse=id)
+            if varelinjer is not None:
+                item["varelinjer"] = self.rest.varelinje.from_items(varelinjer[id])
+            if notater is not None:
+                item["notater"] = [Notat.from_dict(x) for x in notater[id]]
 
         for item in data["items"]:
             if item.get("leverandørfaktura"):
                 self.set_file(item, "leverandørfaktura")
-        return data["count"], [
-            PrivatAfgiftsanmeldelse.from_dict(item) for item in data["items"]
+        return list_count(data), [
+            PrivatAfgiftsanmeldelse.from_dict(item, infer_missing=fields is not None)
+            for item in data["items"]
         ]
 
     def get(
@@ -730,17 +809,26 @@ class VarelinjeRestClient(ModelRestClient):
     def list(
         self, **filter: Union[str, int, float, bool, List[Union[str, int, float, bool]]]
     ) -> List[Varelinje]:
-        data = [
-            Varelinje.from_dict(item)
-            for item in self.rest.get("varelinje", filter)["items"]
-        ]
+        return self.from_items(self.rest.get("varelinje", filter)["items"])
+
+    def from_items(self, items: List[dict]) -> List[Varelinje]:
+        data = [Varelinje.from_dict(item) for item in items]
+        # Satserne slås op i den fælles cache, og de manglende hentes samlet
+        satser = sats_cache.get_many(
+            (item.vareafgiftssats for item in data if item.vareafgiftssats),
+            self.load_satser,
+        )
         for item in data:
             if item.vareafgiftssats:
-                item.vareafgiftssats = self.rest.vareafgiftssats.get(
-                    item.vareafgiftssats
-                )
+                item.vareafgiftssats = satser[item.vareafgiftssats]
         return data
 
+    def load_satser(self, ids: Set[int]) -> Dict[int, Vareafgiftssats]:
+        if len(ids) == 1:
+            id = next(iter(ids))
+            return {id: self.rest.vareafgiftssats.get(id)}
+        return self.rest.vareafgiftssats.get_many(ids)
+
     def delete(self, id: int):
         self.rest.delete(f"varelinje/{id}")
 
@@ -867,6 +955,33 @@ class VareafgiftssatsRestClient(ModelRestClient):
             )
         return sats
 
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Vareafgiftssats]:
+        ids = sorted(set(ids))
+        if not ids:
+            return {}
+        satser = {
+            sats.id: sats
+            for sats in map(
+                Vareafgiftssats.from_dict,
+                self.rest.get_all_items("vareafgiftssats", {"id": ids}).values(),
+            )
+        }
+        missing = set(ids) - satser.keys()
+        if missing:
+            raise RestClientException(404, f"Vareafgiftssats {sorted(missing)}")
+        sammensatte = [
+            sats.id
+            for sats in satser.values()
+            if sats.enhed == Vareafgiftssats.Enhed.SAMMENSAT
+        ]
+        if sammensatte:
+            subs = self.rest.get_children("vareafgiftssats", "overordnet", sammensatte)
+            for sats in satser.values():
+                sats.populate_subs(
+                    lambda oid: [Vareafgiftssats.from_dict(x) for x in subs[oid]]
+                )
+        return satser
+
     def list(
         self,
         **filter: Union[str, int, float, bool, List[Union[str, int, float, bool]]],
@@ -926,19 +1041,17 @@ class PaymentRestClient(ModelRestClient):
 
     def get_by_declaration(self, declaration_id: int) -> dict:
         for payment in self.rest.get(f"payment?declaration={declaration_id}&full=true"):
-            if payment["declaration"] == declaration_id:
-                declaration = self.rest.get(f"afgiftsanmeldelse/{declaration_id}")
+            # Anmeldelsen er nestet i svaret
+            declaration = payment["declaration"]
+            if isinstance(declaration, dict):
+                declaration = declaration["id"]
+            if declaration == declaration_id:
+                # Afsender og modtager nestes i samme kald som anmeldelsen
                 return {
                     **payment,
-                    "declaration": {
-                        **declaration,
-                        "afsender": self.rest.get(
-                            f"afsender/{declaration['afsender']}"
-                        ),
-                        "modtager": self.rest.get(
-                            f"modtager/{declaration['modtager']}"
-                        ),
-                    },
+                    "declaration": self.rest.get(
+                        f"afgiftsanmeldelse/{declaration_id}/full"
+                    ),
                 }
 
         raise ObjectDoesNotExist(
@@ -975,7 +1088,8 @@ class RestClient:
     domain = settings.REST_DOMAIN  # type: ignore
 
     def __init__(self, token: JwtTokenInfo):
-        self.session: Session = requests.sessions.Session()
+        # Forbindelserne deles med alle andre klienter i processen
+        self.session: Session = transport.session()
         self.token: JwtTokenInfo = token
         if self.token:
             self.session.headers = {
@@ -1031,7 +1145,7 @@ class RestClient:
         response.raise_for_status()
 
     def refresh_login(self):
-        response = requests.post(
+        response = self.session.post(
             f"{self.domain}/api/token/refresh",
             data=json.dumps({"refresh": self.token.refresh_token}),
             headers={"Content-Type": "application/json"},
@@ -1152,23 +1266,64 @@ class RestClient:
         params: Optional[dict] = None,
     ) -> dict:
         self.check_access_token_age()
+        return self._get(path, params)
+
+    def _get(self, path: str, params: Optional[dict] = None) -> dict:
+        # Som get, men uden at forny tokenet, så den kan kaldes fra flere
+        # tråde på én gang (se _prefetch_pages)
         param_string = (
             ("?" + urlencode(params, doseq=True)) if params is not None else ""
         )
+        url = f"{self.domain}/api/{path}{param_string}"
+        # Et gemt svar genbruges kun hvis REST bekræfter (304) at det er uændret,
+        # eller hvis det er referencedata af den seneste version
+        cache_key = response_cache.key(self.token and self.token.access_token, url)
+        cached = response_cache.get(cache_key)
+        if response_cache.fresh(path, cached):
+            response_cache.hit_fresh(cached)
+            return json.loads(cached[1])
         try:
-            response = self.session.get(f"{self.domain}/api/{path}{param_string}")
+            if cached is None:
+                response = self.session.get(url)
+            else:
+                response = self.session.get(url, headers={"If-None-Match": cached[0]})
+            response_cache.observe(response)
+            if cached is not None and response.status_code == 304:
+                response_cache.hit(cache_key, cached)
+                return json.loads(cached[1])
             response.raise_for_status()
+            response_cache.miss(cache_key, response)
             return response.json()
         except HTTPError as e:
             raise RestClientException.from_http_error(e)
 
+    @staticmethod
+    def _body(data) -> Tuple[Any, Dict[str, str]]:
+        # Filer i data sendes som multipart-dele ved siden af JSON-payloadet,
+        # i stedet for base64 i JSON (se project.middleware i REST)
+        files = (
+            {key: value for key, value in data.items() if isinstance(value, File)}
+            if isinstance(data, dict)
+            else {}
+        )
+        if files:
+            payload = {key: value for key, value in data.items() if key not in files}
+            body = MultipartStream(
+                {"payload": json.dumps(payload, cls=DjangoJSONEncoder)}, files
+            )
+            return body, {"Content-Type": body.content_type}
+        return json.dumps(data, cls=DjangoJSONEncoder), {
+            "Content-Type": "application/json"
+        }
+
     def post(self, path: str, data):
         self.check_access_token_age()
+        body, headers = self._body(data)
         try:
             response = self.session.post(
                 f"{self.domain}/api/{path}",
-                json.dumps(data, cls=DjangoJSONEncoder),
-                headers={"Content-Type": "application/json"},
+                body,
+                headers=headers,
             )
             response.raise_for_status()
             if response.status_code != 204:
@@ -1178,11 +1333,12 @@ class RestClient:
 
     def patch(self, path: str, data):
         self.check_access_token_age()
+        body, headers = self._body(data)
         try:
             response = self.session.patch(
                 f"{self.domain}/api/{path}",
-                json.dumps(data, cls=DjangoJSONEncoder),
-                headers={"Content-Type": "application/json"},
+                body,
+                headers=headers,
             )
             response.raise_for_status()
             return response.json()
@@ -1219,23 +1375,94 @@ class RestClient:
                 [b64encode(chunk).decode("ascii") for chunk in file.chunks(48 * 1024)]
             )
 
+    def iter_items(
+        self, route: str, filter: Optional[Dict[str, Any]] = None
+    ) -> Iterator[dict]:
+        """
+        Alle elementer i listen, efterhånden som siderne hentes. Højst
+        REST_PAGE_PREFETCH sider ad gangen er hentet men ikke brugt
+        """
+        # Der bedes om REST_PAGE_SIZE elementer pr. side, men REST kan give færre
+        # (NINJA_PAGINATION_MAX_LIMIT). En side med flere efter sig er fuld, så
+        # den første side afgør sidestørrelsen for resten
+        filter = filter or {}
+        limit = getattr(settings, "REST_PAGE_SIZE", 500)
+        data = self.get(route, {**filter, "limit": limit})
+        size = len(data["items"])
+        yield from data["items"]
+        count = data.get("count")
+        if count is not None and not data.get("count_estimated"):
+            # Antallet kendes, så de følgende sider kan hentes samtidigt
+            for page in self._prefetch_pages(route, filter, size, count):
+                yield from page
+        elif "next" in data:
+            while data["next"]:
+                data = self.get(
+                    route,
+                    {**filter, "limit": limit, "cursor": data["next"], "count": "none"},
+                )
+                yield from data["items"]
+        else:
+            offset = 0
+            while len(data["items"]) == limit:
+                offset += limit
+                data = self.get(route, {**filter, "limit": limit, "offset": offset})
+                yield from data["items"]
+
+    def _prefetch_pages(
+        self, route: str, filter: Dict[str, Any], size: int, count: int
+    ) -> Iterator[List[dict]]:
+        if size == 0:
+            return
+        offsets = iter(range(size, count, size))
+        pending: Deque[Future] = deque()
+
+        def fetch(offset: int) -> Future:
+            return fanout.submit(
+                self._get,
+                route,
+                {**filter, "limit": size, "offset": offset, "count": "none"},
+            )
+
+        try:
+            # Tokenet fornyes i denne tråd før siderne sendes af sted, så
+            # trådene der henter dem, ikke fornyer det samtidigt
+            self.check_access_token_age()
+            for offset in islice(offsets, getattr(settings, "REST_PAGE_PREFETCH", 4)):
+                pending.append(fetch(offset))
+            while pending:
+                page = pending.popleft().result()["items"]
+                offset = next(offsets, None)
+                if offset is not None:
+                    self.check_access_token_age()
+                    pending.append(fetch(offset))
+                yield page
+        finally:
+            # Stopper forbrugeren før tid, hentes resten ikke
+            for future in pending:
+                future.cancel()
+
     def get_all_items(
         self, route: str, filter: Optional[Dict[str, Any]] = None
     ) -> Dict[int, dict]:
-        limit = 100
-        offset = 0
-        items = []
-        if filter is None:
-            filter = {}
-
-        data = self.get(route, {**filter, "limit": limit, "offset": offset})
-        items.extend(data["items"])
-        while len(data["items"]) == limit:
-            offset += limit
-            data = self.get(route, {**filter, "limit": limit, "offset": offset})
-            items.extend(data["items"])
+        return {item["id"]: item for item in self.iter_items(route, filter)}
 
-        return {item["id"]: item for item in items}
+    def get_children(
+        self,
+        route: str,
+        parent: str,
+        ids: Iterable[int],
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Dict[int, List[dict]]:
+        # Underobjekter til flere objekter hentes samlet med `<parent>__in`,
+        # og grupperes efter forælderens id
+        ids = list(ids)
+        children: Dict[int, List[dict]] = {id: [] for id in ids}
+        if ids:
+            items = self.get_all_items(route, {**(filter or {}), f"{parent}__in": ids})
+            for item in items.values():
+                children.setdefault(item.get(parent), []).append(item)
+        return children
 
     @cached_property
     def varesatser(self) -> Dict[int, Vareafgiftssats]:
@@ -1259,10 +1486,10 @@ class RestClient:
         if afgiftstabeller["count"] == 1:
             afgiftstabel = afgiftstabeller["items"][0]
             return {
-                key: Vareafgiftssats.from_dict(value)
-                for key, value in self.get_all_items(
+                item["id"]: Vareafgiftssats.from_dict(item)
+                for item in self.iter_items(
                     "vareafgiftssats", {"afgiftstabel": afgiftstabel["id"], **filter}
-                ).items()
+                )
             }
         return {}
 
@@ -1281,11 +1508,11 @@ class RestClient:
         for afgiftstabel in afgiftstabeller:
             varesatser.update(
                 {
-                    key: Vareafgiftssats.from_dict(value)
-                    for key, value in self.get_all_items(
+                    item["id"]: Vareafgiftssats.from_dict(item)
+                    for item in self.iter_items(
                         "vareafgiftssats",
                         {"afgiftstabel": afgiftstabel["id"], **filter_varesats},
-                    ).items()
+                    )
                 }
             )
         return varesatser
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from told_common.data import Vareafgiftssats
+from told_common.response_cache import response_cache
+
+# Cache af satser, fælles for hele processen.
+#
+# Varelinjer refererer til deres sats med id, og de samme få satser går igen på
+# tværs af anmeldelser og brugere. VarelinjeRestClient slår derfor satserne op
+# her, og henter kun de manglende fra REST (sammensatte satser med deres
+# undersatser).
+#
+# Cachen holder højst SATS_CACHE_SIZE satser, og smider de mindst brugte ud.
+# En sats bruges højst SATS_CACHE_MAX_AGE sekunder efter den er hentet, og kun
+# så længe referencedatas version (se told_common.response_cache) er den samme
+# som da den blev hentet.
+#
+# Hentes den samme sats af flere tråde på én gang, henter kun den første den fra
+# REST, og de andre venter på den. Cachen gemmer sin egen kopi af satserne, og
+# hver kalder får en kopi, så en kalder der ændrer en sats (fx dens subsatser),
+# ikke påvirker cachen eller andre tråde.
+
+Loader = Callable[[Set[int]], Dict[int, Vareafgiftssats]]
+
+
+class SatsCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # id -> (sats, referencedata-version, tidspunkt)
+        self.entries: OrderedDict[int, Tuple[Vareafgiftssats, Optional[str], float]] = (
+            OrderedDict()
+        )
+        self.loading: Dict[int, threading.Event] = {}
+
+    @property
+    def size(self) -> int:
+        return getattr(settings, "SATS_CACHE_SIZE", 2000)
+
+    @property
+    def max_age(self) -> int:
+        return getattr(settings, "SATS_CACHE_MAX_AGE", 300)
+
+    def valid(self, entry: Tuple[Vareafgiftssats, Optional[str], float]) -> bool:
+        _, version, loaded = entry
+        return time.monotonic() - loaded < self.max_age and (
+            response_cache.version is None or version == response_cache.version
+        )
+
+    def get_many(
+        self, ids: Iterable[int], loader: Loader
+    ) -> Dict[int, Vareafgiftssats]:
+        """
+        Satserne med de givne id'er. De der ikke er i cachen, hentes med `loader`
+        """
+        result: Dict[int, Vareafgiftssats] = {}
+        wanted = set(ids)
+        while wanted:
+            load: Set[int] = set()
+            wait: List[threading.Event] = []
+            cached: Dict[int, Vareafgiftssats] = {}
+            with self.lock:
+                for id in wanted:
+                    entry = self.entries.get(id)
+                    if entry is not None and self.valid(entry):
+                        self.entries.move_to_end(id)
+                        cached[id] = entry[0]
+                    elif id in self.loading:
+                        wait.append(self.loading[id])
+                    else:
+                        self.loading[id] = threading.Event()
+                        load.add(id)
+            result.update(deepcopy(cached))
+            if load:
+                try:
+                    loaded = loader(load)
+                    self.store(loaded)
+                    result.update(loaded)
+                finally:
+                    with self.lock:
+                        for id in load:
+                            self.loading.pop(id).set()
+            for event in wait:
+                event.wait()
+            # Satser andre tråde har hentet imens, slås op igen. Fejlede de,
+            # hentes satserne i næste omgang
+            wanted -= result.keys() | load
+        return result
+
+    def store(self, satser: Dict[int, Vareafgiftssats]):
+        version = response_cache.version
+        now = time.monotonic()
+        with self.lock:
+            for id, sats in deepcopy(satser).items():
+                self.entries[id] = (sats, version, now)
+                self.entries.move_to_end(id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+sats_cache = SatsCache()
@@ -1,18 +1,31 @@
 import base64
+import json
+import threading
 import time
 from decimal import Decimal
-from unittest.mock import MagicMock, patch
+from functools import cached_property, partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from unittest.mock import MagicMock, call, patch
 
+import requests
+from django.core.cache import caches
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.http.multipartparser import MultiPartParser
+from django.test import TestCase, override_settings
 from requests import HTTPError, Response
+from told_common import fanout, transport
 from told_common.data import Forsendelsestype
+from told_common.multipart import MultipartStream
+from told_common.response_cache import response_cache
 from told_common.rest_client import (
     AfgiftanmeldelseRestClient,
     AfgiftstabelRestClient,
     AfsenderRestClient,
     EboksBeskedRestClient,
+    EstimatedCount,
     FragtforsendelseRestClient,
     JwtTokenInfo,
     ModtagerRestClient,
@@ -30,6 +43,9 @@ from told_common.rest_client import (
     VareafgiftssatsRestClient,
     VarelinjeRestClient,
 )
+from told_common.sats_cache import SatsCache, sats_cache
+from told_common.view_mixins import HasRestClientMixin
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
 
 class RestClientExceptionTests(TestCase):
@@ -321,7 +337,12 @@ class AfgiftanmeldelseRestClientTests(TestCase):
         self.mock_rest.get.assert_called_once()
 
     def test_list_full(self):
-        self.mock_rest.get.return_value = {"items": [self.item], "count": 1}
+        self.mock_rest.get.return_value = {
+            "items": [
+                {**self.item, "varelinjer": [], "notater": [], "prismeresponses": []}
+            ],
+            "count": 1,
+        }
         data = self.client.list(
             full=True,
             include_varelinjer=True,
@@ -338,10 +359,61 @@ class AfgiftanmeldelseRestClientTests(TestCase):
 
         args, kwargs = self.mock_rest.get.call_args
         self.assertEqual(args[0], "afgiftsanmeldelse/full")
+        self.assertEqual(args[1], {"expand": "varelinjer,notater,prismeresponses"})
         self.mock_rest.get.assert_called_once()
+        self.mock_rest.varelinje.list.assert_not_called()
+        self.mock_rest.notat.list.assert_not_called()
+        self.mock_rest.prismeresponse.list.assert_not_called()
+
+    def test_list_fields(self):
+        self.mock_rest.get.return_value = {
+            "items": [
+                {
+                    "id": 1,
+                    "status": "ny",
+                    "afsender": {"navn": "Afsender"},
+                    "fragtforsendelse": None,
+                }
+            ],
+            "count": 1,
+        }
+        count, items = self.client.list(
+            full=True, fields=("id", "status", "afsender__navn", "fragtforsendelse")
+        )
+        self.mock_rest.get.assert_called_once_with(
+            "afgiftsanmeldelse/full",
+            {"fields": "id,status,afsender__navn,fragtforsendelse"},
+        )
+        # Felter der ikke er bedt om, er None
+        self.assertEqual(items[0].status, "ny")
+        self.assertEqual(items[0].afsender.navn, "Afsender")
+        self.assertIsNone(items[0].afsender.adresse)
+        self.assertIsNone(items[0].leverandørfaktura_nummer)
+
+    def test_list_count_estimated(self):
+        self.mock_rest.get.return_value = {
+            "items": [],
+            "count": 12000,
+            "count_estimated": True,
+        }
+        count, items = self.client.list(count="auto")
+        self.mock_rest.get.assert_called_once_with(
+            "afgiftsanmeldelse", {"count": "auto"}
+        )
+        self.assertEqual(count, 12000)
+        self.assertIsInstance(count, EstimatedCount)
+
+        self.mock_rest.get.return_value = {"items": [], "count": 12}
+        count, items = self.client.list(count="auto")
+        self.assertNotIsInstance(count, EstimatedCount)
 
     def test_get_full(self):
-        self.mock_rest.get.return_value = self.item
+        self.mock_rest.get.return_value = {
+            **self.item,
+            "varelinjer": [],
+            "notater": [],
+            "prismeresponses": [],
+        }
 
         item = self.client.get(
             1,
@@ -353,6 +425,7 @@ class AfgiftanmeldelseRestClientTests(TestCase):
 
         args, kwargs = self.mock_rest.get.call_args
         self.assertEqual(args[0], "afgiftsanmeldelse/1/full")
+        self.assertEqual(args[1], {"expand": "varelinjer,notater,prismeresponses"})
         self.mock_rest.get.assert_called_once()
 
         self.assertEqual(item.id, 1)
@@ -487,6 +560,36 @@ class PrivatAfgiftanmeldelseRestClientTests(TestCase):
         self.assertTrue(item.varelinjer is not None)
         self.assertTrue(item.notater is not None)
 
+    def test_list_batches_children(self):
+        self.mock_rest.get.return_value = {
+            "items": [self.item, {**self.item, "id": 124}],
+            "count": 2,
+        }
+        self.mock_rest.get_children.side_effect = [
+            {123: [{"id": 1}], 124: []},
+            {123: [], 124: [{"id": 2, "tekst": "Hej", "index": 0}]},
+        ]
+        self.client.set_file = MagicMock()
+        with patch("told_common.rest_client.Notat.from_dict") as mock_notat, patch(
+            "told_common.rest_client.PrivatAfgiftsanmeldelse.from_dict"
+        ):
+            self.client.list(include_varelinjer=True, include_notater=True)
+        # Ét kald pr. type for hele siden, ikke ét pr. anmeldelse
+        self.assertEqual(
+            self.mock_rest.get_children.call_args_list,
+            [
+                call("varelinje", "privatafgiftsanmeldelse", [123, 124]),
+                call("notat", "privatafgiftsanmeldelse", [123, 124]),
+            ],
+        )
+        self.assertEqual(
+            self.mock_rest.varelinje.from_items.call_args_list,
+            [call([{"id": 1}]), call([])],
+        )
+        mock_notat.assert_called_once_with({"id": 2, "tekst": "Hej", "index": 0})
+        self.mock_rest.varelinje.list.assert_not_called()
+        self.mock_rest.notat.list.assert_not_called()
+
     def test_compare_false_if_invoice_present(self):
         result = self.client.compare({"leverandørfaktura": "yes"}, {})
         self.assertFalse(result)
@@ -524,6 +627,7 @@ class VarelinjeRestClientTests(TestCase):
     def setUp(self):
         self.mock_rest = MagicMock()
         self.client = VarelinjeRestClient(self.mock_rest)
+        sats_cache.clear()
 
     def test_map_raises_if_no_ids(self):
         with self.assertRaises(Exception) as ctx:
@@ -574,6 +678,289 @@ class VarelinjeRestClientTests(TestCase):
         self.client.delete(1)
         self.mock_rest.delete.assert_called_once()
 
+    def test_from_items_batches_satser(self):
+        satser = {1: MagicMock(), 2: MagicMock()}
+        self.mock_rest.vareafgiftssats.get_many.return_value = satser
+        items = [
+            {"id": id, "afgiftsanmeldelse": 1, "vareafgiftssats": sats}
+            for id, sats in ((1, 1), (2, 2), (3, 1))
+        ]
+        data = self.client.from_items(items)
+        self.mock_rest.vareafgiftssats.get_many.assert_called_once_with({1, 2})
+        self.mock_rest.vareafgiftssats.get.assert_not_called()
+        self.assertEqual(
+            [item.vareafgiftssats for item in data], [satser[1], satser[2], satser[1]]
+        )
+
+    def test_from_items_single_sats(self):
+        items = [
+            {"id": id, "afgiftsanmeldelse": 1, "vareafgiftssats": 1} for id in (1, 2)
+        ]
+        data = self.client.from_items(items)
+        self.mock_rest.vareafgiftssats.get.assert_called_once_with(1)
+        self.mock_rest.vareafgiftssats.get_many.assert_not_called()
+        self.assertEqual(
+            data[0].vareafgiftssats, self.mock_rest.vareafgiftssats.get.return_value
+        )
+
+
+class SatsCacheTests(TestCase):
+    def setUp(self):
+        self.cache = SatsCache()
+        self.loader = MagicMock(
+            side_effect=lambda ids: {id: self.sats(id) for id in ids}
+        )
+        self.version = response_cache.version
+        response_cache.version = "1"
+
+    def tearDown(self):
+        response_cache.version = self.version
+
+    @staticmethod
+    def sats(id):
+        return Vareafgiftssats(
+            id=id,
+            afgiftstabel=1,
+            vareart_da="Test",
+            vareart_kl="Test",
+            afgiftsgruppenummer=id,
+            enhed=Vareafgiftssats.Enhed.KILOGRAM,
+            afgiftssats=Decimal("1.00"),
+        )
+
+    def test_get_many(self):
+        first = self.cache.get_many([1, 2], self.loader)
+        self.assertEqual(set(first), {1, 2})
+        self.loader.assert_called_once_with({1, 2})
+        # Kun den manglende hentes
+        second = self.cache.get_many([2, 3], self.loader)
+        self.assertEqual(second[2], first[2])
+        self.loader.assert_called_with({3})
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_copies(self):
+        # Ændrer en kalder sin sats, påvirker det hverken cachen eller andre
+        first = self.cache.get_many([1], self.loader)
+        first[1].afgiftssats = Decimal("2.00")
+        second = self.cache.get_many([1], self.loader)
+        self.assertIsNot(second[1], first[1])
+        self.assertEqual(second[1].afgiftssats, Decimal("1.00"))
+        second[1].subsatser = [self.sats(2)]
+        self.assertIsNone(self.cache.get_many([1], self.loader)[1].subsatser)
+        self.loader.assert_called_once_with({1})
+
+    @override_settings(SATS_CACHE_SIZE=2)
+    def test_lru(self):
+        self.cache.get_many([1, 2], self.loader)
+        self.cache.get_many([1], self.loader)
+        self.cache.get_many([3], self.loader)
+        # 2 er brugt mindst for nylig
+        self.assertEqual(list(self.cache.entries), [1, 3])
+        self.cache.get_many([2], self.loader)
+        self.assertEqual(self.loader.call_count, 3)
+
+    def test_expiry(self):
+        self.cache.get_many([1], self.loader)
+        with override_settings(SATS_CACHE_MAX_AGE=0):
+            self.cache.get_many([1], self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+        # Ny version af referencedata
+        response_cache.version = "2"
+        self.cache.get_many([1], self.loader)
+        self.assertEqual(self.loader.call_count, 3)
+        self.cache.get_many([1], self.loader)
+        self.assertEqual(self.loader.call_count, 3)
+
+    def test_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def loader(ids):
+            started.set()
+            release.wait(5)
+            return {id: self.sats(id) for id in ids}
+
+        results = {}
+        first = threading.Thread(
+            target=lambda: results.update(a=self.cache.get_many([1], loader))
+        )
+        first.start()
+        started.wait(5)
+        second = threading.Thread(
+            target=lambda: results.update(b=self.cache.get_many([1], self.loader))
+        )
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+        # Den anden tråd ventede på den første i stedet for selv at hente satsen
+        self.loader.assert_not_called()
+        self.assertEqual(results["a"][1], results["b"][1])
+
+    def test_loader_error(self):
+        self.loader.side_effect = [RestClientException(500, "fejl"), {1: self.sats(1)}]
+        with self.assertRaises(RestClientException):
+            self.cache.get_many([1], self.loader)
+        self.assertEqual(self.cache.loading, {})
+        self.assertEqual(self.cache.get_many([1], self.loader)[1].id, 1)
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"authorization": self.headers["Authorization"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "sessionid=abc")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TransportTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/"
+        self.adapter = transport.PooledAdapter()
+        caches["default"].clear()
+
+    def tearDown(self):
+        self.adapter.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def session(self, token):
+        session = transport.session()
+        session.mount("http://", self.adapter)
+        session.headers = {"Authorization": f"Bearer {token}"}
+        return session
+
+    def test_session(self):
+        session = transport.session()
+        self.assertIs(session.get_adapter("http://rest:7000/api/"), transport.adapter)
+        self.assertIs(session.get_adapter("https://rest/api/"), transport.adapter)
+        client = RestClient(
+            JwtTokenInfo(
+                access_token="a",
+                refresh_token="b",
+                access_token_timestamp=time.time(),
+            )
+        )
+        self.assertIs(client.session.get_adapter(client.domain), transport.adapter)
+
+    def test_shared_connection(self):
+        a = self.session("a")
+        b = self.session("b")
+        # Hver session sender sin egen Authorization-header over samme forbindelse
+        self.assertEqual(a.get(self.url).json(), {"authorization": "Bearer a"})
+        self.assertEqual(b.get(self.url).json(), {"authorization": "Bearer b"})
+        self.assertEqual(a.get(self.url).json(), {"authorization": "Bearer a"})
+        # Cookies fra REST gemmes ikke
+        self.assertEqual(len(a.cookies), 0)
+
+        stats = self.adapter.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["errors"], 0)
+        self.assertAlmostEqual(stats["reuse_rate"], 2 / 3)
+        self.assertEqual(stats["peak"], 1)
+
+        self.adapter.reset_stats()
+        self.assertEqual(self.adapter.stats()["requests"], 0)
+
+    @override_settings(REST_CONNECT_TIMEOUT=1, REST_READ_TIMEOUT=2)
+    def test_timeout(self):
+        response = Response()
+        response.status_code = 200
+        with patch(
+            "requests.adapters.HTTPAdapter.send", return_value=response
+        ) as mock_send:
+            self.session("a").get(self.url)
+            self.assertEqual(mock_send.call_args.kwargs["timeout"], (1, 2))
+            self.session("a").get(self.url, timeout=10)
+            self.assertEqual(mock_send.call_args.kwargs["timeout"], 10)
+
+    def test_error(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(requests.ConnectionError):
+            self.session("a").get(self.url)
+        self.assertEqual(self.adapter.stats()["errors"], 1)
+
+    def test_retry(self):
+        retry = self.adapter.max_retries
+        # Afbrudte forbindelser prøves igen, timeouts gør ikke
+        self.assertTrue(retry._is_read_error(ProtocolError("Connection aborted")))
+        self.assertFalse(retry._is_read_error(ReadTimeoutError(None, None, "")))
+        self.assertFalse(retry.is_retry("POST", 502))
+
+
+class FanoutTests(TestCase):
+    def test_run(self):
+        def call(value):
+            time.sleep(0.2)
+            return value
+
+        start = time.perf_counter()
+        with self.assertLogs("told_common.fanout", "DEBUG") as logs:
+            result = fanout.run({name: partial(call, name) for name in ("a", "b", "c")})
+        # Kaldene venter på hinanden i stedet for efter hinanden
+        self.assertLess(time.perf_counter() - start, 0.45)
+        self.assertEqual(result, {"a": "a", "b": "b", "c": "c"})
+        self.assertIn("3 REST-kald", logs.output[0])
+        self.assertRegex(logs.output[0], r"sekventielt [6-9]\d\d ms")
+
+    def test_error(self):
+        def fail():
+            raise RestClientException(404, "findes ikke")
+
+        with self.assertRaises(RestClientException):
+            fanout.run({"a": lambda: time.sleep(0.1), "b": fail})
+
+    def test_nested(self):
+        # Kald der selv bruger run, udfører deres kald i egen tråd
+        def nested():
+            return fanout.run(
+                {
+                    "c": lambda: threading.current_thread().name,
+                    "d": lambda: threading.current_thread().name,
+                }
+            )
+
+        result = fanout.run({"a": nested, "b": lambda: None})
+        self.assertEqual(result["a"]["c"], result["a"]["d"])
+        self.assertTrue(result["a"]["c"].startswith("rest-fanout"))
+
+    def test_prefetch(self):
+        class View(HasRestClientMixin):
+            @cached_property
+            def a(self):
+                return self.rest_client.get("a")
+
+            @cached_property
+            def b(self):
+                return self.rest_client.get("b")
+
+        view = View()
+        view.rest_client = MagicMock()
+        view.rest_client.get.side_effect = lambda path: path.upper()
+        view.prefetch("a", "b")
+        view.rest_client.check_access_token_age.assert_called_once()
+        self.assertEqual((view.a, view.b), ("A", "B"))
+        self.assertEqual(view.rest_client.get.call_count, 2)
+        # Allerede beregnede hentes ikke igen
+        view.prefetch("a", "b")
+        self.assertEqual(view.rest_client.get.call_count, 2)
+
 
 class NotatRestClientTests(TestCase):
 
@@ -725,6 +1112,39 @@ class VareafgiftssatsRestClientTests(TestCase):
             client.get(1)
             mock_obj.populate_subs.assert_called()
 
+    def test_get_many(self):
+        self.mock_rest.get_all_items.return_value = {
+            1: {**self.item, "overordnet": None},
+            3: {
+                **self.item,
+                "id": 3,
+                "overordnet": None,
+                "enhed": Vareafgiftssats.Enhed.SAMMENSAT,
+            },
+        }
+        self.mock_rest.get_children.return_value = {
+            3: [{**self.item, "id": 4, "overordnet": 3}]
+        }
+        satser = self.client.get_many([3, 1, 3])
+        self.mock_rest.get_all_items.assert_called_once_with(
+            "vareafgiftssats", {"id": [1, 3]}
+        )
+        self.mock_rest.get_children.assert_called_once_with(
+            "vareafgiftssats", "overordnet", [3]
+        )
+        self.assertEqual(set(satser), {1, 3})
+        self.assertIsNone(satser[1].subsatser)
+        self.assertEqual([sub.id for sub in satser[3].subsatser], [4])
+
+    def test_get_many_missing(self):
+        self.mock_rest.get_all_items.return_value = {1: self.item}
+        with self.assertRaises(RestClientException):
+            self.client.get_many([1, 2])
+
+    def test_get_many_empty(self):
+        self.assertEqual(self.client.get_many([]), {})
+        self.mock_rest.get_all_items.assert_not_called()
+
     def test_list(self):
         self.mock_rest.get.return_value = {"items": [self.item]}
         satser = self.client.list()
@@ -802,14 +1222,19 @@ class PaymentRestClientTests(TestCase):
     def test_get_by_declaration_returns_enriched_payment(self):
         client = PaymentRestClient(self.mock_rest)
         self.mock_rest.get.side_effect = [
-            [{"declaration": 10}],  # payment list
-            {"afsender": 1, "modtager": 2},  # declaration
-            {"id": "afsender"},  # afsender
-            {"id": "modtager"},  # modtager
+            [{"declaration": {"id": 9}}, {"declaration": {"id": 10}}],  # payments
+            {"id": 10, "afsender": {"id": "afsender"}},  # declaration (full)
         ]
         result = client.get_by_declaration(10)
         self.assertIn("declaration", result)
         self.assertEqual(result["declaration"]["afsender"]["id"], "afsender")
+        self.assertEqual(
+            self.mock_rest.get.call_args_list,
+            [
+                call("payment?declaration=10&full=true"),
+                call("afgiftsanmeldelse/10/full"),
+            ],
+        )
 
     def test_get_by_declaration_raises_when_not_found(self):
         self.mock_rest.get.return_value = []
@@ -855,7 +1280,7 @@ class RestClientTests(TestCase):
         RestClient.check_twofactor(user_id=1, twofactor_token="token")
         mock_post.assert_called_once()
 
-    @patch("requests.post")
+    @patch("requests.sessions.Session.post")
     def test_refresh_login(self, mock_post):
         mock_post.return_value = MagicMock(
             status_code=200, json=lambda: {"access": "new-token"}
@@ -877,15 +1302,110 @@ class RestClientTests(TestCase):
         self.assertIn(1, result)
         self.assertEqual(result[1]["foo"], "bar")
 
-    @patch.object(RestClient, "get")
+    @patch.object(RestClient, "_get")
     def test_get_all_items_multiple_pages(self, mock_get):
         mock_get.side_effect = [
-            {"items": [{"id": i} for i in range(100)]},
+            {"count": 101, "items": [{"id": i} for i in range(100)]},
             {"items": [{"id": 101}]},
         ]
         items = self.client.get_all_items("some/endpoint")
         self.assertEqual(len(items), 101)
 
+    @staticmethod
+    def paginated(total, max_limit):
+        # Svarer som REST, med højst max_limit elementer pr. side
+        def get(path, params):
+            limit = min(params["limit"], max_limit)
+            if "cursor" in params:
+                offset = int(params["cursor"])
+            else:
+                offset = params.get("offset", 0)
+            items = [{"id": i} for i in range(offset, min(offset + limit, total))]
+            more = offset + limit < total
+            return {
+                "count": None if "cursor" in params or "count" in params else total,
+                "next": str(offset + limit) if more else None,
+                "items": items,
+            }
+
+        return get
+
+    @override_settings(REST_PAGE_SIZE=500, REST_PAGE_PREFETCH=3)
+    @patch.object(RestClient, "_get")
+    def test_iter_items_prefetch(self, mock_get):
+        mock_get.side_effect = self.paginated(950, 100)
+        items = list(self.client.iter_items("some/endpoint", {"a": 1}))
+        self.assertEqual([item["id"] for item in items], list(range(950)))
+        # Første side bestemmer sidestørrelsen, og resten hentes uden optælling
+        mock_get.assert_any_call("some/endpoint", {"a": 1, "limit": 500})
+        mock_get.assert_any_call(
+            "some/endpoint", {"a": 1, "limit": 100, "offset": 900, "count": "none"}
+        )
+        self.assertEqual(mock_get.call_count, 10)
+
+    @override_settings(REST_PAGE_SIZE=500, REST_PAGE_PREFETCH=3)
+    @patch.object(RestClient, "_get")
+    def test_iter_items_stop(self, mock_get):
+        mock_get.side_effect = self.paginated(950, 100)
+        items = self.client.iter_items("some/endpoint")
+        for item in items:
+            if item["id"] == 150:
+                break
+        items.close()
+        # Kun de forudhentede sider er hentet
+        self.assertLessEqual(mock_get.call_count, 5)
+
+    @override_settings(REST_PAGE_SIZE=500, REST_PAGE_PREFETCH=3)
+    @patch.object(RestClient, "_get")
+    @patch.object(RestClient, "check_access_token_age")
+    def test_iter_items_prefetch_token(self, mock_check, mock_get):
+        threads = []
+        mock_check.side_effect = lambda: threads.append(threading.current_thread())
+        mock_get.side_effect = self.paginated(950, 100)
+        list(self.client.iter_items("some/endpoint"))
+        # Tokenet kontrolleres kun i forbrugerens tråd, før hver side sendes
+        # af sted, og aldrig i trådene der henter siderne
+        self.assertEqual(set(threads), {threading.current_thread()})
+        self.assertEqual(mock_check.call_count, 8)
+
+    @override_settings(REST_PAGE_SIZE=300)
+    @patch.object(RestClient, "get")
+    def test_iter_items_cursor(self, mock_get):
+        paginated = self.paginated(700, 1000)
+        # Uden antal følges cursoren
+        mock_get.side_effect = lambda path, params: paginated(
+            path, {**params, "count": "none"}
+        )
+        items = list(self.client.iter_items("some/endpoint"))
+        self.assertEqual([item["id"] for item in items], list(range(700)))
+        mock_get.assert_called_with(
+            "some/endpoint", {"limit": 300, "cursor": "600", "count": "none"}
+        )
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch.object(RestClient, "get_all_items")
+    def test_get_children(self, mock_get_all_items):
+        mock_get_all_items.return_value = {
+            1: {"id": 1, "afgiftsanmeldelse": 20},
+            2: {"id": 2, "afgiftsanmeldelse": 10},
+            3: {"id": 3, "afgiftsanmeldelse": 20},
+        }
+        children = self.client.get_children(
+            "varelinje", "afgiftsanmeldelse", [10, 20, 30], {"kladde": False}
+        )
+        mock_get_all_items.assert_called_once_with(
+            "varelinje", {"kladde": False, "afgiftsanmeldelse__in": [10, 20, 30]}
+        )
+        self.assertEqual(
+            {id: [item["id"] for item in items] for id, items in children.items()},
+            {10: [2], 20: [1, 3], 30: []},
+        )
+
+    @patch.object(RestClient, "get_all_items")
+    def test_get_children_empty(self, mock_get_all_items):
+        self.assertEqual(self.client.get_children("notat", "afgiftsanmeldelse", []), {})
+        mock_get_all_items.assert_not_called()
+
     @patch("requests.sessions.Session.get")
     def test_get_success(self, mock_get):
         mock_response = MagicMock()
@@ -896,6 +1416,91 @@ class RestClientTests(TestCase):
         result = self.client.get("some/path")
         self.assertEqual(result["foo"], "bar")
 
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch("requests.sessions.Session.get")
+    def test_get_revalidate(self, mock_get):
+        response_cache.reset_stats()
+        response = Response()
+        response.status_code = 200
+        response.headers["ETag"] = '"abc"'
+        response._content = b'{"foo": "bar"}'
+        not_modified = Response()
+        not_modified.status_code = 304
+        not_modified._content = b""
+        mock_get.side_effect = [response, not_modified]
+
+        self.assertEqual(self.client.get("some/path", {"a": 1}), {"foo": "bar"})
+        mock_get.assert_called_with(f"{RestClient.domain}/api/some/path?a=1")
+        # Andet kald revalideres med ETag, og det gemte svar bruges
+        self.assertEqual(self.client.get("some/path", {"a": 1}), {"foo": "bar"})
+        mock_get.assert_called_with(
+            f"{RestClient.domain}/api/some/path?a=1", headers={"If-None-Match": '"abc"'}
+        )
+
+        stats = response_cache.stats()
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(stats["bytes_saved"], len(response.content))
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch("requests.sessions.Session.get")
+    def test_get_referencedata(self, mock_get):
+        caches["default"].clear()
+        response = Response()
+        response.status_code = 200
+        response.headers["ETag"] = '"abc"'
+        response.headers["X-Referencedata-Version"] = "7"
+        response._content = b'[{"kategori": "70"}]'
+        not_modified = Response()
+        not_modified.status_code = 304
+        not_modified.headers["X-Referencedata-Version"] = "8"
+        not_modified._content = b""
+        mock_get.side_effect = [response, not_modified]
+
+        self.assertEqual(self.client.get("toldkategori"), [{"kategori": "70"}])
+        # Referencedata af samme version bruges uden at spørge REST
+        self.assertEqual(self.client.get("toldkategori"), [{"kategori": "70"}])
+        self.assertEqual(mock_get.call_count, 1)
+
+        # Er versionen for gammel, revalideres svaret
+        response_cache.version_seen -= 3600
+        self.assertEqual(self.client.get("toldkategori"), [{"kategori": "70"}])
+        self.assertEqual(mock_get.call_count, 2)
+        mock_get.assert_called_with(
+            f"{RestClient.domain}/api/toldkategori",
+            headers={"If-None-Match": '"abc"'},
+        )
+        self.assertEqual(response_cache.version, "8")
+        # Og bruges igen uden at spørge REST under den nye version
+        self.assertEqual(self.client.get("toldkategori"), [{"kategori": "70"}])
+        self.assertEqual(mock_get.call_count, 2)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch("requests.sessions.Session.get")
+    def test_get_cache_per_user(self, mock_get):
+        response = Response()
+        response.status_code = 200
+        response.headers["ETag"] = '"abc"'
+        response._content = b'{"foo": "bar"}'
+        mock_get.return_value = response
+        self.client.get("some/path")
+        other = RestClient(
+            JwtTokenInfo(
+                access_token="other",
+                refresh_token="",
+                access_token_timestamp=time.time(),
+            )
+        )
+        other.get("some/path")
+        mock_get.assert_called_with(f"{RestClient.domain}/api/some/path")
+
     @patch("requests.sessions.Session.post")
     def test_post_success(self, mock_post):
         mock_response = MagicMock()
@@ -907,6 +1512,36 @@ class RestClientTests(TestCase):
         result = self.client.post("some/path", {"x": 1})
         self.assertEqual(result["ok"], True)
 
+    @patch("requests.sessions.Session.post")
+    def test_post_multipart(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"id": 1}
+        mock_post.return_value = mock_response
+        file = SimpleUploadedFile(
+            "leverandørfaktura.pdf", b"%PDF" * 100000, "application/pdf"
+        )
+
+        self.client.post("some/path", {"x": 1, "leverandørfaktura": file})
+        url, body = mock_post.call_args.args
+        self.assertIsInstance(body, MultipartStream)
+        self.assertEqual(
+            mock_post.call_args.kwargs["headers"],
+            {"Content-Type": body.content_type},
+        )
+
+        # Sendes i blokke, og kan læses af Djangos multipart-parser
+        content = b"".join(body)
+        self.assertEqual(len(content), len(body))
+        post, files = MultiPartParser(
+            {"CONTENT_TYPE": body.content_type, "CONTENT_LENGTH": len(body)},
+            BytesIO(content),
+            [MemoryFileUploadHandler()],
+        ).parse()
+        self.assertEqual(json.loads(post["payload"]), {"x": 1})
+        self.assertEqual(files["leverandørfaktura"].name, "leverandørfaktura.pdf")
+        self.assertEqual(files["leverandørfaktura"].read(), b"%PDF" * 100000)
+
     @patch("requests.sessions.Session.post")
     def test_post_failure(self, mock_post):
         response = Response()
@@ -970,12 +1605,6 @@ class RestClientTests(TestCase):
             {"items": [{"id": 42}]},  # afgiftstabel
             {"items": [{"id": 1}, {"id": 2}]},  # varesatser
         ]
-        self.client.get_all_items = MagicMock(
-            return_value={
-                1: {"id": 1, "værdi": 100},
-                2: {"id": 2, "værdi": 200},
-            }
-        )
         with patch(
             "told_common.rest_client.Vareafgiftssats.from_dict", side_effect=lambda x: x
         ):
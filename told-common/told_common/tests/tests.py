@@ -24,6 +24,7 @@ from django.test.testcases import SimpleTestCase
 from django.urls import reverse
 from requests import Response
 from told_common.data import JwtTokenInfo
+from told_common.multipart import MultipartStream
 from told_common.rest_client import RestClient, RestClientException
 from told_common.templatetags.common_tags import file_basename, zfill
 from told_common.views import FileView
@@ -315,12 +316,13 @@ class LoginTest(TestMixin):
             # Check that token refresh is needed
             mock_refresh_login.assert_called()
 
+    @patch.object(requests.sessions.Session, "post")
     @patch.object(requests.sessions.Session, "get")
     @patch.object(
         requests,
         "post",
     )
-    def test_token_refresh(self, mock_post, mock_get):
+    def test_token_refresh(self, mock_post, mock_get, mock_session_post):
         mock_get.side_effect = self.mock_requests_get
         mock_post.return_value = self.create_response(
             200, {"access": "123456", "refresh": "abcdef"}
@@ -328,7 +330,7 @@ class LoginTest(TestMixin):
         self.client.post(
             reverse("login"), {"username": "correct", "password": "credentials"}
         )
-        mock_post.return_value = self.create_response(200, {"access": "7890ab"})
+        mock_session_post.return_value = self.create_response(200, {"access": "7890ab"})
         # Set token max_age way down, so it will be refreshed
         with self.settings(NINJA_JWT={"ACCESS_TOKEN_LIFETIME": timedelta(seconds=1)}):
             response = self.client.get(reverse("rest", kwargs={"path": "afsender"}))
@@ -1251,6 +1253,7 @@ class AnmeldelseListViewTest(BlanketMixin, HasLogin):
 
         expected = {
             "total": 3,
+            "total_estimated": False,
             "items": [
                 {
                     "select": "",
@@ -1566,6 +1569,19 @@ class FileViewTest(HasLogin):
         self.assertEquals(response.status_code, 404)
 
 
+def request_data(data) -> dict:
+    """
+    Data sendt med en mocket requests.Session.post/patch; filer sendt som
+    multipart-dele medtages med deres indhold
+    """
+    if isinstance(data, MultipartStream):
+        return {
+            **json.loads(data.fields["payload"]),
+            **{name: b"".join(file.chunks()) for name, file in data.files.items()},
+        }
+    return json.loads(data)
+
+
 def modify_values(item: Any, types: Tuple, action: Callable) -> Any:
     t = type(item)
     if t is dict:
@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+from urllib3.util.retry import Retry
+
+# Fælles forbindelsespulje til REST.
+#
+# Hver RestClient har sin egen requests.Session med brugerens Authorization-
+# header, men alle sessioner i processen bruger den samme HTTPAdapter, og
+# dermed de samme forbindelser. En forbindelse lægges tilbage i puljen efter
+# hvert svar (keep-alive), så et view ikke skal oprette en ny TCP-forbindelse
+# til REST for hvert request. REST skal derfor køre med en gunicorn-worker der
+# understøtter keep-alive (gthread).
+#
+# Puljen styres af indstillingerne:
+# - REST_POOL_CONNECTIONS: Antal værter der holdes forbindelser til (4)
+# - REST_POOL_MAXSIZE: Forbindelser pr. vært (10). Bruges der flere samtidigt,
+#   oprettes de ekstra, men lukkes efter brug
+# - REST_CONNECT_TIMEOUT og REST_READ_TIMEOUT: Timeouts i sekunder (5 og 120)
+#
+# En forbindelse som REST har lukket mens den lå i puljen, kan først opdages når
+# den bruges; idempotente requests forsøges derfor én gang til på en ny
+# forbindelse, hvis forbindelsen afbrydes (men ikke ved timeout).
+# Cookies fra REST gemmes ikke.
+#
+# Hver proces tæller requests, nye forbindelser og det højeste antal samtidige
+# requests, og lægger dem jævnligt til de samlede tællere i cachen;
+# se `stats()` og `manage.py rest_cache_stats`.
+
+log = logging.getLogger(__name__)
+
+KEY_PREFIX = "rest_pool"
+STATS_KEYS = ("requests", "connections", "errors")
+STATS_INTERVAL = 60
+
+
+def _cache():
+    return caches[getattr(settings, "REST_RESPONSE_CACHE_ALIAS", "default")]
+
+
+class _Retry(Retry):
+    # Kun afbrudte forbindelser prøves igen, ikke timeouts
+    def _is_read_error(self, err: Exception) -> bool:
+        return isinstance(err, ProtocolError)
+
+
+def _counting(pool_cls, count):
+    # Puljeklasse hvis forbindelser tæller hver gang de forbinder, også når en
+    # forbindelse genåbnes fordi REST har lukket den
+    class Connection(pool_cls.ConnectionCls):
+        def connect(self):
+            super().connect()
+            count(connections=1)
+
+    return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": Connection})
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self):
+        super().__init__(
+            pool_connections=getattr(settings, "REST_POOL_CONNECTIONS", 4),
+            pool_maxsize=getattr(settings, "REST_POOL_MAXSIZE", 10),
+            max_retries=_Retry(
+                total=1, connect=1, read=1, status=0, other=0, redirect=False
+            ),
+        )
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = dict.fromkeys(STATS_KEYS, 0)
+        self.flushed = time.monotonic()
+        self.in_use = 0
+        self.peak = 0
+
+    @property
+    def timeout(self):
+        return (
+            getattr(settings, "REST_CONNECT_TIMEOUT", 5),
+            getattr(settings, "REST_READ_TIMEOUT", 120),
+        )
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _counting(pool_cls, self.count)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        with self.lock:
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+        failed = True
+        try:
+            response = super().send(request, stream=stream, timeout=timeout, **kwargs)
+            failed = False
+            return response
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.count(requests=1, errors=int(failed))
+
+    def count(self, **counts: int):
+        with self.lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+            if time.monotonic() - self.flushed < STATS_INTERVAL:
+                return
+            counts, self.counts = self.counts, dict.fromkeys(STATS_KEYS, 0)
+            self.flushed = time.monotonic()
+        self.flush(counts)
+
+    def flush(self, counts: Optional[Dict[str, int]] = None):
+        if counts is None:
+            with self.lock:
+                counts, self.counts = self.counts, dict.fromkeys(STATS_KEYS, 0)
+                self.flushed = time.monotonic()
+        cache = _cache()
+        try:
+            for name, value in counts.items():
+                if value:
+                    key = f"{KEY_PREFIX}:stats:{name}"
+                    cache.add(key, 0, timeout=None)
+                    cache.incr(key, value)
+        except Exception as e:
+            log.warning("Kunne ikke gemme forbindelsespuljens tællere: %s", e)
+            return
+        if counts["requests"]:
+            log.info(
+                "REST-forbindelser: %d requests, %d nye forbindelser, "
+                "%d fejl, højst %d samtidige",
+                counts["requests"],
+                counts["connections"],
+                counts["errors"],
+                self.peak,
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """
+        De samlede tællere for alle processer, med andelen af requests der
+        genbrugte en forbindelse, og denne process' højeste antal samtidige
+        """
+        self.flush()
+        cache = _cache()
+        stats: Dict[str, float] = {
+            name: cache.get(f"{KEY_PREFIX}:stats:{name}", 0) for name in STATS_KEYS
+        }
+        stats["reuse_rate"] = (
+            max(stats["requests"] - stats["connections"], 0) / stats["requests"]
+            if stats["requests"]
+            else 0.0
+        )
+        stats["peak"] = self.peak
+        return stats
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = dict.fromkeys(STATS_KEYS, 0)
+            self.peak = self.in_use
+        _cache().delete_many([f"{KEY_PREFIX}:stats:{name}" for name in STATS_KEYS])
+
+
+adapter = PooledAdapter()
+
+
+def session() -> requests.Session:
+    """
+    En ny session der bruger den fælles forbindelsespulje
+    """
+    new = requests.Session()
+    new.mount("http://", adapter)
+    new.mount("https://", adapter)
+    new.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return new
@@ -7,7 +7,7 @@ import logging
 import os
 from datetime import date
 from functools import cached_property
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import unquote
 
 from django.conf import settings
@@ -29,10 +29,12 @@ from requests import HTTPError
 from told_common import forms
 from told_common.data import (
     Afgiftsanmeldelse,
+    Afgiftstabel,
     Forsendelsestype,
+    Notat,
     PrivatAfgiftsanmeldelse,
 )
-from told_common.rest_client import RestClient
+from told_common.rest_client import EstimatedCount, RestClient
 from told_common.util import (
     JSONEncoder,
     dataclass_map_to_dict,
@@ -333,6 +335,13 @@ class TF10FormUpdateView(
     formset_class = forms.TF10VareFormSet
     template_name = "told_common/tf10/form.html"
     extend_template = "told_common/layout.html"
+    # Hentes samtidigt når siden vises
+    prefetch_properties: Iterable[str] = (
+        "item",
+        "varesatser",
+        "afgiftstabeller",
+        "notater",
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -348,6 +357,7 @@ class TF10FormUpdateView(
             )
 
     def get(self, request, *args, **kwargs):
+        self.prefetch(*self.prefetch_properties)
         response = self.check_item()
         if response:
             return response
@@ -583,13 +593,10 @@ class TF10FormUpdateView(
                 "vis_notater": True,
                 "varesatser": dataclass_map_to_dict(self.varesatser),
                 "afgiftstabeller": [
-                    dataclasses.asdict(item)
-                    for item in self.rest_client.afgiftstabel.list(kladde=False)
+                    dataclasses.asdict(item) for item in self.afgiftstabeller
                 ],
                 "item": self.item,
-                "notater": self.rest_client.notat.list(
-                    afgiftsanmeldelse=self.kwargs["id"]
-                ),
+                "notater": self.notater,
                 "kan_ændre_kladde": self.item.status == "kladde",
                 "indberetter_data": {
                     "cvr": (
@@ -611,6 +618,14 @@ class TF10FormUpdateView(
             include_prismeresponses=False,
         )
 
+    @cached_property
+    def afgiftstabeller(self) -> List[Afgiftstabel]:
+        return self.rest_client.afgiftstabel.list(kladde=False)
+
+    @cached_property
+    def notater(self) -> List[Notat]:
+        return self.rest_client.notat.list(afgiftsanmeldelse=self.kwargs["id"])
+
     def get_initial(self):
         item = self.item
         initial = {"sidste_ændringsdato": item.sidste_ændringsdato}
@@ -774,9 +789,11 @@ class ListView(FormView):
         response = self.get_items(search_data)
         total = response["count"]
         items = response["items"]
+        total_estimated = isinstance(total, EstimatedCount)
         context = self.get_context_data(
             items=items,
             total=total,
+            total_estimated=total_estimated,
             search_data=search_data,
             actions_template=self.actions_template,
             select_template=self.select_template,
@@ -790,6 +807,7 @@ class ListView(FormView):
             return JsonResponse(
                 {
                     "total": total,
+                    "total_estimated": total_estimated,
                     "items": items,
                 },
                 encoder=JSONEncoder,
@@ -841,9 +859,22 @@ class TF10ListView(
     form_class = forms.TF10SearchForm
     list_size = 20
 
+    # Felterne som tabellen og dens templates viser; resten hentes ikke
+    list_fields: Tuple[str, ...] = (
+        "id",
+        "status",
+        "dato",
+        "afsender__navn",
+        "modtager__navn",
+        "fragtforsendelse__forbindelsesnr",
+    )
+
     def get_items(self, search_data: Dict[str, Any]):
         # return self.rest_client.get("afgiftsanmeldelse/full", search_data)
-        count, items = self.rest_client.afgiftanmeldelse.list(full=True, **search_data)
+        # Store resultater tælles ikke præcist (se count i REST)
+        count, items = self.rest_client.afgiftanmeldelse.list(
+            full=True, fields=self.list_fields, count="auto", **search_data
+        )
         return {"count": count, "items": items}
 
     def get_context_data(self, **context: Dict[str, Any]) -> Dict[str, Any]:
@@ -924,6 +955,7 @@ class TF10ListView(
 
 class TF10BaseView:
     rest_client: RestClient
+    prefetch: Callable
 
 
 class TF10View(TF10BaseView, TemplateView):
@@ -940,6 +972,12 @@ class TF10View(TF10BaseView, TemplateView):
     extend_template = "told_common/layout.html"
     template_name = "told_common/tf10/view.html"
     has_permissions: Callable
+    # Hentes samtidigt når siden vises
+    prefetch_properties: Iterable[str] = ("object",)
+
+    def get(self, request, *args, **kwargs):
+        self.prefetch(*self.prefetch_properties)
+        return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs) -> dict[str, Any]:
         anmeldelse: Afgiftsanmeldelse = self.object
@@ -1114,8 +1152,19 @@ class TF5ListView(PermissionsRequiredMixin, HasRestClientMixin, TF5Mixin, ListVi
     form_class = forms.TF5SearchForm
     list_size = 20
 
+    # Felterne som tabellen og dens templates viser; resten hentes ikke
+    list_fields: Tuple[str, ...] = (
+        "id",
+        "status",
+        "oprettet",
+        "indleveringsdato",
+        "leverandørfaktura_nummer",
+    )
+
     def get_items(self, search_data: Dict[str, Any]):
-        count, items = self.rest_client.privat_afgiftsanmeldelse.list(**search_data)
+        count, items = self.rest_client.privat_afgiftsanmeldelse.list(
+            fields=self.list_fields, count="auto", **search_data
+        )
         return {"count": count, "items": items}
 
     def get_context_data(self, **context: Dict[str, Any]) -> Dict[str, Any]:
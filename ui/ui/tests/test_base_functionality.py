@@ -1,7 +1,6 @@
 # SPDX-FileCopyrightText: 2023 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
-import base64
 import json
 from collections import defaultdict
 from typing import List, Tuple
@@ -26,6 +25,7 @@ from told_common.tests.tests import (
     HasLogin,
     TemplateTagsTest,
     TestMixin,
+    request_data,
 )
 
 
@@ -540,7 +540,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
         prefix = f"{settings.REST_DOMAIN}/api/"
         posted_map = defaultdict(list)
         for url, data in self.posted:
-            posted_map[url].append(json.loads(data))
+            posted_map[url].append(request_data(data))
         self.assertEquals(
             posted_map[prefix + "afsender"],
             [
@@ -578,9 +578,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
                     "fragtbrevsnummer": "ABCDE1234567",
                     "forsendelsestype": "S",
                     "forbindelsesnr": "ABC 337",
-                    "fragtbrev": base64.b64encode("Testtekst".encode("utf-8")).decode(
-                        "ascii"
-                    ),
+                    "fragtbrev": "Testtekst".encode("utf-8"),
                     "fragtbrev_navn": "fragtbrev.txt",
                     "afgangsdato": "2023-11-03",
                     "kladde": False,
@@ -599,9 +597,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
                     "fuldmagtshaver_id": None,
                     "postforsendelse_id": None,
                     "fragtforsendelse_id": 1,
-                    "leverandørfaktura": base64.b64encode(
-                        "Testtekst".encode("utf-8")
-                    ).decode("ascii"),
+                    "leverandørfaktura": "Testtekst".encode("utf-8"),
                     "leverandørfaktura_navn": "leverandørfaktura.txt",
                     "betales_af": "afsender",
                     "oprettet_på_vegne_af_id": None,
@@ -630,7 +626,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
         prefix = f"{settings.REST_DOMAIN}/api/"
         posted_map = defaultdict(list)
         for url, data in self.posted:
-            posted_map[url].append(json.loads(data))
+            posted_map[url].append(request_data(data))
         self.assertEquals(
             posted_map[prefix + "afsender"],
             [],
@@ -646,9 +642,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
                     "fragtbrevsnummer": "ABCDE1234567",
                     "forbindelsesnr": "ABC 337",
                     "forsendelsestype": "S",
-                    "fragtbrev": base64.b64encode("Testtekst".encode("utf-8")).decode(
-                        "ascii"
-                    ),
+                    "fragtbrev": "Testtekst".encode("utf-8"),
                     "fragtbrev_navn": "fragtbrev.txt",
                     "afgangsdato": "2023-11-03",
                     "kladde": False,
@@ -667,9 +661,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
                     "fuldmagtshaver_id": None,
                     "postforsendelse_id": None,
                     "fragtforsendelse_id": 1,
-                    "leverandørfaktura": base64.b64encode(
-                        "Testtekst".encode("utf-8")
-                    ).decode("ascii"),
+                    "leverandørfaktura": "Testtekst".encode("utf-8"),
                     "leverandørfaktura_navn": "leverandørfaktura.txt",
                     "betales_af": "afsender",
                     "oprettet_på_vegne_af_id": None,
@@ -696,7 +688,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
         prefix = f"{settings.REST_DOMAIN}/api/"
         posted_map = defaultdict(list)
         for url, data in self.posted:
-            posted_map[url].append(json.loads(data))
+            posted_map[url].append(request_data(data))
         self.assertEquals(
             posted_map[prefix + "afsender"],
             [
@@ -751,9 +743,7 @@ class TF10BlanketTest(BlanketMixin, TestMixin, HasLogin, TestCase):
                     "fuldmagtshaver_id": None,
                     "postforsendelse_id": 1,
                     "fragtforsendelse_id": None,
-                    "leverandørfaktura": base64.b64encode(
-                        "Testtekst".encode("utf-8")
-                    ).decode("ascii"),
+                    "leverandørfaktura": "Testtekst".encode("utf-8"),
                     "leverandørfaktura_navn": "leverandørfaktura.txt",
                     "betales_af": "afsender",
                     "oprettet_på_vegne_af_id": None,
@@ -1195,7 +1185,7 @@ class TF5BlanketTest(TestMixin, HasLogin, TestCase):
         prefix = f"{settings.REST_DOMAIN}/api/"
         posted_map = defaultdict(list)
         for url, data in self.posted:
-            posted_map[url].append(json.loads(data))
+            posted_map[url].append(request_data(data))
         self.assertEquals(
             posted_map[prefix + "privat_afgiftsanmeldelse"],
             [
@@ -1212,9 +1202,7 @@ class TF5BlanketTest(TestMixin, HasLogin, TestCase):
                     "leverandørfaktura_nummer": "123",
                     "indførselstilladelse": None,
                     "leverandørfaktura_navn": "leverandørfaktura.txt",
-                    "leverandørfaktura": base64.b64encode(
-                        "Testtekst".encode("utf-8")
-                    ).decode("ascii"),
+                    "leverandørfaktura": "Testtekst".encode("utf-8"),
                 }
             ],
         )
@@ -102,6 +102,11 @@ class TF10ListView(UiViewMixin, SpeditørMixin, common_views.TF10ListView):
 
 
 class TF10FormUpdateView(UiViewMixin, SpeditørMixin, common_views.TF10FormUpdateView):
+    prefetch_properties = (
+        *common_views.TF10FormUpdateView.prefetch_properties,
+        "speditører",
+    )
+
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         if self.user_cvr is None or not self.is_speditør: